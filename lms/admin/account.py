@@ -1,5 +1,7 @@
 from django.contrib import admin
 
+from lms.models import Account
+
 
 class AccountAdmin(admin.ModelAdmin):
     readonly_fields = ['issued_book_count']
@@ -13,4 +15,5 @@ class AccountAdmin(admin.ModelAdmin):
 
     @admin.action(permissions=['change'])
     def recalculate_issued_count(modeladmin, request, queryset):
-        pass
\ No newline at end of file
+        updated = Account.recount_issued(queryset)
+        modeladmin.message_user(request, f'Recalculated issued book count of {updated} account(s).')
\ No newline at end of file
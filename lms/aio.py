@@ -0,0 +1,71 @@
+import itertools
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db.models import QuerySet
+
+from mysite import metrics
+
+
+# Async spellings of the QuerySet calls the async views use.
+#
+# Django 4.1 has them natively (aget, acount, aiterator). On 4.0 each call
+# runs the query in the thread that owns the database connection, so a view
+# costs one thread hop per query instead of holding a thread for the whole
+# request.
+
+NATIVE = hasattr(QuerySet, 'acount')
+
+
+def run(func, *args, **kwargs):
+    def call():
+        metrics.install()
+        return func(*args, **kwargs)
+    return sync_to_async(call, thread_sensitive=True)()
+
+
+async def aget(queryset, *args, **kwargs):
+    if NATIVE:
+        return await queryset.aget(*args, **kwargs)
+    return await run(queryset.get, *args, **kwargs)
+
+
+async def acount(queryset):
+    if NATIVE:
+        return await queryset.acount()
+    return await run(queryset.count)
+
+
+async def aiterator(queryset, chunk_size=100):
+    if NATIVE:
+        async for row in queryset.aiterator(chunk_size=chunk_size):
+            yield row
+        return
+    rows = None
+
+    def fetch():
+        nonlocal rows
+        if rows is None:
+            rows = queryset.iterator(chunk_size=chunk_size)
+        return list(itertools.islice(rows, chunk_size))
+
+    while True:
+        chunk = await run(fetch)
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            return
+
+
+async def alist(queryset):
+    return [row async for row in aiterator(queryset)]
+
+
+async def aserialize(serializer_class, instance, **kwargs):
+    # Serializers only read what the query loaded. One that would still hit
+    # the database (say, a book without an inventory row yet) raises in the
+    # event loop and is redone in the worker thread.
+    try:
+        return serializer_class(instance, **kwargs).data
+    except SynchronousOnlyOperation:
+        return await run(lambda: serializer_class(instance, **kwargs).data)
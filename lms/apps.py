@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class LmsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lms'
+
+    def ready(self):
+        from lms import authentication, principal, search
+
+        post_migrate.connect(search.install_on_migrate, sender=self)
+        # permissions may have been created or renamed
+        post_migrate.connect(principal.everything_changed, sender=self)
+        principal.connect_signals()
+        authentication.connect_signals()
@@ -0,0 +1,157 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+# Token authentication without a query per request.
+#
+# Each worker keeps token -> (user, account) rows in a bounded LRU for
+# LMS_TOKEN_CACHE_TIMEOUT seconds. Deleting or regenerating a token, or saving
+# a user or account, moves a version stamp in the shared cache; every worker
+# compares it on each request (a cache read, not a query) and starts over
+# when it changed, the same way LibraryConfig.object() does.
+#
+# Only the account's identity is cached: its counters (Account.COUNTERS)
+# change with every checkout, notification or payment, so they are left
+# deferred and read fresh the first time a request uses them.
+
+VERSION_KEY = 'lms:auth:version'
+DEFAULT_SIZE = 10000
+DEFAULT_TIMEOUT = 60
+
+
+class TokenCache(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.version = None
+
+    def get(self, key, version):
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+                return None
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, version, value):
+        size = getattr(settings, 'LMS_TOKEN_CACHE_SIZE', DEFAULT_SIZE)
+        expires = time.monotonic() + getattr(settings, 'LMS_TOKEN_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+tokens = TokenCache()
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def fields(model):
+    return [field.attname for field in model._meta.concrete_fields if field.attname not in getattr(model, 'COUNTERS', ())]
+
+
+def row(instance):
+    return tuple(getattr(instance, name) for name in fields(type(instance)))
+
+
+def build(model, values):
+    return model.from_db('default', fields(model), values)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in for TokenAuthentication. Every request gets its own User (and
+    Account) instances built from the cached rows, so per-request state set on
+    them never leaks into other requests.
+    """
+
+    def authenticate_credentials(self, key):
+        from lms.models import Account
+
+        version = get_version()
+        cached = tokens.get(key, version)
+        if cached is None:
+            try:
+                token = self.get_model().objects.select_related('user__account').get(key=key)
+            except self.get_model().DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            user = token.user
+            account = getattr(user, 'account', None)
+            cached = (row(user), row(account) if account is not None else None)
+            tokens.set(key, version, cached)
+
+        user = build(User, cached[0])
+        account = build(Account, cached[1]) if cached[1] is not None else None
+        User.account.related.set_cached_value(user, account)
+        if account is not None:
+            Account.user.field.set_cached_value(account, user)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return (user, Token(key=key, user=user))
+
+
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # logging in only touches last_login
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate()
+
+
+def account_saved(sender, instance, created, **kwargs):
+    # checkouts and returns save the account for its counters; only the owner
+    # and status are part of what authentication hands out
+    if not created and getattr(instance, '_loaded_access', None) == (instance.user_id, instance.status):
+        return
+    invalidate()
+
+
+def invalidate(**kwargs):
+    tokens.clear()
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    # and again once committed, in case another worker re-cached the old row
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, None))
+
+
+def connect_signals():
+    from lms.models import Account
+
+    post_save.connect(invalidate, sender=Token, dispatch_uid='lms.authentication.Token_saved')
+    post_save.connect(user_saved, sender=User, dispatch_uid='lms.authentication.User_saved')
+    post_save.connect(account_saved, sender=Account, dispatch_uid='lms.authentication.Account_saved')
+    for model in (Token, User, Account):
+        post_delete.connect(invalidate, sender=model, dispatch_uid=f'lms.authentication.{model.__name__}_deleted')
@@ -0,0 +1,53 @@
+import json
+import platform
+import time
+
+from django.db import connection
+
+
+# Shared helpers for the `manage.py bench_*` commands.
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    values = sorted(latency * 1000 for latency in latencies)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 3),
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'max_ms': round(values[-1], 3),
+    }
+
+
+class Stopwatch(object):
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': connection.vendor,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def write_results(path, results):
+    with open(path, 'w') as fp:
+        json.dump(results, fp, indent=2, sort_keys=True)
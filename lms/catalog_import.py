@@ -0,0 +1,294 @@
+import csv
+import datetime
+import itertools
+import json
+import os
+import re
+import time
+
+from django.db import reset_queries, transaction
+from django.db.models import Max
+
+from lms import response_cache
+from lms.models import Book, BookInventory, BookItem
+from lms.models.book import BookFormat, BookStatus, Rack
+
+
+# Bulk catalog import.
+#
+# Records (one per copy, or one per title without a barcode) are streamed
+# from a CSV or mnemonic MARC (.mrk) file and handled in chunks, each in its
+# own transaction: books are upserted (created, or their non-empty fields
+# updated), new copies are bulk inserted on the shelf with a rack of their
+# own numbered on from the highest rack at their location, and inventories
+# are adjusted. Copies whose barcode already exists are left alone, so a
+# chunk can safely be imported twice. After every chunk the number of records
+# done is written to a checkpoint file, which a rerun resumes from.
+
+BOOK_FIELDS = ('title', 'subject', 'publisher', 'language', 'numer_of_pages')
+CSV_ALIASES = {'pages': 'numer_of_pages', 'number_of_pages': 'numer_of_pages', 'rack_location': 'location'}
+FORMATS = {**{code.lower(): code for code in BookFormat.values}, **{label.lower(): code for code, label in BookFormat.choices}}
+TRUE = ('1', 'true', 'yes', 'y', 't')
+
+
+class RecordError(ValueError):
+    pass
+
+
+def normalize_isbn(value):
+    """ISBN-10 or ISBN-13 without separators, if its check digit is right."""
+    isbn = re.sub(r'[\s-]', '', value or '').upper()
+    if re.fullmatch(r'\d{9}[\dX]', isbn):
+        total = sum((10 - n) * (10 if char == 'X' else int(char)) for n, char in enumerate(isbn))
+        if total % 11 == 0:
+            return isbn
+    elif re.fullmatch(r'\d{13}', isbn):
+        total = sum(int(char) * (3 if n % 2 else 1) for n, char in enumerate(isbn))
+        if total % 10 == 0:
+            return isbn
+    raise RecordError(f'Invalid ISBN {value!r}')
+
+
+def parse_date(value):
+    for fmt in ('%Y-%m-%d', '%Y%m%d', '%d/%m/%Y'):
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise RecordError(f'Invalid date {value!r}')
+
+
+def parse_int(value, name):
+    match = re.match(r'\d+', value.replace(',', ''))
+    if match is None:
+        raise RecordError(f'Invalid {name} {value!r}')
+    return int(match.group())
+
+
+def read_csv(lines):
+    """Records from a CSV with a header row; one row per copy."""
+    for row in csv.DictReader(lines):
+        yield {CSV_ALIASES.get(key, key): (value or '').strip()
+               for key, value in ((key.strip().lower(), value) for key, value in row.items() if key)}
+
+
+def read_marc(lines):
+    """Records from mnemonic MARC: 020 ISBN, 245 title, 650 subject, 260/264
+    publisher, 041 (or 008) language, 300 pages, and an 876 per copy ($p
+    barcode, $c price, $d acquired, $l location)."""
+    fields = []
+    for line in itertools.chain(lines, ['']):
+        line = line.rstrip('\r\n')
+        if line.startswith('='):
+            fields.append((line[1:4], line[6:]))
+        elif not line.strip() and fields:
+            yield from marc_records(fields)
+            fields = []
+
+
+def subfields(data):
+    # two indicators, then $-prefixed subfields
+    return [(part[:1], part[1:].strip()) for part in data[2:].split('$')[1:] if part]
+
+
+def marc_records(fields):
+    book = {}
+    copies = []
+
+    def first(tag, code):
+        for field_tag, data in fields:
+            if field_tag == tag:
+                for field_code, value in subfields(data):
+                    if field_code == code and value:
+                        return value
+        return ''
+
+    book['isbn'] = first('020', 'a').split(' ')[0]
+    book['title'] = ' '.join(filter(None, [first('245', 'a'), first('245', 'b')])).rstrip(' /:;,.')
+    book['subject'] = first('650', 'a').rstrip(' .')
+    book['publisher'] = (first('264', 'b') or first('260', 'b')).rstrip(' ,:;')
+    control = dict(fields).get('008', '')
+    book['language'] = first('041', 'a') or control[35:38].strip()
+    book['numer_of_pages'] = first('300', 'a')
+    for tag, data in fields:
+        if tag == '876':
+            codes = dict(subfields(data))
+            copies.append({'barcode': codes.get('p', ''), 'price': codes.get('c', ''),
+                           'date_of_purchase': codes.get('d', ''), 'location': codes.get('l', '')})
+    for copy in copies or [{}]:
+        yield {**book, **copy}
+
+
+READERS = {'csv': read_csv, 'marc': read_marc}
+
+
+def clean(record, default_location):
+    """(book fields, copy fields or None) for a record, or RecordError."""
+    book = {'isbn': normalize_isbn(record.get('isbn'))}
+    if not record.get('title'):
+        raise RecordError('Missing title')
+    for name in BOOK_FIELDS:
+        value = record.get(name, '')
+        if value and name == 'numer_of_pages':
+            value = parse_int(value, 'page count')
+        if value != '':
+            max_length = getattr(Book._meta.get_field(name), 'max_length', None)
+            if max_length and len(value) > max_length:
+                raise RecordError(f'{name} longer than {max_length} characters')
+            book[name] = value
+
+    barcode = record.get('barcode', '')
+    if not barcode:
+        return book, None
+    if len(barcode) > BookItem._meta.get_field('barcode').max_length:
+        raise RecordError(f'Barcode {barcode!r} too long')
+    location = record.get('location') or default_location
+    if len(location) > Rack._meta.get_field('location_identifier').max_length:
+        raise RecordError(f'Location {location!r} too long')
+    book_format = record.get('format', '')
+    if book_format and book_format.lower() not in FORMATS:
+        raise RecordError(f'Unknown format {book_format!r}')
+    item = {
+        'barcode': barcode,
+        'book_id': book['isbn'],
+        'price': parse_int(record['price'], 'price') if record.get('price') else 0,
+        'format': FORMATS[book_format.lower()] if book_format else BookFormat.Hardcover,
+        'is_reference_only': record.get('is_reference_only', '').lower() in TRUE,
+        'date_of_purchase': parse_date(record['date_of_purchase']) if record.get('date_of_purchase') else datetime.date.today(),
+        'publication_date': parse_date(record['publication_date']) if record.get('publication_date') else None,
+    }
+    return book, (item, location)
+
+
+def load_checkpoint(path, source):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return checkpoint if checkpoint.get('source') == source else None
+
+
+def save_checkpoint(path, checkpoint):
+    # written to the side and renamed, so a crash never leaves half a file
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(f'{path}.tmp', path)
+
+
+class CatalogImport(object):
+
+    COUNTERS = ('records', 'books_created', 'books_updated', 'items_created', 'items_existing', 'rejected')
+
+    def __init__(self, chunk_size=1000, location='MAIN', on_reject=None):
+        self.chunk_size = chunk_size
+        self.location = location
+        self.on_reject = on_reject
+        self.stats = dict.fromkeys(self.COUNTERS, 0)
+        self.next_rack = {}
+
+    def run(self, records, checkpoint_path=None, source=None, on_chunk=None):
+        """Import an iterable of records, resuming from `checkpoint_path` if it
+        holds a checkpoint for `source`; returns the counters and rows/sec."""
+        checkpoint = load_checkpoint(checkpoint_path, source) if checkpoint_path else None
+        skip = 0
+        if checkpoint:
+            skip = checkpoint['records']
+            self.stats.update(checkpoint['stats'])
+        records = enumerate(records, 1)
+        if skip:
+            # parsing only, nothing is held on to
+            records = itertools.islice(records, skip, None)
+
+        started = time.perf_counter()
+        imported = 0
+        while True:
+            chunk = list(itertools.islice(records, self.chunk_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                self.import_chunk(chunk)
+            imported += len(chunk)
+            # with DEBUG on, the logged queries alone would grow without bound
+            reset_queries()
+            if checkpoint_path:
+                save_checkpoint(checkpoint_path, {'source': source, 'records': chunk[-1][0], 'stats': self.stats})
+            if on_chunk:
+                on_chunk(self.stats, imported / max(time.perf_counter() - started, 1e-9))
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.perf_counter() - started
+        return dict(self.stats, resumed_at=skip, elapsed_s=round(elapsed, 3),
+                    rows_per_second=round(imported / max(elapsed, 1e-9), 1))
+
+    def import_chunk(self, chunk):
+        books = {}
+        items = {}
+        for number, record in chunk:
+            self.stats['records'] += 1
+            try:
+                book, item = clean(record, self.location)
+                if item is not None and item[0]['barcode'] in items:
+                    raise RecordError(f'Duplicate barcode {item[0]["barcode"]!r}')
+            except RecordError as e:
+                self.stats['rejected'] += 1
+                if self.on_reject:
+                    self.on_reject(number, record, str(e))
+                continue
+            # later records of a title fill in and override earlier ones
+            books.setdefault(book['isbn'], {}).update(book)
+            if item is not None:
+                items[item[0]['barcode']] = item
+
+        self.upsert_books(books)
+        self.create_items(items)
+
+    def upsert_books(self, books):
+        existing = Book.objects.in_bulk(list(books))
+        created, updated = [], []
+        for isbn, fields in books.items():
+            book = existing.get(isbn)
+            if book is None:
+                created.append(Book(**{'subject': '', 'publisher': '', 'language': '', 'numer_of_pages': 0, **fields}))
+            elif any(getattr(book, name) != value for name, value in fields.items()):
+                for name, value in fields.items():
+                    setattr(book, name, value)
+                updated.append(book)
+        # bulk_create skips Book.save(), which creates the inventory row
+        Book.objects.bulk_create(created, batch_size=self.chunk_size)
+        BookInventory.objects.bulk_create([BookInventory(book_id=book.pk) for book in created], batch_size=self.chunk_size)
+        Book.objects.bulk_update(updated, BOOK_FIELDS, batch_size=self.chunk_size)
+        self.stats['books_created'] += len(created)
+        self.stats['books_updated'] += len(updated)
+        if created or updated:
+            response_cache.purge('catalog', *[response_cache.book_tag(book.pk) for book in updated])
+
+    def create_items(self, items):
+        existing = set(BookItem.objects.filter(barcode__in=list(items)).values_list('barcode', flat=True))
+        self.stats['items_existing'] += len(existing)
+        new = [item for barcode, item in items.items() if barcode not in existing]
+        if not new:
+            return
+
+        places = [(location, self.allocate_rack(location)) for _, location in new]
+        Rack.objects.bulk_create([Rack(location_identifier=location, number=number) for location, number in places],
+                                 batch_size=self.chunk_size)
+        racks = Rack.pks(places)
+        BookItem.objects.bulk_create([BookItem(status=BookStatus.Available, placed_at_id=racks[place], **item)
+                                      for (item, _), place in zip(new, places)], batch_size=self.chunk_size)
+        counts = {}
+        for item, _ in new:
+            counts[item['book_id']] = counts.get(item['book_id'], 0) + 1
+        BookInventory.adjust_many(counts, None, BookStatus.Available)
+        response_cache.purge('book-items')
+        self.stats['items_created'] += len(new)
+
+    def allocate_rack(self, location):
+        # numbered on from the highest rack at the location, read once per run
+        if location not in self.next_rack:
+            highest = Rack.objects.filter(location_identifier=location).aggregate(Max('number'))['number__max']
+            self.next_rack[location] = 0 if highest is None else highest + 1
+        number = self.next_rack[location]
+        self.next_rack[location] += 1
+        return number
@@ -0,0 +1,102 @@
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from lms.models import Account, BookItem, BookLending, BookReservation, CirculationRollup, FineAccrual
+from lms.models.action import ReservationStatus
+from lms.models.book import BookStatus
+
+
+# Librarian dashboard: the landing page's counts and short lists in one
+# payload.
+#
+# Building it is a fixed number of indexed queries (no count grows with the
+# history: daily totals come from CirculationRollup, running fines from
+# FineAccrual, fines owed from Account.fine_balance). The payload is shared
+# by every librarian through the cache for LMS_DASHBOARD_TIMEOUT seconds;
+# when it goes stale one request rebuilds it while the others keep serving
+# the previous copy.
+
+CACHE_KEY = 'lms:dashboard'
+LOCK_KEY = 'lms:dashboard:lock'
+DEFAULT_TIMEOUT = 30
+TOP = 10
+TOP_SUBJECT_DAYS = 30
+
+
+def name(first_name, last_name):
+    return f'{first_name} {last_name}'.strip()
+
+
+def build(today=None, top=TOP):
+    today = today or datetime.date.today()
+
+    overdue = BookLending.objects.filter(return_date=None, due_date__lt=today)
+    holds = dict(BookReservation.objects.filter(status__in=[ReservationStatus.Waiting, ReservationStatus.Pending])
+                                        .values_list('status').annotate(Count('pk')).order_by())
+    day = CirculationRollup.objects.filter(date=today).aggregate(checkouts=Sum('checkouts'), returns=Sum('returns'))
+    fines = FineAccrual.objects.aggregate(count=Count('pk'), amount=Sum('amount'))
+    owed = Account.objects.filter(fine_balance__gt=0).aggregate(count=Count('pk'), amount=Sum('fine_balance'))
+
+    oldest_overdue = overdue.order_by('due_date', 'id').values_list(
+        'pk', 'book_item_id', 'book_item__book__title', 'account_id', 'account__user__first_name', 'account__user__last_name', 'due_date',
+    )[:top]
+    oldest_holds = BookReservation.objects.filter(status=ReservationStatus.Waiting).order_by('id').values_list(
+        'pk', 'book_id', 'book__title', 'account_id', 'account__user__first_name', 'account__user__last_name', 'creation_date',
+    )[:top]
+    top_subjects = CirculationRollup.objects.filter(date__gt=today - datetime.timedelta(days=TOP_SUBJECT_DAYS), date__lte=today) \
+                                            .values_list('subject').annotate(total=Sum('checkouts')).order_by('-total', 'subject')[:top]
+
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'date': today.isoformat(),
+        'counts': {
+            'overdue': overdue.count(),
+            'waiting_holds': holds.get(ReservationStatus.Waiting, 0),
+            'ready_holds': holds.get(ReservationStatus.Pending, 0),
+            'issued_today': day['checkouts'] or 0,
+            'returned_today': day['returns'] or 0,
+            'lost': BookItem.objects.filter(status=BookStatus.Lost).count(),
+            'accruing_fines': fines['count'],
+            'accruing_fine_amount': fines['amount'] or 0,
+            'accounts_owing': owed['count'],
+            'fines_owed': owed['amount'] or 0,
+        },
+        'oldest_overdue': [{
+            'lending': pk, 'barcode': barcode, 'title': title, 'account': account_id, 'name': name(first_name, last_name),
+            'due_date': due_date.isoformat(), 'days_overdue': (today - due_date).days,
+        } for pk, barcode, title, account_id, first_name, last_name, due_date in oldest_overdue],
+        'oldest_holds': [{
+            'reservation': pk, 'isbn': isbn, 'title': title, 'account': account_id, 'name': name(first_name, last_name),
+            'creation_date': creation_date.isoformat(),
+        } for pk, isbn, title, account_id, first_name, last_name, creation_date in oldest_holds],
+        'top_subjects': [{'subject': subject, 'checkouts': total} for subject, total in top_subjects if total],
+    }
+
+
+def get(today=None):
+    """The cached dashboard, rebuilt by one caller at a time once it is older than LMS_DASHBOARD_TIMEOUT."""
+    timeout = getattr(settings, 'LMS_DASHBOARD_TIMEOUT', DEFAULT_TIMEOUT)
+    today = today or datetime.date.today()
+    cached = cache.get(CACHE_KEY)
+    locked = False
+    if cached is not None:
+        expires, dashboard = cached
+        if expires > timezone.now().timestamp() and dashboard['date'] == today.isoformat():
+            return dashboard
+        locked = cache.add(LOCK_KEY, 1, timeout)
+        if not locked:
+            # someone else is rebuilding it
+            return dashboard
+
+    try:
+        dashboard = build(today)
+        # kept well past its expiry so there is a copy to serve while it is rebuilt
+        cache.set(CACHE_KEY, (timezone.now().timestamp() + timeout, dashboard), timeout * 10)
+    finally:
+        if locked:
+            cache.delete(LOCK_KEY)
+    return dashboard
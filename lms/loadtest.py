@@ -0,0 +1,385 @@
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import date
+
+from django.contrib.auth.models import Group, Permission, User
+from django.db import OperationalError, connections
+from django.db.models import Count, F, Max, Q
+from django.test import Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from lms import benchmarks
+from lms.models import Account, Book, BookInventory, BookItem, BookLending, BookReservation, CirculationError, LibraryConfig
+from lms.models.account import AccountStatus
+from lms.models.book import BookStatus, Rack
+
+
+# Circulation-day load test used by `manage.py bench_circulation`.
+#
+# A fixture of `bench-*` books, items and patrons is created (idempotently) in
+# the configured database, then a weighted mix of catalog, circulation and
+# notification requests is replayed either in-process through the test Client
+# or over HTTP against a server using the same database. Every request is
+# authenticated with a DRF token, like the React client.
+
+PREFIX = 'bench'
+
+LIBRARIAN_PERMISSIONS = [
+    'view_book', 'view_bookitem', 'can_checkout_book_item', 'can_issue_book_item', 'can_return_book_item',
+    'can_reserve_for_others', 'view_bookreservation', 'change_bookreservation', 'view_booklending',
+]
+
+# operation -> relative frequency over a circulation day
+MIX = {
+    'browse': 25,
+    'search': 15,
+    'book_detail': 10,
+    'notifications': 20,
+    'issue': 12,
+    'return': 12,
+    'reserve': 6,
+}
+
+SEARCH_TERMS = ['history', 'physics', 'garden', 'python', 'ocean', 'poetry', 'his', 'phy', 'database network']
+
+
+def setup_fixture(books=200, items=1000, patrons=100, batch_size=1000):
+    """Create the bench catalog and users if missing; returns (librarian, patron accounts)."""
+    config, _ = LibraryConfig.objects.get_or_create(pk=1)
+    if not config.maximum_book_issue_limit:
+        # same defaults as installation/create_necessary_models.py
+        config.maximum_book_issue_limit = 3
+        config.maximum_day_limit = 10
+        config.save()
+
+    existing_books = Book.objects.filter(isbn__startswith=f'{PREFIX}-').count()
+    Book.objects.bulk_create([
+        Book(isbn=f'{PREFIX}-{n:06d}', title=f'{SEARCH_TERMS[n % len(SEARCH_TERMS)].title()} volume {n}',
+             subject=SEARCH_TERMS[(n * 7) % len(SEARCH_TERMS)], publisher='Bench Press', language='English', numer_of_pages=100 + n % 900)
+        for n in range(existing_books, books)
+    ], batch_size=batch_size)
+
+    existing_items = BookItem.objects.filter(barcode__startswith=f'{PREFIX}-').count()
+    for start in range(existing_items, items, batch_size):
+        stop = min(start + batch_size, items)
+        places = [(PREFIX.upper(), n) for n in range(start, stop)]
+        Rack.objects.bulk_create([Rack(number=n, location_identifier=location) for location, n in places])
+        racks = Rack.pks(places)
+        BookItem.objects.bulk_create([
+            BookItem(book_id=f'{PREFIX}-{n % books:06d}', barcode=f'{PREFIX}-{n:06d}', price=100,
+                     date_of_purchase=date.today(), placed_at_id=racks[location, n])
+            for location, n in places
+        ])
+    BookInventory.rebuild(list(Book.objects.filter(isbn__startswith=f'{PREFIX}-').values_list('pk', flat=True)))
+
+    group, _ = Group.objects.get_or_create(name='Librarian')
+    group.permissions.add(*Permission.objects.filter(content_type__app_label='lms', codename__in=LIBRARIAN_PERMISSIONS))
+    librarian, _ = User.objects.get_or_create(username=f'{PREFIX}-librarian', defaults={'first_name': 'Bench'})
+    librarian.groups.add(group)
+
+    next_id = (Account.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+    for n in range(patrons):
+        user, _ = User.objects.get_or_create(username=f'{PREFIX}-patron-{n}', defaults={'first_name': f'Patron {n}'})
+        if not Account.objects.filter(user=user).exists():
+            Account.objects.create(id=next_id, user=user, status=AccountStatus.Active)
+            next_id += 1
+    accounts = list(Account.objects.filter(user__username__startswith=f'{PREFIX}-patron-').select_related('user'))
+    return librarian, accounts
+
+
+def reset_fixture():
+    """Close what a previous run left open so every run starts from the same state."""
+    for reservation in BookReservation.active().filter(book__isbn__startswith=f'{PREFIX}-').order_by('-id'):
+        reservation.cancel_reservation()
+    BookLending.return_many(
+        list(BookLending.objects.filter(book_item__barcode__startswith=f'{PREFIX}-', return_date=None)),
+        date.today(),
+    )
+
+
+class InProcessTransport(object):
+    name = 'in-process'
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, token, data=None):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'}
+        if method == 'GET':
+            response = self.client.get(path, data, **headers)
+        else:
+            response = self.client.post(path, data, **headers)
+        return response.status_code
+
+
+class HttpTransport(object):
+
+    def __init__(self, base_url, timeout=30):
+        self.name = base_url
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, token, data=None):
+        url = self.base_url + path
+        body = None
+        if method == 'GET' and data:
+            url += '?' + urllib.parse.urlencode(data)
+        elif data:
+            body = urllib.parse.urlencode(data).encode('utf-8')
+        request = urllib.request.Request(url, data=body, method=method, headers={'Authorization': f'Token {token}'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class CirculationDay(object):
+    """Shared state of a run: which items are on the shelf, lent out or held."""
+
+    def __init__(self, librarian, accounts, rng):
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.librarian_token = Token.objects.get_or_create(user=librarian)[0].key
+        self.patrons = [(account.pk, Token.objects.get_or_create(user=account.user)[0].key) for account in accounts]
+        self.limit = LibraryConfig.object().maximum_book_issue_limit
+        self.isbns = list(Book.objects.filter(isbn__startswith=f'{PREFIX}-').values_list('pk', flat=True))
+        # browsing stays within the first pages a patron would click through
+        self.pages = max(1, min(10, len(self.isbns) // 5))
+        self.shelf = list(BookItem.objects.filter(barcode__startswith=f'{PREFIX}-', status=BookStatus.Available, is_reference_only=False)
+                                          .values_list('pk', flat=True))
+        self.lent = {}
+        self.issued = defaultdict(int)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def next_request(self):
+        """Pick an operation by the mix and return (operation, method, path, token, data, on_success)."""
+        rng = self.rng
+        with self.lock:
+            operation = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+            account_id, token = rng.choice(self.patrons)
+
+            if operation == 'issue' and self.shelf:
+                candidates = [patron for patron in self.patrons if self.issued[patron[0]] < self.limit]
+                if candidates:
+                    account_id, _ = rng.choice(candidates)
+                    barcode = self.shelf.pop(rng.randrange(len(self.shelf)))
+                    self.issued[account_id] += 1
+                    return ('issue', 'POST', reverse('book_issue'), self.librarian_token,
+                            {'account': account_id, 'book_item': barcode, 'bypass_issue_quota': 'false'},
+                            lambda: self.lent.__setitem__(barcode, account_id))
+            if operation in ('issue', 'return') and self.lent:
+                barcode = rng.choice(list(self.lent))
+                returned_by = self.lent.pop(barcode)
+                self.issued[returned_by] -= 1
+                return ('return', 'POST', reverse('lendings_return', kwargs={'barcode': barcode}), self.librarian_token, None,
+                        lambda: self.shelf.append(barcode))
+            if operation == 'reserve' and self.shelf:
+                barcode = self.shelf.pop(rng.randrange(len(self.shelf)))
+                return ('reserve', 'POST', reverse('book_reservation'), self.librarian_token,
+                        {'account': account_id, 'book_item': barcode}, None)
+
+            if operation == 'search':
+                return ('search', 'GET', reverse('book_list'), token, {'search': rng.choice(SEARCH_TERMS)}, None)
+            if operation == 'book_detail':
+                return ('book_detail', 'GET', reverse('book_detail', kwargs={'isbn': rng.choice(self.isbns)}), token, None, None)
+            if operation == 'notifications':
+                return ('notifications', 'GET', reverse('notification_list'), token, None, None)
+            return ('browse', 'GET', reverse('book_list'), token, {'page': rng.randint(1, self.pages)}, None)
+
+    def record(self, operation, elapsed, status_code, on_success):
+        with self.lock:
+            self.latencies[operation].append(elapsed)
+            if status_code >= 400:
+                self.errors[operation] += 1
+            elif on_success:
+                on_success()
+
+
+def run(transport_factory, librarian, accounts, requests=2000, concurrency=1, seed=42):
+    day = CirculationDay(librarian, accounts, random.Random(seed))
+    remaining = [requests]
+    counter_lock = threading.Lock()
+
+    def worker():
+        transport = transport_factory()
+        while True:
+            with counter_lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            operation, method, path, token, data, on_success = day.next_request()
+            started = time.perf_counter()
+            status_code = transport.request(method, path, token, data)
+            day.record(operation, time.perf_counter() - started, status_code, on_success)
+
+    def threaded_worker():
+        try:
+            worker()
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=threaded_worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for operation, latencies in sorted(day.latencies.items()):
+        summary = benchmarks.summarize(latencies)
+        summary['errors'] = day.errors[operation]
+        summary['rps'] = round(len(latencies) / elapsed, 2)
+        endpoints[operation] = summary
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(requests / elapsed, 2),
+        'errors': sum(day.errors.values()),
+        'endpoints': endpoints,
+    }
+
+
+def compare(old, new):
+    """Lines describing the change in throughput and p95 latency per endpoint."""
+    def change(before, after):
+        if not before:
+            return 'n/a'
+        return f'{(after - before) / before * 100:+.1f}%'
+
+    lines = [f'overall rps {old["rps"]} -> {new["rps"]} ({change(old["rps"], new["rps"])})']
+    for operation, stats in sorted(new['endpoints'].items()):
+        before = old['endpoints'].get(operation)
+        if before is None:
+            continue
+        lines.append(
+            f'{operation:<14} p95 {before["p95_ms"]}ms -> {stats["p95_ms"]}ms ({change(before["p95_ms"], stats["p95_ms"])}), '
+            f'p99 {before["p99_ms"]}ms -> {stats["p99_ms"]}ms ({change(before["p99_ms"], stats["p99_ms"])})'
+        )
+    return lines
+
+
+def load_results(path):
+    with open(path) as fp:
+        return json.load(fp)
+
+
+# Checkout contention stress test used by `manage.py bench_checkout`.
+#
+# Threads call the circulation engine directly (no HTTP) on a small set of hot
+# copies and patrons, so most checkouts race for the same rows. Afterwards
+# audit() compares every denormalized counter with the lending rows.
+
+def audit(barcode_prefix=f'{PREFIX}-'):
+    """Number of rows breaking each circulation invariant; all zero when nothing was lost."""
+    issue_limit = LibraryConfig.object().maximum_book_issue_limit
+    items = BookItem.objects.filter(barcode__startswith=barcode_prefix)
+    lent = BookLending.objects.filter(book_item__barcode__startswith=barcode_prefix)
+    lendings = lent.filter(return_date=None)
+    open_count = Count('booklending', filter=Q(booklending__return_date=None))
+
+    # everyone who ever borrowed one of these copies, so a count stuck above zero shows too
+    accounts = Account.objects.filter(pk__in=lent.values('account')).annotate(open=open_count)
+    books = Book.objects.filter(pk__in=items.values('book')).annotate(
+        issued_count=Count('bookitem', filter=Q(bookitem__status=BookStatus.Issued)),
+        available_count=Count('bookitem', filter=Q(bookitem__status=BookStatus.Available)),
+        reserved_count=Count('bookitem', filter=Q(bookitem__status=BookStatus.Reserved)),
+    )
+    return {
+        'double_issued': lendings.values('book_item').annotate(count=Count('pk')).filter(count__gt=1).count(),
+        'issued_without_lending': items.filter(status=BookStatus.Issued).exclude(pk__in=lendings.values('book_item')).count(),
+        'lent_but_not_issued': lendings.exclude(book_item__status=BookStatus.Issued).count(),
+        'wrong_issued_count': accounts.exclude(issued_book_count=F('open')).count(),
+        'over_issue_limit': accounts.filter(open__gt=issue_limit).count() if issue_limit else 0,
+        'wrong_inventory': books.exclude(
+            inventory__issued=F('issued_count'), inventory__available=F('available_count'), inventory__reserved=F('reserved_count'),
+        ).count(),
+    }
+
+
+def stress(accounts, barcodes, operations=2000, threads=4, seed=42, checkout_ratio=0.6):
+    """Hammer check_out()/return_book_item() on `barcodes` from `threads` threads."""
+    issue_limit = LibraryConfig.object().maximum_book_issue_limit or None
+    due_date = date.today()
+    remaining = [operations]
+    lock = threading.Lock()
+    stats = defaultdict(int)
+    latencies = []
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        own = defaultdict(int)
+        own_latencies = []
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            barcode = rng.choice(barcodes)
+            started = time.perf_counter()
+            try:
+                if rng.random() < checkout_ratio:
+                    account = Account.objects.get(pk=rng.choice(accounts).pk)
+                    BookLending.check_out(account, BookItem.objects.get(pk=barcode), due_date, issue_limit=issue_limit)
+                    own['checkouts'] += 1
+                    own_latencies.append(time.perf_counter() - started)
+                else:
+                    lending = BookLending.objects.select_related('account', 'book_item').filter(book_item=barcode, return_date=None).first()
+                    if lending is None:
+                        own['nothing_to_return'] += 1
+                        continue
+                    lending.return_book_item(due_date)
+                    own['returns'] += 1
+            except CirculationError:
+                own['conflicts'] += 1
+            except OperationalError:
+                # SQLite gave up waiting for the write lock; the transaction was rolled back
+                own['busy'] += 1
+        with lock:
+            for key, value in own.items():
+                stats[key] += value
+            latencies.extend(own_latencies)
+
+    def threaded_worker(n):
+        try:
+            worker(n)
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    if threads <= 1:
+        worker(0)
+    else:
+        pool = [threading.Thread(target=threaded_worker, args=(n,)) for n in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'threads': threads,
+        'operations': operations,
+        'elapsed_s': round(elapsed, 3),
+        'checkouts': stats['checkouts'],
+        'returns': stats['returns'],
+        'conflicts': stats['conflicts'],
+        'busy': stats['busy'],
+        'checkouts_per_second': round(stats['checkouts'] / elapsed, 1) if elapsed else 0,
+        'checkout_latency': benchmarks.summarize(latencies),
+    }
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from lms import benchmarks, loadtest
+
+
+class Command(BaseCommand):
+    help = 'Compare the sync read views behind a WSGI thread pool with the async ones on one ASGI event loop.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 1000], help='Clients with a request in flight.')
+        parser.add_argument('--wsgi-threads', type=int, default=8, help='Threads of the WSGI worker (e.g. gunicorn --threads).')
+        parser.add_argument('--books', type=int, default=200)
+        parser.add_argument('--items', type=int, default=1000)
+        parser.add_argument('--patrons', type=int, default=20)
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        _, accounts = loadtest.setup_fixture(options['books'], options['items'], options['patrons'])
+        account = accounts[0]
+        token = Token.objects.get_or_create(user=account.user)[0].key
+        isbn = f'{loadtest.PREFIX}-000000'
+        # the same reads through both stacks; sync and async URL for each
+        self.paths = [
+            (reverse('book_list'), reverse('async_book_list')),
+            (reverse('book_detail', kwargs={'isbn': isbn}), reverse('async_book_detail', kwargs={'isbn': isbn})),
+            (reverse('user_lendings_list', kwargs={'id': account.pk}), reverse('async_my_lendings')),
+            (reverse('user_reservations_list', kwargs={'id': account.pk}), reverse('async_my_reservations')),
+            (reverse('notification_list'), reverse('async_notifications')),
+        ]
+        self.token = token
+
+        runs = []
+        for concurrency in options['concurrency']:
+            for server in ('wsgi', 'asgi'):
+                stats = asyncio.run(self.run(server, concurrency, options['requests'], options['wsgi_threads']))
+                runs.append(stats)
+                latency = stats['latency']
+                self.stdout.write(
+                    f'{server} concurrency={concurrency:<5} {stats["rps"]:>8} req/s  p50={latency["p50_ms"]}ms '
+                    f'p95={latency["p95_ms"]}ms p99={latency["p99_ms"]}ms errors={stats["errors"]} threads={stats["peak_threads"]}'
+                )
+
+        if options['output']:
+            benchmarks.write_results(options['output'], {
+                'benchmark': 'asgi',
+                'requests': options['requests'],
+                'wsgi_threads': options['wsgi_threads'],
+                'runs': runs,
+                'environment': benchmarks.environment(),
+            })
+
+    async def run(self, server, concurrency, requests, wsgi_threads):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = [0]
+        peak_threads = [threading.active_count()]
+
+        if server == 'wsgi':
+            local = threading.local()
+            pool = ThreadPoolExecutor(max_workers=wsgi_threads, initializer=lambda: setattr(local, 'client', Client()))
+
+            def get(path):
+                try:
+                    return local.client.get(path, HTTP_AUTHORIZATION=f'Token {self.token}').status_code
+                finally:
+                    connections.close_all()
+
+            async def fetch(path):
+                return await loop.run_in_executor(pool, get, path)
+        else:
+            client = AsyncClient()
+            pool = None
+
+            async def fetch(path):
+                return (await client.get(path, authorization=f'Token {self.token}')).status_code
+
+        async def one(n):
+            sync_path, async_path = self.paths[n % len(self.paths)]
+            # unique query so the response cache answers neither stack
+            path = f'{sync_path if server == "wsgi" else async_path}?run={n}'
+            async with semaphore:
+                started = time.perf_counter()
+                status = await fetch(path)
+                latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors[0] += 1
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(requests)))
+        elapsed = time.perf_counter() - started
+        if pool is not None:
+            pool.shutdown()
+
+        return {
+            'server': server,
+            'concurrency': concurrency,
+            'elapsed_s': round(elapsed, 3),
+            'rps': round(requests / elapsed, 1),
+            'errors': errors[0],
+            'peak_threads': peak_threads[0],
+            'latency': benchmarks.summarize(latencies),
+        }
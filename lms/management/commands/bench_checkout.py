@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lms import benchmarks, loadtest
+
+
+class Command(BaseCommand):
+    help = 'Race concurrent checkouts and returns for a few hot copies, then check that no update was lost.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=2000, help='Checkouts and returns per run.')
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8])
+        parser.add_argument('--hot-items', type=int, default=20, help='Copies every thread competes for.')
+        parser.add_argument('--patrons', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        _, accounts = loadtest.setup_fixture(books=max(1, options['hot_items'] // 2), items=options['hot_items'], patrons=options['patrons'])
+        accounts = accounts[:options['patrons']]
+        barcodes = [f'{loadtest.PREFIX}-{n:06d}' for n in range(options['hot_items'])]
+
+        runs = []
+        failed = False
+        for threads in options['threads']:
+            loadtest.reset_fixture()
+            stats = loadtest.stress(accounts, barcodes, options['operations'], threads, options['seed'])
+            stats['violations'] = loadtest.audit()
+            runs.append(stats)
+            broken = {name: count for name, count in stats['violations'].items() if count}
+            failed = failed or bool(broken)
+            self.stdout.write(
+                'threads={threads} checkouts={checkouts} returns={returns} conflicts={conflicts} busy={busy} '
+                '{elapsed_s}s {checkouts_per_second} checkouts/s p95={p95}ms'.format(p95=stats['checkout_latency'].get('p95_ms', 0), **stats)
+            )
+            if broken:
+                self.stdout.write(self.style.ERROR(f'  invariants broken: {broken}'))
+        loadtest.reset_fixture()
+
+        if options['output']:
+            benchmarks.write_results(options['output'], {
+                'benchmark': 'checkout',
+                'hot_items': options['hot_items'],
+                'patrons': options['patrons'],
+                'runs': runs,
+                'environment': benchmarks.environment(),
+            })
+        if failed:
+            raise CommandError('Lost updates detected.')
+        self.stdout.write(self.style.SUCCESS('No lost updates.'))
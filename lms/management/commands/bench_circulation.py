@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from lms import benchmarks, loadtest
+
+
+class Command(BaseCommand):
+    help = 'Replay a circulation-day request mix and report RPS and p50/p95/p99 latency per endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server sharing this database (default: in-process).')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--books', type=int, default=200)
+        parser.add_argument('--items', type=int, default=1000)
+        parser.add_argument('--patrons', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='Results JSON of an earlier run to compare against.')
+
+    def handle(self, *args, **options):
+        librarian, accounts = loadtest.setup_fixture(options['books'], options['items'], options['patrons'])
+        loadtest.reset_fixture()
+
+        if options['url']:
+            transport_factory = lambda: loadtest.HttpTransport(options['url'])
+        else:
+            transport_factory = loadtest.InProcessTransport
+
+        results = loadtest.run(transport_factory, librarian, accounts, options['requests'], options['concurrency'], options['seed'])
+        loadtest.reset_fixture()
+        results.update({
+            'benchmark': 'circulation',
+            'target': options['url'] or 'in-process',
+            'environment': benchmarks.environment(),
+        })
+
+        self.stdout.write('{requests} requests in {elapsed_s}s: {rps} req/s, {errors} errors'.format(**results))
+        for operation, stats in results['endpoints'].items():
+            self.stdout.write(
+                f'  {operation:<14} n={stats["count"]:<5} rps={stats["rps"]:<8} '
+                f'p50={stats["p50_ms"]}ms p95={stats["p95_ms"]}ms p99={stats["p99_ms"]}ms errors={stats["errors"]}'
+            )
+        if options['compare']:
+            for line in loadtest.compare(loadtest.load_results(options['compare']), results):
+                self.stdout.write(line)
+        if options['output']:
+            benchmarks.write_results(options['output'], results)
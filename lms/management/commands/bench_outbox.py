@@ -0,0 +1,59 @@
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from lms import benchmarks, outbox
+from lms.models import Account, EmailNotification, Notification
+
+
+class Command(BaseCommand):
+    help = 'Measure e-mail outbox throughput against a local backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=10000)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--backend', default='django.core.mail.backends.locmem.EmailBackend',
+                            help='e.g. the SMTP backend pointed at a local SMTP stand-in.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        account = Account.objects.first()
+        if account is None:
+            raise CommandError('Needs at least one account.')
+
+        runs = []
+        for workers in options['workers']:
+            queued = self.queue(account, options['emails'])
+            mail.outbox = []
+            stats = outbox.run(workers, options['batch_size'], options['backend'])
+            stats['workers'] = workers
+            stats['emails_per_second'] = round(stats['sent'] / stats['elapsed'], 1) if stats['elapsed'] else 0
+            runs.append(stats)
+            self.stdout.write('workers={workers} sent={sent} failed={failed} {elapsed:.2f}s {emails_per_second}/s'.format(**stats))
+            Notification.objects.filter(pk__in=queued).delete()
+
+        results = {
+            'benchmark': 'outbox',
+            'emails': options['emails'],
+            'batch_size': options['batch_size'],
+            'backend': options['backend'],
+            'runs': runs,
+            'environment': benchmarks.environment(),
+        }
+        if options['output']:
+            benchmarks.write_results(options['output'], results)
+
+    def queue(self, account, count):
+        # created directly so the run does not depend on LMS_EMAIL_NOTIFICATIONS
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create(
+                [Notification(account=account, content=f'Benchmark notification {n}', is_read=True) for n in range(count)],
+                batch_size=1000,
+            )
+            EmailNotification.objects.filter(notification__in=notifications).delete()
+            EmailNotification.objects.bulk_create(
+                [EmailNotification(notification=notification, email='bench@example.com') for notification in notifications],
+                batch_size=1000,
+            )
+        return [notification.pk for notification in notifications]
@@ -0,0 +1,90 @@
+import random
+import unicodedata
+
+from django.core.management.base import BaseCommand
+
+from lms import benchmarks, search
+from lms.models import Book
+
+
+WORDS = [
+    'machine', 'learning', 'history', 'modern', 'ancient', 'physics', 'chemistry', 'garden',
+    'python', 'systems', 'design', 'café', 'société', 'économie', 'Müller', 'naïve', 'résumé',
+    'poetry', 'mountain', 'river', 'empire', 'quantum', 'theory', 'practical', 'kitchen',
+    'journey', 'ocean', 'database', 'network', 'philosophy', 'música', 'niño', 'über',
+]
+SUBJECTS = ['Data Science', 'History', 'Physics', 'Literature', 'Cooking', 'Économie', 'Music', 'Travel']
+PUBLISHERS = ['Oreally', 'Push', 'Pearson', 'Springer', 'Gallimard', 'Penguin', 'Éditions du Seuil']
+
+
+class Command(BaseCommand):
+    help = 'Measure catalog search latency (p50/p95/p99) on a large catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000000, help='Catalog size to benchmark against.')
+        parser.add_argument('--populate', action='store_true', help='Insert synthetic books until --books exist.')
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--page-size', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        existing = Book.objects.count()
+        if existing < options['books'] and options['populate']:
+            with benchmarks.Stopwatch() as sw:
+                self.populate(rng, existing, options['books'], options['batch_size'])
+            self.stdout.write(f'Inserted {options["books"] - existing} books in {sw.elapsed:.1f}s')
+        catalog_size = Book.objects.count()
+
+        queries = [self.make_query(rng) for _ in range(options['queries'])]
+        latencies = []
+        for query in queries:
+            with benchmarks.Stopwatch() as sw:
+                results = search.search_books(Book.objects.all(), query)
+                # what a list page costs: the count plus the first page
+                results.count()
+                list(results[:options['page_size']])
+            latencies.append(sw.elapsed)
+
+        summary = benchmarks.summarize(latencies)
+        results = {
+            'benchmark': 'search',
+            'catalog_size': catalog_size,
+            'full_text_index': search.fts_available(Book.objects.db),
+            'search': summary,
+            'environment': benchmarks.environment(),
+        }
+        self.stdout.write(
+            'catalog={catalog_size} fts={full_text_index} '.format(**results) +
+            'p50={p50_ms}ms p95={p95_ms}ms p99={p99_ms}ms over {count} queries'.format(**summary)
+        )
+        if options['output']:
+            benchmarks.write_results(options['output'], results)
+
+    def make_query(self, rng):
+        words = rng.sample(WORDS, rng.choice([1, 1, 2]))
+        kind = rng.random()
+        if kind < 0.3:
+            # prefix, as typed into a search box
+            words[-1] = words[-1][:3]
+        elif kind < 0.5:
+            # unaccented spelling of accented titles
+            words = [unicodedata.normalize('NFKD', word).encode('ascii', 'ignore').decode() for word in words]
+        return ' '.join(words)
+
+    def populate(self, rng, start, stop, batch_size):
+        for offset in range(start, stop, batch_size):
+            books = []
+            for n in range(offset, min(offset + batch_size, stop)):
+                books.append(Book(
+                    isbn=str(8000000000000 + n),
+                    title=' '.join(rng.sample(WORDS, rng.randint(2, 5))).capitalize(),
+                    subject=rng.choice(SUBJECTS),
+                    publisher=rng.choice(PUBLISHERS),
+                    language='English',
+                    numer_of_pages=rng.randint(40, 1200),
+                ))
+            Book.objects.bulk_create(books, ignore_conflicts=True)
@@ -0,0 +1,66 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lms import benchmarks, catalog_import
+
+
+class Command(BaseCommand):
+    help = 'Import books and copies from a CSV or mnemonic MARC file in chunks, resuming after a crash.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(catalog_import.READERS), help='Default: marc for .mrk/.marc files, else csv.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--location', default='MAIN', help='Rack location for copies that do not name one.')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: PATH.checkpoint).')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint.')
+        parser.add_argument('--rejects', help='Append rejected records to this CSV file.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No such file: {path}')
+        fmt = options['format'] or ('marc' if os.path.splitext(path)[1].lower() in ('.mrk', '.marc') else 'csv')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        if options['restart'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        rejects = open(options['rejects'], 'a', newline='') if options['rejects'] else None
+        writer = csv.writer(rejects) if rejects else None
+
+        def on_reject(number, record, error):
+            if writer:
+                writer.writerow([number, error, record.get('isbn', ''), record.get('barcode', '')])
+            elif options['verbosity'] > 1:
+                self.stderr.write(f'  record {number}: {error}')
+
+        def on_chunk(stats, rate):
+            self.stdout.write(f'  {stats["records"]} records, {rate:.0f} rows/s')
+
+        importer = catalog_import.CatalogImport(options['chunk_size'], options['location'], on_reject)
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as lines:
+                stats = importer.run(catalog_import.READERS[fmt](lines), checkpoint, os.path.abspath(path),
+                                     on_chunk if options['verbosity'] > 1 else None)
+        finally:
+            if rejects:
+                rejects.close()
+
+        if stats['resumed_at']:
+            self.stdout.write(f'Resumed after record {stats["resumed_at"]}.')
+        self.stdout.write(self.style.SUCCESS(
+            'Imported {records} records: {books_created} books created, {books_updated} updated, '
+            '{items_created} copies created, {items_existing} already there, {rejected} rejected '
+            '({rows_per_second} rows/s)'.format(**stats)
+        ))
+        if options['output']:
+            benchmarks.write_results(options['output'], {
+                'benchmark': 'import_catalog',
+                'format': fmt,
+                'chunk_size': options['chunk_size'],
+                'results': stats,
+                'environment': benchmarks.environment(),
+            })
@@ -0,0 +1,32 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from lms import benchmarks
+from lms.models import BookReservation
+
+
+class Command(BaseCommand):
+    help = 'Print the copies to pull from the racks for reservations, in walking order.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location', nargs='*', help='Only these rack locations.')
+        parser.add_argument('--output', help='Write the list as CSV to this file instead.')
+
+    def handle(self, *args, **options):
+        fields = ('stop',) + BookReservation.PICK_FIELDS
+        with benchmarks.Stopwatch() as sw:
+            if options['output']:
+                with open(options['output'], 'w', newline='') as f:
+                    count = self.write(csv.writer(f).writerow, fields, options['location'])
+            else:
+                count = self.write(lambda row: self.stdout.write('\t'.join('' if value is None else str(value) for value in row)),
+                                   fields, options['location'])
+        self.stdout.write(self.style.SUCCESS(f'{count} copies to pull ({sw.elapsed:.2f}s)'))
+
+    def write(self, writerow, fields, locations):
+        writerow(fields)
+        count = 0
+        for count, row in enumerate(BookReservation.pick_list(locations or None), 1):
+            writerow([count] + [row[field] for field in fields[1:]])
+        return count
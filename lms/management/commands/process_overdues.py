@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from lms.models import FineAccrual
+
+
+class Command(BaseCommand):
+    help = 'Accrue fines for open lendings past their due date and notify newly overdue patrons.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Process as of this date (YYYY-MM-DD, default today).')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['date']:
+            today = datetime.date.fromisoformat(options['date'])
+        else:
+            today = datetime.datetime.now().date()
+
+        stats = FineAccrual.process_overdues(today, chunk_size=options['chunk_size'], progress=self.progress)
+        rate = stats['processed'] / stats['elapsed'] if stats['elapsed'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            'Processed {processed} overdue lendings ({created} new, {updated} updated, '
+            '{notified} notified, {removed} stale removed) '.format(**stats) +
+            f'in {stats["elapsed"]:.2f}s, {rate:.0f} lendings/s'
+        ))
+
+    def progress(self, stats, elapsed):
+        if self.verbosity > 1:
+            self.stdout.write(f'  {stats["processed"]} lendings, {elapsed:.1f}s')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from lms import search
+
+
+class Command(BaseCommand):
+    help = 'Install (if needed) and rebuild the catalog full-text search index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if not search.install(options['database']):
+            raise CommandError('Full-text index is not available on this database, search uses the fallback.')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
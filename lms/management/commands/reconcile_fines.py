@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from lms import benchmarks
+from lms.models import FineTransaction
+
+
+class Command(BaseCommand):
+    help = 'Check every account\'s fine balance against the fine ledger and its fines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Post missing accruals and reset balances from the ledger.')
+
+    def handle(self, *args, **options):
+        with benchmarks.Stopwatch() as sw:
+            mismatched = FineTransaction.reconcile(fix=options['fix'])
+        for account_id, balance, ledger, owed in mismatched:
+            self.stdout.write(f'account {account_id}: balance {balance}, ledger {ledger}, fines owed {owed}')
+        if mismatched:
+            self.stdout.write(self.style.WARNING(f'{len(mismatched)} account(s) do not reconcile ({sw.elapsed:.2f}s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All fine balances reconcile ({sw.elapsed:.2f}s)'))
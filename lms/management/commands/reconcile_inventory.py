@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from lms.models import BookInventory
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-Book inventory counters from BookItem rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('isbn', nargs='*', help='Only rebuild these books (default: whole catalog).')
+
+    def handle(self, *args, **options):
+        book_ids = options['isbn'] or None
+        rebuilt = BookInventory.rebuild(book_ids=book_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt inventory for {rebuilt} book(s).'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from lms.models import Notification
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-account unread notification counters from Notification rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('account', nargs='*', type=int, help='Only recount these account ids (default: all).')
+
+    def handle(self, *args, **options):
+        updated = Notification.recount_unread(options['account'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Recounted unread notifications for {updated} account(s).'))
@@ -0,0 +1,260 @@
+import contextlib
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.db.models import F, Max, OuterRef, Subquery
+
+from lms import benchmarks
+from lms.models import Account, Book, BookInventory, BookItem, BookLending, CirculationRollup, Fine, FineTransaction, LibraryConfig, Notification
+from lms.models.account import AccountStatus
+from lms.models.book import BookFormat, BookStatus, Rack
+
+
+# Synthetic rows are numbered so any of them can be referenced from its index
+# alone; nothing but the current chunk is ever held in memory.
+ISBN = '999{:010d}'
+BARCODE = 'S{:011d}'
+USERNAME = 'seed{}'
+
+WORDS = [
+    'machine', 'learning', 'history', 'modern', 'ancient', 'physics', 'chemistry', 'garden', 'python', 'systems',
+    'design', 'poetry', 'mountain', 'river', 'empire', 'quantum', 'theory', 'practical', 'kitchen', 'journey',
+    'ocean', 'database', 'network', 'philosophy', 'music', 'economics', 'society', 'biology', 'art', 'war',
+]
+SUBJECTS = ['Data Science', 'History', 'Physics', 'Literature', 'Cooking', 'Economics', 'Music', 'Travel', 'Biology', 'Art']
+PUBLISHERS = ['Oreally', 'Push', 'Pearson', 'Springer', 'Gallimard', 'Penguin', 'Wiley', 'Macmillan']
+LANGUAGES = ['English'] * 8 + ['Hindi', 'French']
+FIRST_NAMES = ['Abrar', 'Atul', 'Diwakar', 'Raju', 'Priya', 'Anita', 'Rahul', 'Sara', 'Vikram', 'Meera']
+
+
+def zipf_index(rng, n):
+    # Zipf-like (s=1) rank in [0, n): P(k) ~ 1/(k+1), sampled in O(1) without a table
+    return min(n - 1, int((n + 1) ** rng.random()) - 1)
+
+
+@contextlib.contextmanager
+def historical_dates():
+    # let bulk_create keep the generated dates instead of stamping today
+    fields = [BookLending._meta.get_field('creation_date'), Notification._meta.get_field('created_on')]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic catalog, membership and circulation history with chunked bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100000)
+        parser.add_argument('--items', type=int, default=300000)
+        parser.add_argument('--accounts', type=int, default=50000)
+        parser.add_argument('--lendings', type=int, default=1000000)
+        parser.add_argument('--open-ratio', type=float, default=0.02, help='Share of lendings still out.')
+        parser.add_argument('--late-ratio', type=float, default=0.15, help='Share of returns made after the due date.')
+        parser.add_argument('--days', type=int, default=730, help='Length of the generated history.')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.today = datetime.date.today()
+        self.config = LibraryConfig.object()
+        self.inserted = 0
+
+        if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+            # a seeding run can simply be repeated if the machine dies half way
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+
+        with benchmarks.Stopwatch() as total:
+            self.books = self.seed_books(options['books'])
+            self.items = self.seed_items(options['items'])
+            self.accounts = self.seed_accounts(options['accounts'])
+            with historical_dates():
+                self.seed_history(options['lendings'], options['open_ratio'], options['late_ratio'], options['days'])
+            self.step('counters', self.recount)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Inserted {self.inserted} rows in {total.elapsed:.1f}s ({self.inserted / max(total.elapsed, 1e-9):.0f} rows/s)'
+        ))
+
+    def step(self, name, func, *args):
+        with benchmarks.Stopwatch() as sw:
+            result = func(*args)
+        self.stdout.write(f'  {name}: {sw.elapsed:.1f}s')
+        return result
+
+    def chunks(self, start, stop):
+        for offset in range(start, stop, self.chunk_size):
+            yield range(offset, min(offset + self.chunk_size, stop))
+
+    def insert(self, model, objs):
+        model._base_manager.bulk_create(objs, batch_size=self.chunk_size)
+        # with DEBUG on, the logged INSERTs alone would grow without bound
+        reset_queries()
+        self.inserted += len(objs)
+        return objs
+
+    def seed_books(self, count):
+        # continues numbering after a previous run, so runs can be stacked
+        start = Book.objects.filter(isbn__startswith=ISBN[:3]).count()
+        rng = self.rng
+        with benchmarks.Stopwatch() as sw:
+            for chunk in self.chunks(start, start + count):
+                with transaction.atomic():
+                    self.insert(Book, [Book(
+                        isbn=ISBN.format(n),
+                        title=' '.join(rng.sample(WORDS, rng.randint(2, 5))).capitalize(),
+                        subject=rng.choice(SUBJECTS),
+                        publisher=rng.choice(PUBLISHERS),
+                        language=rng.choice(LANGUAGES),
+                        numer_of_pages=rng.randint(40, 1200),
+                    ) for n in chunk])
+        self.stdout.write(f'  books: {count} in {sw.elapsed:.1f}s')
+        return start + count
+
+    def seed_items(self, count):
+        start = BookItem.objects.filter(barcode__startswith=BARCODE[0]).count()
+        rng = self.rng
+        formats = [choice for choice, _ in BookFormat.choices]
+        with benchmarks.Stopwatch() as sw:
+            for chunk in self.chunks(start, start + count):
+                with transaction.atomic():
+                    # every item needs a rack of its own (placed_at is one-to-one)
+                    racks = self.insert(Rack, [Rack(number=n % 1000, location_identifier=f'R{n // 1000 % 100000}') for n in chunk])
+                    self.insert(BookItem, [BookItem(
+                        book_id=ISBN.format(zipf_index(rng, self.books)),
+                        barcode=BARCODE.format(n),
+                        is_reference_only=rng.random() < 0.03,
+                        price=rng.randint(100, 5000),
+                        format=rng.choice(formats),
+                        date_of_purchase=self.today - datetime.timedelta(days=rng.randint(0, 3650)),
+                        placed_at=rack,
+                    ) for n, rack in zip(chunk, racks)])
+        self.stdout.write(f'  items: {count} in {sw.elapsed:.1f}s')
+        return start + count
+
+    def seed_accounts(self, count):
+        start = User.objects.filter(username__startswith=USERNAME.format('')).count()
+        first_id = (Account.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        password = make_password(None)
+        rng = self.rng
+        with benchmarks.Stopwatch() as sw:
+            for chunk in self.chunks(start, start + count):
+                with transaction.atomic():
+                    self.insert(User, [User(
+                        username=USERNAME.format(n),
+                        first_name=rng.choice(FIRST_NAMES),
+                        email=f'seed{n}@example.com',
+                        password=password,
+                    ) for n in chunk])
+                    # read back: bulk_create() only sets pks on some backends
+                    user_ids = dict(User.objects.filter(username__in=[USERNAME.format(n) for n in chunk]).values_list('username', 'pk'))
+                    self.insert(Account, [Account(
+                        id=first_id + n - start,
+                        user_id=user_ids[USERNAME.format(n)],
+                        status=AccountStatus.Active if rng.random() < 0.95 else AccountStatus.Closed,
+                        phone_number=f'+91{rng.randint(7000000000, 9999999999)}',
+                    ) for n in chunk])
+        self.stdout.write(f'  accounts: {count} in {sw.elapsed:.1f}s')
+        return (first_id, first_id + count)
+
+    def seed_history(self, count, open_ratio, late_ratio, days):
+        rng = self.rng
+        first_account, stop_account = self.accounts
+        if stop_account == first_account:
+            first_account = Account.objects.order_by('id').values_list('id', flat=True).first()
+            stop_account = first_account + 1 if first_account else None
+        if not count or stop_account is None or not self.items:
+            return
+        account_count = stop_account - first_account
+        loan_days = self.config.maximum_day_limit or 14
+        fine_per_day = self.config.fine_per_late_day
+
+        open_count = min(int(count * open_ratio), BookItem.objects.filter(barcode__startswith=BARCODE[0], status=BookStatus.Available).count())
+        returned_count = count - open_count
+
+        with benchmarks.Stopwatch() as sw:
+            for chunk in self.chunks(0, returned_count):
+                lendings = []
+                for _ in chunk:
+                    created = self.today - datetime.timedelta(days=rng.randint(loan_days + 1, max(days, loan_days + 1)))
+                    due = created + datetime.timedelta(days=loan_days)
+                    if rng.random() < late_ratio:
+                        returned = due + datetime.timedelta(days=rng.randint(1, 30))
+                    else:
+                        returned = created + datetime.timedelta(days=rng.randint(0, loan_days))
+                    lendings.append(BookLending(
+                        account_id=first_account + zipf_index(rng, account_count),
+                        book_item_id=BARCODE.format(zipf_index(rng, self.items)),
+                        creation_date=created, due_date=due, return_date=min(returned, self.today),
+                    ))
+                with transaction.atomic():
+                    last = BookLending.objects.aggregate(Max('pk'))['pk__max'] or 0
+                    self.insert(BookLending, lendings)
+                    # read back the late ones: bulk_create() only sets pks on some backends
+                    late = BookLending.objects.filter(pk__gt=last, return_date__gt=F('due_date')).values_list('pk', 'due_date', 'return_date')
+                    self.insert(Fine, [
+                        Fine(lending_id=pk, amount=(return_date - due_date).days * fine_per_day)
+                        for pk, due_date, return_date in late
+                    ])
+                    self.insert(Notification, self.notifications(lendings))
+        self.stdout.write(f'  returned lendings: {returned_count} in {sw.elapsed:.1f}s')
+
+        # lendings still out hold distinct items that are currently on the shelf
+        with benchmarks.Stopwatch() as sw:
+            shelf = BookItem.objects.filter(barcode__startswith=BARCODE[0], status=BookStatus.Available, is_reference_only=False) \
+                                    .order_by('barcode').values_list('barcode', flat=True)
+            limit = self.config.maximum_book_issue_limit or 3
+            assigned = 0
+            while assigned < open_count:
+                barcodes = list(shelf[:min(self.chunk_size, open_count - assigned)])
+                if not barcodes:
+                    break
+                lendings = []
+                for n, barcode in enumerate(barcodes, assigned):
+                    created = self.today - datetime.timedelta(days=rng.randint(0, loan_days * 2))
+                    lendings.append(BookLending(
+                        # spread over accounts so nobody is past the issue limit
+                        account_id=first_account + (n // limit) % account_count,
+                        book_item_id=barcode,
+                        creation_date=created, due_date=created + datetime.timedelta(days=loan_days),
+                    ))
+                with transaction.atomic():
+                    self.insert(BookLending, lendings)
+                    self.insert(Notification, self.notifications(lendings))
+                    lending = BookLending.objects.filter(book_item=OuterRef('pk'), return_date=None)
+                    BookItem.objects.filter(barcode__in=barcodes).update(
+                        status=BookStatus.Issued,
+                        borrowed=Subquery(lending.values('creation_date')[:1]),
+                        due_date=Subquery(lending.values('due_date')[:1]),
+                    )
+                assigned += len(barcodes)
+        self.stdout.write(f'  open lendings: {assigned} in {sw.elapsed:.1f}s')
+
+    def notifications(self, lendings):
+        rng = self.rng
+        recent = self.today - datetime.timedelta(days=30)
+        return [Notification(
+            account_id=lending.account_id,
+            created_on=lending.creation_date,
+            content=f'Book with barcode {lending.book_item_id} issued, due on {lending.due_date}.',
+            is_read=lending.creation_date < recent or rng.random() < 0.5,
+        ) for lending in lendings]
+
+    def recount(self):
+        # the bulk inserts above bypass the code paths that keep these in step
+        BookInventory.rebuild()
+        Account.recount_issued()
+        Notification.recount_unread()
+        CirculationRollup.rebuild()
+        FineTransaction.reconcile(fix=True)
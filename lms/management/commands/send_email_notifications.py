@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from lms import outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued e-mail notifications in batches, retrying failures with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of concurrent sending threads.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Rows claimed (and sent per connection) at a time.')
+        parser.add_argument('--backend', help='Email backend to use instead of EMAIL_BACKEND.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new rows.')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds between polls with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = outbox.run(options['workers'], options['batch_size'], options['backend'])
+            if stats['batches'] or not options['loop']:
+                rate = stats['sent'] / stats['elapsed'] if stats['elapsed'] else 0
+                self.stdout.write(
+                    'Sent {sent}, failed {failed} in {batches} batches '.format(**stats) +
+                    f'({stats["elapsed"]:.2f}s, {rate:.0f} emails/s)'
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
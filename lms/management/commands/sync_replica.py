@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from mysite import routers
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the replica file (local stand-in for replication).'
+
+    def handle(self, *args, **options):
+        alias = routers.get_replica()
+        if alias is None:
+            raise CommandError('No replica configured; set LMS_REPLICA_DATABASE_NAME.')
+        primary, replica = connections['default'], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Only SQLite files can be synced; real replicas are kept up to date by the database.')
+
+        replica.close()
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            # an online backup: the primary can keep serving writes meanwhile
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f'Copied {primary.settings_dict["NAME"]} to {replica.settings_dict["NAME"]}.'))
@@ -1,6 +1,7 @@
-from lms.models.book import Book, BookItem, BookStatus, Rack
+from lms.models.book import Book, BookInventory, BookItem, BookStatus, Rack
 from lms.models.library import LibraryConfig
 from lms.models.account import Account
-from lms.models.action import BookReservation, BookLending, BookReservationFormat, ReservationStatus
+from lms.models.action import BookReservation, BookLending, BookReservationFormat, CirculationError, ReservationStatus
 from lms.models.notification import Notification, EmailNotification
-from lms.models.fine import Fine, FineTransaction, CashTransaction
+from lms.models.fine import Fine, FineAccrual, FineError, FineTransaction, FineTransactionType, CashTransaction
+from lms.models.report import CirculationRollup
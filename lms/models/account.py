@@ -2,6 +2,7 @@ from django.db import models
 from django.utils.functional import cached_property
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from lms.principal import get_principal
 
 
 class AccountStatus(models.TextChoices):
@@ -21,9 +22,29 @@ class Account(models.Model):
         db_index=True
     )
     issued_book_count = models.PositiveIntegerField(default=0, db_index=True)
+    # kept in step by Notification.objects.create/bulk_create and Notification.mark_read
+    unread_notification_count = models.PositiveIntegerField(default=0)
+    # fines owed, kept in step by the FineTransaction ledger
+    fine_balance = models.PositiveIntegerField(default=0, db_index=True)
     phone_regex = RegexValidator(regex=r'^\+?1?\d{9,15}$', message="Phone number must be entered in the format: '+999999999'. Up to 15 digits allowed.")
     phone_number = models.CharField(validators=[phone_regex], max_length=17, blank=True) # Validators should be a list
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # lets lms.authentication tell status changes from counter updates
+        instance._loaded_access = (instance.__dict__.get('user_id'), instance.__dict__.get('status'))
+        return instance
+
+    # kept up to date in SQL by circulation, notifications and fines
+    COUNTERS = ('issued_book_count', 'unread_notification_count', 'fine_balance')
+
+    def refresh_from_db(self, using=None, fields=None):
+        # counters left deferred (lms.authentication) are loaded together
+        if fields is not None and set(fields) & set(self.COUNTERS):
+            fields = set(fields) | (set(self.COUNTERS) & self.get_deferred_fields())
+        super().refresh_from_db(using=using, fields=fields)
+
     def __str__(self):
         return self.user.username
     
@@ -35,35 +56,37 @@ class Account(models.Model):
 
     @classmethod
     def can_reserve_book_for_others(self, user):
-        return user.has_perm('lms.can_reserve_for_others')
+        return get_principal(user).has_perm('lms.can_reserve_for_others')
     
     def can_reserve_for_own(self):
         return self.status == AccountStatus.Active
 
     def is_librarian(user):
-        return user.groups.filter(name='Librarian').exists()
+        return get_principal(user).in_group('Librarian')
 
     @classmethod
     def can_return(cls, user):
-        return user.has_perm('lms.can_return_book_item')
+        return get_principal(user).has_perm('lms.can_return_book_item')
     
     @classmethod
     def can_checkout(cls, user):
-        return user.has_perm('lms.can_checkout_book_item')
+        return get_principal(user).has_perm('lms.can_checkout_book_item')
     
     @classmethod
     def can_see_lending(cls, user, lending):
-        if hasattr(user, 'account') and lending.account == user.account:
+        account_id = get_principal(user).account_id
+        if account_id is not None and lending.account_id == account_id:
             return True
         else:
             return cls.can_see_all_reservations(user)
     
     @classmethod
     def can_see_books(self, user):
-        if user.has_perm('lms.view_book'):
+        principal = get_principal(user)
+        if principal.has_perm('lms.view_book'):
             return True
-        elif hasattr(user, 'account'):
-            return user.account.status == AccountStatus.Active
+        elif principal.account_id is not None:
+            return principal.account_status == AccountStatus.Active
     
     def can_see_reservation(self, reservation):
         if reservation.account == self:
@@ -73,11 +96,11 @@ class Account(models.Model):
     
     @classmethod
     def can_see_all_reservations(self, user):
-        return user.has_perm('lms.view_bookreservation')
+        return get_principal(user).has_perm('lms.view_bookreservation')
     
     @classmethod
     def can_see_all_lendings(cls, user):
-        return user.has_perm('lms.view_booklending')
+        return get_principal(user).has_perm('lms.view_booklending')
     
     def is_active(self):
         return self.status == AccountStatus.Active
@@ -91,6 +114,18 @@ class Account(models.Model):
         from lms.models.action import BookLending
 
         self.issued_book_count = BookLending.objects.filter(account=self, return_date=None).count()
-        self.save()
+        Account.objects.filter(pk=self.pk).update(issued_book_count=self.issued_book_count)
         return self.issued_book_count
 
+    @classmethod
+    def recount_issued(cls, accounts=None):
+        """Rebuild issued_book_count from open lendings in one UPDATE; returns the number of accounts."""
+        from django.db.models import Count, OuterRef, Subquery
+        from django.db.models.functions import Coalesce
+        from lms.models.action import BookLending
+
+        open_lendings = BookLending.objects.filter(account=OuterRef('pk'), return_date=None) \
+                                           .values('account').annotate(count=Count('pk')).values('count')
+        queryset = cls.objects.all() if accounts is None else accounts
+        return queryset.update(issued_book_count=Coalesce(Subquery(open_lendings), 0))
+
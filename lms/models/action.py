@@ -1,10 +1,25 @@
+import datetime
+import itertools
+from collections import Counter
+
 from django.db import models
 from django.db import transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Greatest
 from django.shortcuts import resolve_url
-from lms.models import Book, BookItem, BookStatus
+from lms import response_cache
+from lms.principal import get_principal
+from lms.models import Book, BookInventory, BookItem, BookStatus
 from lms.models import Account
 from lms.models import LibraryConfig
 from lms.models.notification import Notification
+from lms.models.account import AccountStatus
+from lms.models.report import CirculationRollup
+
+
+class CirculationError(Exception):
+    """A checkout, return or reservation lost a race or broke a rule; nothing was changed."""
+    pass
 
 
 class ReservationStatus(models.TextChoices):
@@ -23,14 +38,17 @@ class BookReservationFormat(models.TextChoices):
 
 
 class BookReservation(models.Model):
+    # Either a specific copy reserved off the shelf, or a hold on any copy of
+    # `book` in `book_format`: holds wait (book_item unset) in FIFO order until
+    # a matching copy is returned and allocated to them (status Pending).
     account = models.ForeignKey(Account, on_delete=models.CASCADE)
-    # book = models.ForeignKey(Book, null=False, blank=False, on_delete=models.CASCADE)
-    # book_format = models.CharField(
-    #     max_length=2,
-    #     choices=BookReservationFormat.choices,
-    #     default=BookReservationFormat.Hardcover,
-    # )
-    book_item = models.ForeignKey(BookItem, on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, null=False, blank=False, on_delete=models.CASCADE)
+    book_format = models.CharField(
+        max_length=2,
+        choices=BookReservationFormat.choices,
+        default=BookReservationFormat.ANY,
+    )
+    book_item = models.ForeignKey(BookItem, null=True, blank=True, on_delete=models.CASCADE)
     creation_date = models.DateField(auto_now_add=True, db_index=True)
     status = models.CharField(
         max_length=2,
@@ -46,39 +64,210 @@ class BookReservation(models.Model):
         return self.status
     
     def is_editable_by(self, user):
-        return user.account == self.account or user.has_perm('lms.change_bookreservation')
+        principal = get_principal(user)
+        return principal.account_id == self.account_id or principal.has_perm('lms.change_bookreservation')
     
     def cancel_reservation(self):
-        self.status = ReservationStatus.Canceled
-        self.save()
-        notification_content = self.__class__.get_notification_content(self.account, self.book_item, reserved=False, cancelled=True)
-        Notification.objects.create(account=self.account, content=notification_content)
+        with transaction.atomic():
+            # only an active reservation can be canceled, and only once
+            if not BookReservation.active().filter(pk=self.pk).update(status=ReservationStatus.Canceled):
+                raise CirculationError('Reservation is not active')
+            self.status = ReservationStatus.Canceled
+            # the copy is released only if this reservation was the one holding it
+            self.book_item_id = BookReservation.objects.filter(pk=self.pk).values_list('book_item_id', flat=True).get()
+            holding = self.book_item_id is not None and not BookReservation.active().filter(book_item=self.book_item_id).exists()
+            if holding and self.book_item.status == BookStatus.Reserved:
+                # the copy goes to the next hold in line, if any
+                if self.__class__.allocate(self.book_item) is None:
+                    self.book_item.status = BookStatus.Available
+                    self.book_item.save()
+            notification_content = self.__class__.get_notification_content(self.account, self.book_item, reserved=False, cancelled=True, book=self.book)
+            Notification.objects.create(account=self.account, content=notification_content)
+            response_cache.purge(response_cache.account_tag(self.account_id), 'reservations')
         return self
     
     @classmethod
-    def get_notification_content(cls, account, book_item, reserved=False, cancelled=False):
+    def get_notification_content(cls, account, book_item, reserved=False, cancelled=False, book=None):
+        if book_item is None:
+            if reserved:
+                return f'Hold placed on {book.title}.'
+            elif cancelled:
+                return f'Hold on {book.title} has been canceled.'
         if reserved:
             return f'Book with barcode {book_item.barcode} reserved successfully.'
         elif cancelled:
             return f'Reservation for Book with barcode {book_item.barcode} has been canceled.'
         assert False, 'both reserved and cancelled cant be False'
+
+    @classmethod
+    def get_ready_notification_content(cls, book_item):
+        return f'Book with barcode {book_item.barcode} you placed a hold on is ready for pickup.'
             
 
     @classmethod
     def reserve_book_item(cls, account, book_item):
 
         with transaction.atomic():
+            # only one desk can take a copy off the shelf
+            claimed = BookItem.objects.filter(pk=book_item.pk, status=BookStatus.Available, is_reference_only=False) \
+                                      .update(status=BookStatus.Reserved)
+            if not claimed:
+                raise CirculationError('Book item is not available')
+            BookInventory.adjust(book_item.book_id, BookStatus.Available, BookStatus.Reserved)
             book_item.status = BookStatus.Reserved
-            book_item.save()
-            obj = cls.objects.create(account=account, book_item=book_item, status=ReservationStatus.Waiting)
+            book_item._loaded_inventory = (book_item.book_id, book_item.status)
+            response_cache.purge(response_cache.item_tag(book_item.pk), 'book-items')
+            obj = cls.objects.create(account=account, book_id=book_item.book_id, book_format=book_item.format, book_item=book_item, status=ReservationStatus.Waiting)
+            CirculationRollup.record(obj.creation_date, book_item.book_id, book_item.format, reservations=1)
             notification_content = cls.get_notification_content(account, book_item, reserved=True)
             Notification.objects.create(account=account, content=notification_content)
+            response_cache.purge(response_cache.account_tag(account.pk), 'reservations')
             return obj
+
+    @classmethod
+    def active(cls):
+        return cls.objects.filter(status__in=[ReservationStatus.Waiting, ReservationStatus.Pending])
+
+    @classmethod
+    def place_hold(cls, account, book, book_format=BookReservationFormat.ANY):
+        """Queue `account` for the next copy of `book` in `book_format`; a copy on the shelf is allocated at once."""
+        with transaction.atomic():
+            hold = cls.objects.create(account=account, book=book, book_format=book_format, status=ReservationStatus.Waiting)
+            CirculationRollup.record(hold.creation_date, book.pk, book_format, reservations=1)
+            Notification.objects.create(account=account, content=cls.get_notification_content(account, None, reserved=True, book=book))
+
+            shelf = BookItem.objects.filter(book=book, status=BookStatus.Available, is_reference_only=False)
+            if book_format != BookReservationFormat.ANY:
+                shelf = shelf.filter(format=book_format)
+            for book_item in shelf.order_by('barcode')[:5]:
+                # claim the copy unless someone else got to it first
+                if BookItem.objects.filter(pk=book_item.pk, status=BookStatus.Available).update(status=BookStatus.Reserved):
+                    BookInventory.adjust(book_item.book_id, BookStatus.Available, BookStatus.Reserved)
+                    book_item.status = BookStatus.Reserved
+                    book_item._loaded_inventory = (book_item.book_id, book_item.status)
+                    cls.objects.filter(pk=hold.pk).update(status=ReservationStatus.Pending, book_item=book_item)
+                    hold.status, hold.book_item = ReservationStatus.Pending, book_item
+                    Notification.objects.create(account=account, content=cls.get_ready_notification_content(book_item))
+                    response_cache.purge('book-items', response_cache.item_tag(book_item.pk))
+                    break
+            response_cache.purge(response_cache.account_tag(account.pk), 'reservations')
+        return hold
+
+    @classmethod
+    def next_hold(cls, book_item, exclude=()):
+        # Head of the queue for this copy: the oldest waiting hold on its book
+        # in its format or in any format. Each is one seek on the
+        # (book, book_format, status, book_item, id) index.
+        heads = []
+        for book_format in (book_item.format, BookReservationFormat.ANY):
+            head = cls.objects.filter(
+                book_id=book_item.book_id, book_format=book_format, status=ReservationStatus.Waiting, book_item=None,
+            ).exclude(pk__in=exclude).order_by('id').values_list('id', flat=True).first()
+            if head is not None:
+                heads.append(head)
+        return min(heads) if heads else None
+
+    @classmethod
+    def allocate(cls, book_item):
+        """
+        Hand a copy that just came back to the head of its hold queue. Marks the
+        copy Reserved and the hold Pending and notifies the patron; returns the
+        hold, or None if nobody is waiting (the copy is left untouched then).
+        """
+        if book_item.is_reference_only:
+            return None
+        skipped = []
+        while True:
+            head = cls.next_hold(book_item, exclude=skipped)
+            if head is None:
+                return None
+            # conditional, so concurrent returns never hand out the same hold twice
+            if cls.objects.filter(pk=head, status=ReservationStatus.Waiting, book_item=None).update(status=ReservationStatus.Pending, book_item=book_item):
+                break
+            skipped.append(head)
+
+        hold = cls.objects.select_related('account').get(pk=head)
+        book_item.status = BookStatus.Reserved
+        book_item.save()
+        Notification.objects.create(account_id=hold.account_id, content=cls.get_ready_notification_content(book_item))
+        response_cache.purge(response_cache.account_tag(hold.account_id), 'reservations')
+        return hold
+
+    @classmethod
+    def is_held_for(cls, book_item, account):
+        return cls.active().filter(book_item=book_item, account=account).exists()
+
+    PICK_FIELDS = ('location', 'rack', 'barcode', 'isbn', 'title', 'format', 'reason', 'reservation', 'account')
+
+    @classmethod
+    def pick_list(cls, locations=None):
+        """
+        Copies to pull from the racks, in walking order: copies held for an
+        active reservation ('hold') and shelf copies of titles whose holds are
+        still waiting for one ('queue', e.g. new copies added after the hold).
+        Queue copies are capped at the number of waiting holds they can serve:
+        a copy counts against the holds in its own format first and then
+        against the "any format" holds of its title, so one waiting hold never
+        pulls more than one copy.
+        One query, sorted by (location, rack); every other location is walked
+        back the other way so the route snakes through the aisles. Yields
+        dicts of PICK_FIELDS; only one location is held in memory at a time.
+        """
+        held = cls.active().filter(book_item=OuterRef('pk')).order_by('id')
+        waiting = cls.objects.filter(book_id=OuterRef('book_id'), status=ReservationStatus.Waiting, book_item=None)
+        in_format = waiting.filter(book_format=OuterRef('format'))
+        any_format = waiting.filter(book_format=BookReservationFormat.ANY)
+        waiting = waiting.filter(Q(book_format=OuterRef('format')) | Q(book_format=BookReservationFormat.ANY))
+        items = BookItem.objects.filter(
+            Q(Exists(held), status=BookStatus.Reserved) | Q(Exists(waiting), status=BookStatus.Available, is_reference_only=False)
+        )
+        if locations:
+            items = items.filter(placed_at__location_identifier__in=locations)
+        rows = items.annotate(
+            reservation=Subquery(held.values('id')[:1]),
+            holder=Subquery(held.values('account_id')[:1]),
+            waiting_in_format=Subquery(in_format.values('book').annotate(count=Count('pk')).values('count')),
+            waiting_any_format=Subquery(any_format.values('book').annotate(count=Count('pk')).values('count')),
+        ).order_by('placed_at__location_identifier', 'placed_at__number', 'barcode').values_list(
+            'placed_at__location_identifier', 'placed_at__number', 'barcode', 'book_id', 'book__title', 'format',
+            'status', 'reservation', 'holder', 'waiting_in_format', 'waiting_any_format',
+        )
+
+        # holds still unserved per (book, format) and per book for "any format",
+        # taken in the order the copies are fetched
+        unserved = {}
+
+        def wanted(row):
+            isbn, book_format, status, in_format, any_format = row[3], row[5], row[6], row[9], row[10]
+            if status == BookStatus.Reserved:
+                return True
+            for key, count in (((isbn, book_format), in_format), (isbn, any_format)):
+                unserved.setdefault(key, count or 0)
+                if unserved[key]:
+                    unserved[key] -= 1
+                    return True
+            return False
+
+        for n, (_, group) in enumerate(itertools.groupby(rows.iterator(chunk_size=2000), key=lambda row: row[0])):
+            group = [row for row in group if wanted(row)]
+            for row in (reversed(group) if n % 2 else group):
+                location, rack, barcode, isbn, title, book_format, status, reservation, holder = row[:9]
+                yield dict(zip(cls.PICK_FIELDS, (
+                    location, rack, barcode, isbn, title, book_format,
+                    'hold' if status == BookStatus.Reserved else 'queue', reservation, holder,
+                )))
     
     class Meta:
         permissions = [
                 ('can_reserve_for_others', "Can Reserve Book Item for other's"),
             ]
+        indexes = [
+            # keyset pagination (mysite.utils.KeysetPagination)
+            models.Index(fields=['creation_date', 'id']),
+            models.Index(fields=['account', 'creation_date', 'id']),
+            # hold queues (next_hold)
+            models.Index(fields=['book', 'book_format', 'status', 'book_item', 'id']),
+        ]
 
 
 class BookLending(models.Model):
@@ -87,6 +276,15 @@ class BookLending(models.Model):
     creation_date = models.DateField(auto_now_add=True, db_index=True)
     due_date = models.DateField(db_index=True)
     return_date = models.DateField(blank=True, null=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination (mysite.utils.KeysetPagination)
+            models.Index(fields=['creation_date', 'id']),
+            models.Index(fields=['account', 'creation_date', 'id']),
+            # open lendings by due date (FineAccrual.process_overdues)
+            models.Index(fields=['return_date', 'due_date', 'id']),
+        ]
     
     def __str__(self):
         return self.book_item.barcode
@@ -95,25 +293,112 @@ class BookLending(models.Model):
         return resolve_url('lendings_detail', pk=self.pk)
     
     @classmethod
-    def check_out(cls, account, book_item, due_date, notification_content=''):
-        
+    def check_out(cls, account, book_item, due_date, notification_content='', issue_limit=None):
+        # Safe under concurrent desks: the copy and the account's quota are
+        # claimed with conditional UPDATEs, so of two checkouts racing for the
+        # same copy (or the last free slot) exactly one succeeds and the other
+        # raises CirculationError with nothing written. `issue_limit` None
+        # means the quota is bypassed.
         with transaction.atomic():
+            from_status = cls.claim_book_items(account, [book_item], due_date)[0]
+            cls.claim_issue_quota(account, 1, issue_limit)
+
             book_lend = BookLending(account=account, book_item=book_item, due_date=due_date)
             book_lend.save()
+            CirculationRollup.record(book_lend.creation_date, book_item.book_id, book_item.format, checkouts=1)
             account.issued_book_count += 1
-            account.save()
             book_item.borrowed = book_lend.creation_date
             book_item.due_date = book_lend.due_date
             book_item.status = BookStatus.Issued
-            book_item.save()
+            book_item._loaded_inventory = (book_item.book_id, book_item.status)
+            BookInventory.adjust(book_item.book_id, from_status, BookStatus.Issued)
 
             Notification.objects.create(account=account, content=notification_content).save()
             
-            reservs = BookReservation.objects.filter(book_item=book_item, account=account).all()
-            for reserv in reservs:
-                reserv.status = ReservationStatus.Completed
-                reserv.save()
+            BookReservation.active().filter(book_item=book_item, account=account).update(status=ReservationStatus.Completed)
+            response_cache.purge(
+                response_cache.account_tag(account.pk), 'lendings', 'reservations', 'book-items',
+                response_cache.item_tag(book_item.pk)
+            )
         return book_lend
+
+    @classmethod
+    def check_out_many(cls, account, book_items, due_date, notification_content='', issue_limit=None):
+        # Batch version of check_out(): a fixed number of queries however many
+        # items are issued, and all or nothing if any copy was taken meanwhile.
+        if not book_items:
+            return []
+
+        with transaction.atomic():
+            statuses = cls.claim_book_items(account, book_items, due_date)
+            cls.claim_issue_quota(account, len(book_items), issue_limit)
+
+            lendings = cls.objects.bulk_create([
+                BookLending(account=account, book_item=book_item, due_date=due_date)
+                for book_item in book_items
+            ])
+            account.issued_book_count += len(lendings)
+            barcodes = [book_item.pk for book_item in book_items]
+            if any(lending.pk is None for lending in lendings):
+                # bulk_create() leaves the pks unset on some databases; the
+                # copies were just claimed, so their open lendings are these
+                pks = dict(cls.objects.filter(book_item__in=barcodes, return_date=None).values_list('book_item_id', 'pk'))
+                for lending in lendings:
+                    lending.pk = pks[lending.book_item_id]
+
+            borrowed = lendings[0].creation_date
+            CirculationRollup.record_many(borrowed, {
+                key: {'checkouts': count} for key, count in Counter((book_item.book_id, book_item.format) for book_item in book_items).items()
+            })
+            for from_status in set(statuses):
+                BookInventory.adjust_many(
+                    Counter(book_item.book_id for book_item, status in zip(book_items, statuses) if status == from_status),
+                    from_status, BookStatus.Issued,
+                )
+            for book_item in book_items:
+                book_item.borrowed = borrowed
+                book_item.due_date = due_date
+                book_item.status = BookStatus.Issued
+                book_item._loaded_inventory = (book_item.book_id, book_item.status)
+
+            Notification.objects.bulk_create([
+                Notification(account=account, content=notification_content) for _ in lendings
+            ])
+            BookReservation.active().filter(book_item__in=barcodes, account=account).update(status=ReservationStatus.Completed)
+            response_cache.purge(
+                response_cache.account_tag(account.pk), 'lendings', 'reservations', 'book-items',
+                *[response_cache.item_tag(barcode) for barcode in barcodes]
+            )
+        return lendings
+
+    @classmethod
+    def claim_book_items(cls, account, book_items, due_date):
+        """
+        Mark the copies Issued if they are still on the shelf, or on the hold
+        shelf for `account`; returns the status each one was taken from.
+        """
+        borrowed = datetime.date.today()
+        held = BookReservation.active().filter(book_item=OuterRef('pk'), account=account)
+        # one UPDATE per status the caller saw, usually just Available
+        statuses = [BookStatus.Reserved if book_item.status == BookStatus.Reserved else BookStatus.Available for book_item in book_items]
+        for from_status in set(statuses):
+            barcodes = [book_item.pk for book_item, status in zip(book_items, statuses) if status == from_status]
+            claimable = BookItem.objects.filter(pk__in=barcodes, status=from_status, is_reference_only=False)
+            if from_status == BookStatus.Reserved:
+                claimable = claimable.filter(Exists(held))
+            if claimable.update(status=BookStatus.Issued, borrowed=borrowed, due_date=due_date) != len(barcodes):
+                raise CirculationError('Book item cannot be Issued')
+        return statuses
+
+    @classmethod
+    def claim_issue_quota(cls, account, count, issue_limit=None):
+        accounts = Account.objects.filter(pk=account.pk, status=AccountStatus.Active)
+        if issue_limit is not None:
+            accounts = accounts.filter(issued_book_count__lte=issue_limit - count)
+        if not accounts.update(issued_book_count=F('issued_book_count') + count):
+            if not Account.objects.filter(pk=account.pk, status=AccountStatus.Active).exists():
+                raise CirculationError('Account not Active')
+            raise CirculationError('The user has already checked-out maximum number of books')
     
     def validate_return_data(self, return_info):
         return True, ''
@@ -126,27 +411,137 @@ class BookLending(models.Model):
             notification_content = self.create_return_notification()
 
         with transaction.atomic():
+            # closing the lending is the claim: a second return of the same
+            # lending (another desk, a double scan) updates nothing
+            if not BookLending.objects.filter(pk=self.pk, return_date=None).update(return_date=return_date):
+                raise CirculationError('Book item already returned')
             self.return_date = return_date
-            
-            self.account.issued_book_count -= 1
+
+            Account.objects.filter(pk=self.account_id, issued_book_count__gt=0).update(issued_book_count=F('issued_book_count') - 1)
+            self.account.issued_book_count = max(self.account.issued_book_count - 1, 0)
             
             self.book_item.borrowed = None
             self.book_item.due_date = None
-            self.book_item.status = BookStatus.Available
-
-            self.save()
-            self.account.save()
-            self.book_item.save()
+            if BookItem.objects.filter(pk=self.book_item_id, status=BookStatus.Issued).update(borrowed=None, due_date=None, status=BookStatus.Available):
+                BookInventory.adjust(self.book_item.book_id, BookStatus.Issued, BookStatus.Available)
+                self.book_item.status = BookStatus.Available
+                self.book_item._loaded_inventory = (self.book_item.book_id, self.book_item.status)
+                response_cache.purge(response_cache.item_tag(self.book_item_id), 'book-items')
+            else:
+                # marked lost or similar while out; back on the shelf either way
+                self.book_item.refresh_from_db()
+                self.book_item.borrowed = None
+                self.book_item.due_date = None
+                self.book_item.status = BookStatus.Available
+                self.book_item.save()
+            BookReservation.allocate(self.book_item)
 
             fine_amt = self.calculate_fine(return_date)
             if fine_amt > 0:
-                from lms.models import Fine
+                from lms.models import Fine, FineTransaction
                 fine = Fine(amount=fine_amt, lending = self)
                 fine.save()
+                FineTransaction.accrue([fine], {self.pk: self.account_id})
+                self.account.fine_balance += fine_amt
+                CirculationRollup.record(return_date, self.book_item.book_id, self.book_item.format, returns=1, fines=1, fine_amount=fine_amt)
+            else:
+                CirculationRollup.record(return_date, self.book_item.book_id, self.book_item.format, returns=1)
+            from lms.models import FineAccrual
+            FineAccrual.objects.filter(lending=self).delete()
             
             Notification.objects.create(account=self.account, content=notification_content).save()
+            response_cache.purge(response_cache.account_tag(self.account_id), 'lendings')
         return fine_amt
 
+    @classmethod
+    def return_many(cls, lendings, return_date):
+        # Batch version of return_book_item() for open lendings fetched with
+        # their account and book_item; returns {lending pk: fine amount}.
+        from lms.models import Fine, FineAccrual, FineTransaction
+
+        if not lendings:
+            return {}
+
+        with transaction.atomic():
+            if cls.objects.filter(pk__in=[lending.pk for lending in lendings], return_date=None).update(return_date=return_date) != len(lendings):
+                raise CirculationError('Book item already returned')
+            for lending in lendings:
+                lending.return_date = return_date
+
+            fines = {lending.pk: lending.calculate_fine(return_date) for lending in lendings}
+            returned_by = Counter(lending.account_id for lending in lendings)
+            owed_by = Counter()
+            for lending in lendings:
+                owed_by[lending.account_id] += fines[lending.pk]
+            # the fines' ledger balances ride along with the issue counts
+            Account.objects.filter(pk__in=returned_by.keys()).update(issued_book_count=Greatest(F('issued_book_count') - Case(
+                *[When(pk=account_id, then=Value(count)) for account_id, count in returned_by.items()],
+                default=Value(0),
+            ), Value(0)), fine_balance=F('fine_balance') + Case(
+                *[When(pk=account_id, then=Value(amount)) for account_id, amount in owed_by.items() if amount],
+                default=Value(0),
+            ))
+
+            book_items = [lending.book_item for lending in lendings]
+            issued = [book_item for book_item in book_items if book_item.status == BookStatus.Issued]
+            if BookItem.objects.filter(pk__in=[book_item.pk for book_item in issued], status=BookStatus.Issued) \
+                              .update(borrowed=None, due_date=None, status=BookStatus.Available) != len(issued):
+                raise CirculationError('Book item status changed meanwhile')
+            BookInventory.adjust_many(Counter(book_item.book_id for book_item in issued), BookStatus.Issued, BookStatus.Available)
+            for book_item in book_items:
+                if book_item.status != BookStatus.Issued:
+                    # marked lost or similar while out; back on the shelf either way
+                    book_item.refresh_from_db()
+                    book_item.borrowed = None
+                    book_item.due_date = None
+                    book_item.status = BookStatus.Available
+                    book_item.save()
+
+            new_fines = []
+            for lending in lendings:
+                lending.account.issued_book_count = max(lending.account.issued_book_count - 1, 0)
+                lending.book_item.borrowed = None
+                lending.book_item.due_date = None
+                lending.book_item.status = BookStatus.Available
+                lending.book_item._loaded_inventory = (lending.book_item.book_id, lending.book_item.status)
+
+                fine = Fine(amount=fines[lending.pk], lending=lending) if fines[lending.pk] > 0 else None
+                if fine:
+                    new_fines.append(fine)
+                    lending.account.fine_balance += fine.amount
+                # saves a query per lending when serializing `lending.fine`
+                cls.fine.related.set_cached_value(lending, fine)
+            Fine.objects.bulk_create(new_fines)
+            FineTransaction.accrue(new_fines, {lending.pk: lending.account_id for lending in lendings}, adjust_balances=False)
+            rollup = {}
+            for lending in lendings:
+                counts = rollup.setdefault((lending.book_item.book_id, lending.book_item.format), Counter(returns=0))
+                counts['returns'] += 1
+                if fines[lending.pk] > 0:
+                    counts['fines'] += 1
+                    counts['fine_amount'] += fines[lending.pk]
+            CirculationRollup.record_many(return_date, rollup)
+            FineAccrual.objects.filter(lending__in=lendings).delete()
+
+            # one query to skip the queue lookups for titles nobody is waiting for
+            waiting = set(BookReservation.objects.filter(
+                book__in={book_item.book_id for book_item in book_items}, status=ReservationStatus.Waiting, book_item=None,
+            ).values_list('book_id', flat=True).distinct())
+            for book_item in book_items:
+                if book_item.book_id in waiting:
+                    BookReservation.allocate(book_item)
+
+            Notification.objects.bulk_create([
+                Notification(account_id=lending.account_id, content=lending.create_return_notification())
+                for lending in lendings
+            ])
+            response_cache.purge(
+                'lendings', 'book-items',
+                *[response_cache.account_tag(account_id) for account_id in returned_by],
+                *[response_cache.item_tag(book_item.pk) for book_item in book_items]
+            )
+        return fines
+
     def get_fine(self):
         if hasattr(self, 'fine'):
             return self.fine.amount
@@ -1,6 +1,8 @@
-from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
 from django.shortcuts import resolve_url
-from lms.models.account import AccountStatus
+from lms import response_cache
 
 
 class Book(models.Model):
@@ -21,30 +23,46 @@ class Book(models.Model):
         return self.title
     
     def is_accessible_by(self, user):
-        if user.has_perm('lms.view_book'):
-            return True
-        elif hasattr(user, 'account'):
-            return user.account.status == AccountStatus.Active
+        from lms.models import Account
+
+        return Account.can_see_books(user)
     
-    # can be cached for some time
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                BookInventory.objects.get_or_create(book=self)
+        response_cache.purge(response_cache.book_tag(self.pk), 'catalog')
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        response_cache.purge(response_cache.book_tag(self.pk), 'catalog')
+        return result
+
+    def get_inventory(self):
+        # select_related('inventory') makes this free for catalog pages
+        try:
+            return self.inventory
+        except ObjectDoesNotExist:
+            BookInventory.rebuild(book_ids=[self.pk])
+            self.inventory = BookInventory.objects.get(book=self)
+            return self.inventory
+
     def count_total_bookitems(self):
-        return BookItem.objects.filter(book=self).count()
+        return self.get_inventory().total
 
-    # can be cached for some time
     def count_available_bookitems(self):
-        return BookItem.objects.filter(book=self, status=BookStatus.Available).count()
+        return self.get_inventory().available
 
-    # can be cached for some time
     def count_issued_bookitems(self):
-        return BookItem.objects.filter(book=self, status=BookStatus.Issued).count()
+        return self.get_inventory().issued
 
-    # can be cached for some time
     def count_reserved_bookitems(self):
-        return BookItem.objects.filter(book=self, status=BookStatus.Reserved).count()
+        return self.get_inventory().reserved
 
-    # can be cached for some time
     def count_lost_bookitems(self):
-        return BookItem.objects.filter(book=self, status=BookStatus.Lost).count()
+        return self.get_inventory().lost
 
 
 class Rack(models.Model):
@@ -53,9 +71,31 @@ class Rack(models.Model):
 
     def __str__(self):
         return "{} {}".format(self.location_identifier, self.number)
+
+    @classmethod
+    def pks(cls, places):
+        """
+        {(location_identifier, number): pk} for the racks at `places`. For
+        racks just bulk-created: bulk_create() only sets pks on some backends.
+        """
+        ranges = {}
+        for location, number in places:
+            low, high = ranges.get(location, (number, number))
+            ranges[location] = (min(low, number), max(high, number))
+        if not ranges:
+            return {}
+        query = Q()
+        for location, (low, high) in ranges.items():
+            query |= Q(location_identifier=location, number__range=(low, high))
+        return {(location, number): pk for pk, location, number
+                in cls.objects.filter(query).values_list('pk', 'location_identifier', 'number')}
     
     class Meta:
         unique_together = ("number", "location_identifier")
+        indexes = [
+            # walking order for pick lists (BookReservation.pick_list)
+            models.Index(fields=['location_identifier', 'number']),
+        ]
 
 
 class BookFormat(models.TextChoices):
@@ -95,6 +135,12 @@ class BookItem(models.Model):
     
     placed_at = models.OneToOneField(Rack, on_delete=models.CASCADE, verbose_name='Placed At')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_inventory = (instance.__dict__.get('book_id'), instance.__dict__.get('status'))
+        return instance
+
     class Meta:
         permissions = [
                 ('can_checkout_book_item', 'Can CheckOut Book Item'),
@@ -102,6 +148,29 @@ class BookItem(models.Model):
                 ('can_renew_book_item', 'Can Renew Book Item'),
             ]
     
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                BookInventory.adjust(self.book_id, None, self.status)
+            elif hasattr(self, '_loaded_inventory'):
+                book_id, status = self._loaded_inventory
+                if book_id != self.book_id:
+                    BookInventory.adjust(book_id, status, None)
+                    BookInventory.adjust(self.book_id, None, self.status)
+                else:
+                    BookInventory.adjust(self.book_id, status, self.status)
+            self._loaded_inventory = (self.book_id, self.status)
+        response_cache.purge(response_cache.item_tag(self.pk), 'book-items')
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            BookInventory.adjust(self.book_id, self.status, None)
+        response_cache.purge(response_cache.item_tag(self.pk), 'book-items')
+        return result
+
     def get_absolute_url(self):
         return resolve_url('book_item_list')+'?barcode={}'.format(self.barcode)
 
@@ -129,3 +198,97 @@ class BookItem(models.Model):
     def can_be_issued(self):
         return not self.is_reference_only and self.status == BookStatus.Available
 
+
+
+class BookInventory(models.Model):
+    # Denormalized BookItem counts per Book, kept in step by BookItem.save()/delete()
+    # and rebuilt by `manage.py reconcile_inventory`.
+    book = models.OneToOneField(Book, primary_key=True, related_name='inventory', on_delete=models.CASCADE)
+    total = models.PositiveIntegerField(default=0)
+    available = models.PositiveIntegerField(default=0)
+    issued = models.PositiveIntegerField(default=0)
+    reserved = models.PositiveIntegerField(default=0)
+    lost = models.PositiveIntegerField(default=0)
+
+    STATUS_FIELDS = {
+        BookStatus.Available: 'available',
+        BookStatus.Issued: 'issued',
+        BookStatus.Reserved: 'reserved',
+        BookStatus.Lost: 'lost',
+    }
+
+    def __str__(self):
+        return str(self.book_id)
+
+    @classmethod
+    def adjust(cls, book_id, from_status, to_status, count=1):
+        """Move `count` items of `book_id` from one status to another, None meaning added/removed."""
+        cls.adjust_many({book_id: count}, from_status, to_status)
+
+    @classmethod
+    def adjust_many(cls, counts, from_status, to_status):
+        """adjust() for a {book_id: count} mapping, in a single UPDATE."""
+        counts = {book_id: count for book_id, count in counts.items() if count}
+        if from_status == to_status or not counts:
+            return
+
+        delta = Case(
+            *[When(book_id=book_id, then=Value(count)) for book_id, count in counts.items()],
+            default=Value(0),
+        )
+        changes = {}
+        if from_status is None:
+            changes['total'] = F('total') + delta
+        else:
+            field = cls.STATUS_FIELDS[from_status]
+            changes[field] = F(field) - delta
+        if to_status is None:
+            changes['total'] = F('total') - delta
+        else:
+            field = cls.STATUS_FIELDS[to_status]
+            changes[field] = F(field) + delta
+
+        response_cache.purge(*[response_cache.book_tag(book_id) for book_id in counts])
+        if cls.objects.filter(book_id__in=counts.keys()).update(**changes) < len(counts):
+            # Rows missing (books created before inventories existed), the write
+            # that triggered this is already visible so a recount is exact.
+            existing = cls.objects.filter(book_id__in=counts.keys()).values_list('book_id', flat=True)
+            cls.rebuild(book_ids=set(counts) - set(existing))
+
+    @classmethod
+    def rebuild(cls, book_ids=None, batch_size=1000):
+        """Recompute inventories from BookItem with a single grouped query."""
+        books = Book.objects.order_by('pk').values_list('pk', flat=True)
+        counts = BookItem.objects.order_by('book_id').values_list('book_id', 'status').annotate(count=Count('pk'))
+        if book_ids is not None:
+            books = books.filter(pk__in=book_ids)
+            counts = counts.filter(book_id__in=book_ids)
+
+        rebuilt = 0
+        with transaction.atomic():
+            stale = cls.objects.all()
+            if book_ids is not None:
+                stale = stale.filter(book_id__in=book_ids)
+            stale.delete()
+
+            # both sides come back in the database's book order, so merge them
+            rows = counts.iterator()
+            row = next(rows, None)
+            batch = []
+            for book_id in books.iterator():
+                inventory = cls(book_id=book_id)
+                while row is not None and row[0] == book_id:
+                    _, status, count = row
+                    inventory.total += count
+                    field = cls.STATUS_FIELDS.get(status)
+                    if field:
+                        setattr(inventory, field, getattr(inventory, field) + count)
+                    row = next(rows, None)
+                batch.append(inventory)
+                if len(batch) >= batch_size:
+                    cls.objects.bulk_create(batch)
+                    rebuilt += len(batch)
+                    batch = []
+            cls.objects.bulk_create(batch)
+            rebuilt += len(batch)
+        return rebuilt
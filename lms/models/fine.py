@@ -1,20 +1,258 @@
-from django.db import models
-from lms.models import BookLending
+import time
+
+from django.db import models, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from lms import response_cache
+from lms.models import Account, BookLending, LibraryConfig
+from lms.models.notification import Notification
+
+
+class FineError(Exception):
+    """A payment or waiver was more than what is owed; nothing was changed."""
+    pass
 
 
 class Fine(models.Model):
     amount = models.PositiveIntegerField()
     lending = models.OneToOneField(BookLending, on_delete=models.CASCADE)
+    # paid or waived so far, through FineTransaction
+    settled = models.PositiveIntegerField(default=0)
 
     def get_amount(self):
         return self.amount
 
+    def get_outstanding(self):
+        return self.amount - self.settled
+
+
+class FineAccrual(models.Model):
+    # Running fine of a lending still out past its due date. Refreshed by
+    # `manage.py process_overdues`, removed when the item is returned.
+    lending = models.OneToOneField(BookLending, primary_key=True, related_name='accrual', on_delete=models.CASCADE)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, db_index=True)
+    days_overdue = models.PositiveIntegerField()
+    amount = models.PositiveIntegerField()
+    updated_on = models.DateField(db_index=True)
+
+    @classmethod
+    def get_notification_content(cls, barcode, due_date, amount):
+        return f'Book with barcode {barcode} was due on {due_date}. Fine so far: {amount}.'
+
+    @classmethod
+    def process_overdues(cls, today, chunk_size=5000, progress=None):
+        """
+        Walk open lendings past their due date in (due_date, pk) order, one
+        chunk per transaction, and upsert their accruals. A lending becoming
+        overdue for the first time also gets a notification. Memory use is
+        bounded by `chunk_size`, not by the number of overdue lendings.
+        """
+        fine_per_day = LibraryConfig.object().fine_per_late_day
+        overdue = BookLending.objects.filter(return_date=None, due_date__lt=today).order_by('due_date', 'pk')
+        stats = {'processed': 0, 'created': 0, 'updated': 0, 'notified': 0, 'removed': 0}
+        started = time.perf_counter()
+
+        last = None
+        while True:
+            chunk = overdue
+            if last is not None:
+                chunk = chunk.filter(Q(due_date__gt=last[0]) | Q(due_date=last[0], pk__gt=last[1]))
+            rows = list(chunk.values_list('pk', 'account_id', 'book_item_id', 'due_date')[:chunk_size])
+            if not rows:
+                break
+            last = (rows[-1][3], rows[-1][0])
+
+            with transaction.atomic():
+                existing = set(cls.objects.filter(lending_id__in=[row[0] for row in rows]).values_list('lending_id', flat=True))
+                updated, created, notifications = [], [], []
+                for lending_id, account_id, barcode, due_date in rows:
+                    days = (today - due_date).days
+                    accrual = cls(lending_id=lending_id, account_id=account_id, days_overdue=days, amount=days * fine_per_day, updated_on=today)
+                    if lending_id in existing:
+                        updated.append(accrual)
+                    else:
+                        created.append(accrual)
+                        notifications.append(Notification(account_id=account_id, content=cls.get_notification_content(barcode, due_date, accrual.amount)))
+                cls.objects.bulk_update(updated, ['days_overdue', 'amount', 'updated_on'], batch_size=1000)
+                cls.objects.bulk_create(created, batch_size=1000)
+                Notification.objects.bulk_create(notifications, batch_size=1000)
+
+            stats['processed'] += len(rows)
+            stats['updated'] += len(updated)
+            stats['created'] += len(created)
+            stats['notified'] += len(notifications)
+            if progress:
+                progress(stats, time.perf_counter() - started)
+
+        # lendings closed without going through return_book_item()
+        stats['removed'], _ = cls.objects.filter(lending__return_date__isnull=False).delete()
+        stats['elapsed'] = time.perf_counter() - started
+        return stats
+
+
+class FineTransactionType(models.TextChoices):
+        Accrual = 'AC', ('Accrual')
+        Payment = 'PA', ('Payment')
+        Waiver = 'WA', ('Waiver')
+
 
 class FineTransaction(models.Model):
-    creation_date = models.DateTimeField()
+    # Append-only fine ledger. An account's balance is its accruals minus its
+    # payments and waivers; Account.fine_balance holds it, updated in the
+    # same transaction as every entry, so reading what a patron owes is one
+    # column of a row already loaded. Accruals and waivers name their fine; a
+    # payment is one entry spread over the oldest open fines (Fine.settled).
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='fine_transactions')
+    fine = models.ForeignKey(Fine, null=True, blank=True, on_delete=models.SET_NULL, related_name='transactions')
+    type = models.CharField(max_length=2, choices=FineTransactionType.choices)
+    creation_date = models.DateTimeField(default=timezone.now)
     amount = models.PositiveIntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'id']),
+        ]
+
+    @classmethod
+    def adjust_balances(cls, amounts):
+        """Add {account pk: amount} to Account.fine_balance in one UPDATE."""
+        amounts = {account_id: amount for account_id, amount in amounts.items() if amount}
+        if amounts:
+            Account.objects.filter(pk__in=amounts.keys()).update(fine_balance=F('fine_balance') + Case(
+                *[When(pk=account_id, then=Value(amount)) for account_id, amount in amounts.items()],
+                default=Value(0),
+            ))
+            # lending lists show the balance
+            response_cache.purge('lendings', *[response_cache.account_tag(account_id) for account_id in amounts])
+
+    @classmethod
+    def accrue(cls, fines, account_ids=None, adjust_balances=True):
+        """
+        Post an accrual for each of the new `fines` and raise their accounts'
+        balances (unless the caller has, with `adjust_balances` False).
+        `account_ids` maps lending pk to account pk when the lendings are not
+        loaded.
+        """
+        fines = [fine for fine in fines if fine.amount > 0]
+        if not fines:
+            return []
+        if any(fine.pk is None for fine in fines):
+            # bulk_create() leaves the pks unset on some databases
+            fines = list(Fine.objects.filter(lending_id__in=[fine.lending_id for fine in fines]))
+        if account_ids is None:
+            account_ids = dict(BookLending.objects.filter(pk__in=[fine.lending_id for fine in fines]).values_list('pk', 'account_id'))
+
+        now = timezone.now()
+        entries = [cls(account_id=account_ids[fine.lending_id], fine=fine, type=FineTransactionType.Accrual, creation_date=now, amount=fine.amount)
+                   for fine in fines]
+        # part of the caller's transaction when there is one
+        with transaction.atomic(savepoint=False):
+            cls.objects.bulk_create(entries, batch_size=1000)
+            if adjust_balances:
+                owed = {}
+                for entry in entries:
+                    owed[entry.account_id] = owed.get(entry.account_id, 0) + entry.amount
+                cls.adjust_balances(owed)
+        return entries
+
+    @classmethod
+    def pay(cls, account, amount, cash_tendered=None, fines=None):
+        """
+        Take a payment of `amount` and settle the account's open fines with
+        it, oldest first (or only `fines`). Raises FineError if the account,
+        or the chosen fines, owe less than that.
+        """
+        with transaction.atomic():
+            if amount <= 0 or not Account.objects.filter(pk=account.pk, fine_balance__gte=amount).update(fine_balance=F('fine_balance') - amount):
+                raise FineError('Payment is more than the fines owed')
+
+            open_fines = Fine.objects.select_for_update().filter(lending__account=account, settled__lt=F('amount')) \
+                                     .order_by('lending__return_date', 'pk')
+            if fines is not None:
+                open_fines = open_fines.filter(pk__in=[fine.pk for fine in fines])
+            settled = []
+            remaining = amount
+            for fine in open_fines.only('pk', 'amount', 'settled'):
+                part = min(fine.get_outstanding(), remaining)
+                fine.settled += part
+                remaining -= part
+                settled.append(fine)
+                if not remaining:
+                    break
+            if remaining:
+                raise FineError('Payment is more than the fines owed')
+            Fine.objects.bulk_update(settled, ['settled'], batch_size=1000)
+
+            entry = cls.objects.create(account=account, type=FineTransactionType.Payment, amount=amount)
+            if cash_tendered is not None:
+                CashTransaction.objects.create(transaction=entry, cash_tendered=cash_tendered)
+            response_cache.purge(response_cache.account_tag(account.pk), 'lendings')
+        account.fine_balance -= amount
+        return entry, settled
+
+    @classmethod
+    def waive(cls, fine, amount=None):
+        """Forgive `amount` (default: all that is left) of one fine."""
+        with transaction.atomic():
+            fine = Fine.objects.select_for_update().select_related('lending').get(pk=fine.pk)
+            amount = fine.get_outstanding() if amount is None else amount
+            if amount <= 0 or amount > fine.get_outstanding():
+                raise FineError('Waiver is more than the fine owed')
+            Fine.objects.filter(pk=fine.pk).update(settled=F('settled') + amount)
+            fine.settled += amount
+            account_id = fine.lending.account_id
+            if not Account.objects.filter(pk=account_id, fine_balance__gte=amount).update(fine_balance=F('fine_balance') - amount):
+                raise FineError('Waiver is more than the fines owed')
+            entry = cls.objects.create(account_id=account_id, fine=fine, type=FineTransactionType.Waiver, amount=amount)
+            response_cache.purge(response_cache.account_tag(account_id), 'lendings')
+        return entry
+
+    @classmethod
+    def ledger_balances(cls):
+        """Per-account balance subquery computed from the ledger."""
+        return Coalesce(Subquery(
+            cls.objects.filter(account=OuterRef('pk')).order_by().values('account').annotate(balance=Sum(Case(
+                When(type=FineTransactionType.Accrual, then=F('amount')),
+                default=-F('amount'),
+            ))).values('balance')
+        ), 0)
+
+    @classmethod
+    def reconcile(cls, fix=False):
+        """
+        Compare every account's fine_balance with its ledger and with the
+        outstanding amounts of its fines, in one query. Returns the accounts
+        that disagree as (pk, fine_balance, ledger, fines owed) rows. With
+        `fix`, fines missing their accrual (recorded before the ledger) are
+        posted first and the balances are reset from the ledger.
+        """
+        if fix:
+            missing = Fine.objects.filter(amount__gt=0).exclude(Exists(cls.objects.filter(fine=OuterRef('pk'), type=FineTransactionType.Accrual)))
+            while True:
+                fines = list(missing.order_by('pk')[:5000])
+                if not fines:
+                    break
+                cls.accrue(fines)
+
+        owed = Coalesce(Subquery(
+            Fine.objects.filter(lending__account=OuterRef('pk')).order_by().values('lending__account')
+                        .annotate(owed=Sum(F('amount') - F('settled'))).values('owed')
+        ), 0)
+        accounts = Account.objects.annotate(ledger=cls.ledger_balances(), owed=owed) \
+                                  .exclude(fine_balance=F('ledger'), owed=F('ledger')).order_by('pk')
+        if fix:
+            with transaction.atomic():
+                fixed = list(accounts.exclude(fine_balance=F('ledger')).values_list('pk', flat=True))
+                Account.objects.filter(pk__in=fixed).update(fine_balance=cls.ledger_balances())
+                response_cache.purge('lendings', *[response_cache.account_tag(account_id) for account_id in fixed])
+        return list(accounts.values_list('pk', 'fine_balance', 'ledger', 'owed'))
+
 
 class CashTransaction(models.Model):
     transaction = models.OneToOneField(FineTransaction, on_delete=models.CASCADE)
+    cash_tendered = models.PositiveIntegerField(default=0)
+
+    def get_change(self):
+        return self.cash_tendered - self.transaction.amount
 
@@ -1,4 +1,7 @@
-from django.db import models
+import uuid
+
+from django.core.cache import cache
+from django.db import models, transaction
 from django.forms import ValidationError
 
 
@@ -7,11 +10,42 @@ class LibraryConfig(models.Model):
     maximum_day_limit = models.PositiveIntegerField(default=1, verbose_name='Max days to keep issued item')
     fine_per_late_day = models.PositiveSmallIntegerField(default=10)
 
+    # Process-local copy of the singleton, tagged with the shared version stamp
+    # it was loaded under. Treat the returned instance as read-only.
+    VERSION_CACHE_KEY = 'lms:libraryconfig:version'
+    _cached = None
+
     @classmethod
     def object(cls):
+        version = cls.get_version()
+        cached = cls._cached
+        if cached is not None and version is not None and cached[0] == version:
+            return cached[1]
+
         obj, _ = cls.objects.get_or_create(pk=1) # Since only one item
+        cls._cached = (version, obj)
         return obj
 
+    @classmethod
+    def get_version(cls):
+        version = cache.get(cls.VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(cls.VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+            version = cache.get(cls.VERSION_CACHE_KEY)
+        return version
+
+    @classmethod
+    def invalidate(cls):
+        # Drop our own copy now; other workers notice the new stamp once the
+        # change is committed, so none of them can re-cache the old row.
+        cls._cached = None
+        transaction.on_commit(cls.bump_version)
+
+    @classmethod
+    def bump_version(cls):
+        cls._cached = None
+        cache.set(cls.VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
     def clean(self, *args, **kwargs):
         if hasattr(self, 'pk'):
             if self.pk != 1:
@@ -22,7 +56,9 @@ class LibraryConfig(models.Model):
     def save(self, *args, **kwargs):
         if hasattr(self, 'pk'):
             assert self.pk == 1, "Only one instance allowed"
-            return super().save(*args, **kwargs)
+            result = super().save(*args, **kwargs)
+            self.__class__.invalidate()
+            return result
     
     def delete(self, *args, **kwargs):
         if self.pk == 1:
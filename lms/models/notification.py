@@ -1,20 +1,211 @@
-from django.db import models
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from lms.models import Account
 
 
+class NotificationManager(models.Manager):
+    # Every way notifications are created goes through here, so e-mail copies
+    # are queued and unread counters bumped in the same transaction as the
+    # notification itself.
+
+    def create(self, **kwargs):
+        with transaction.atomic():
+            notification = super().create(**kwargs)
+            self.created([notification])
+        return notification
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            objs = super().bulk_create(objs, *args, **kwargs)
+            self.created(objs)
+        return objs
+
+    def created(self, notifications):
+        unread = Counter(notification.account_id for notification in notifications if not notification.is_read)
+        if len(unread) == 1:
+            (account_id, count), = unread.items()
+            Account.objects.filter(pk=account_id).update(unread_notification_count=F('unread_notification_count') + count)
+        elif unread:
+            Account.objects.filter(pk__in=unread).update(unread_notification_count=F('unread_notification_count') + Case(
+                *[When(pk=account_id, then=Value(count)) for account_id, count in unread.items()],
+                default=Value(0),
+            ))
+        EmailNotification.enqueue(notifications)
+
+
 class Notification(models.Model):
     account = models.ForeignKey(Account, on_delete=models.CASCADE, db_index=True)
     created_on = models.DateField(auto_now_add=True, db_index=True)
     content = models.TextField()
     is_read = models.BooleanField(default=False, db_index=True)
 
+    objects = NotificationManager()
+
+    @classmethod
+    def mark_read(cls, account, ids=None, up_to=None):
+        """
+        Mark the account's unread notifications read in one UPDATE: those in
+        `ids`, those with pk <= `up_to`, or all of them. Returns how many changed.
+        """
+        queryset = cls.objects.filter(account=account, is_read=False)
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        if up_to is not None:
+            queryset = queryset.filter(pk__lte=up_to)
+        with transaction.atomic():
+            marked = queryset.update(is_read=True)
+            if marked:
+                Account.objects.filter(pk=account.pk).update(unread_notification_count=F('unread_notification_count') - marked)
+        return marked
+
+    @classmethod
+    def recount_unread(cls, accounts=None):
+        # repairs the counters after notifications were deleted or edited in bulk
+        unread = cls.objects.filter(account=OuterRef('pk'), is_read=False) \
+                            .values('account').annotate(count=Count('pk')).values('count')
+        queryset = Account.objects.all() if accounts is None else Account.objects.filter(pk__in=accounts)
+        return queryset.update(unread_notification_count=Coalesce(Subquery(unread), 0))
+
+    class Meta:
+        indexes = [
+            # keyset pagination (mysite.utils.KeysetPagination)
+            models.Index(fields=['account', 'created_on', 'id']),
+        ]
+
 
 class EmailNotification(models.Model):
+    """
+    Outbox row for a notification to be mailed. Nothing is sent inline:
+    `manage.py send_email_notifications` claims due rows in batches, sends
+    them over one connection and records `send_on`; failures are retried with
+    exponential backoff until MAX_ATTEMPTS, then left with next_attempt_at unset.
+    """
+    SUBJECT = 'Library notification'
+    MAX_ATTEMPTS = 5
+    RETRY_BASE = datetime.timedelta(minutes=1)
+    RETRY_MAX = datetime.timedelta(hours=6)
+    CLAIM_TIMEOUT = datetime.timedelta(minutes=5)
+
     notification = models.OneToOneField(Notification, on_delete=models.CASCADE)
     email = models.EmailField()
     send_on = models.DateTimeField(null=True)
-    
-    def sendNotification(self):
-        # TODO
-        return None
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True, default='')
+    claimed_until = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['send_on', 'next_attempt_at']),
+        ]
+
+    @classmethod
+    def enqueue(cls, notifications):
+        if not getattr(settings, 'LMS_EMAIL_NOTIFICATIONS', False):
+            return []
+        if any(notification.pk is None for notification in notifications):
+            cls.read_back(notifications)
+        emails = dict(
+            Account.objects.filter(pk__in={notification.account_id for notification in notifications})
+                           .exclude(user__email='')
+                           .values_list('pk', 'user__email')
+        )
+        return cls.objects.bulk_create([
+            cls(notification=notification, email=emails[notification.account_id])
+            for notification in notifications if notification.account_id in emails
+        ])
+
+    @classmethod
+    def read_back(cls, notifications):
+        """
+        Set the pks bulk_create() leaves unset on some databases. The rows just
+        inserted are the newest ones with the same account, day and content
+        not queued yet: any committed meanwhile were queued with them.
+        """
+        missing = [notification for notification in notifications if notification.pk is None]
+        wanted = Counter((notification.account_id, notification.content) for notification in missing)
+        rows = Notification.objects.filter(
+            account__in={account_id for account_id, _ in wanted},
+            created_on__in={notification.created_on for notification in missing},
+            content__in={content for _, content in wanted},
+            emailnotification=None,
+        ).order_by('-pk').values_list('pk', 'account_id', 'content')
+        pks = {}
+        for pk, account_id, content in rows:
+            if len(pks.setdefault((account_id, content), [])) < wanted[account_id, content]:
+                pks[account_id, content].append(pk)
+        for notification in missing:
+            found = pks.get((notification.account_id, notification.content))
+            if not found:
+                raise Notification.DoesNotExist(f'Inserted notification for account {notification.account_id} not found')
+            # inserted in order, so ascending pks
+            notification.pk = found.pop()
+
+    @classmethod
+    def pending(cls, now):
+        return cls.objects.filter(send_on=None, next_attempt_at__lte=now) \
+                          .filter(Q(claimed_until=None) | Q(claimed_until__lt=now))
+
+    @classmethod
+    def claim(cls, batch_size, token):
+        """Lease up to `batch_size` due rows to `token`; safe against concurrent workers."""
+        now = timezone.now()
+        pks = list(cls.pending(now).order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return []
+        # rows claimed by someone else in between no longer match pending()
+        cls.pending(now).filter(pk__in=pks).update(claimed_by=token, claimed_until=now + cls.CLAIM_TIMEOUT)
+        return list(cls.objects.filter(pk__in=pks, claimed_by=token).select_related('notification'))
 
+    @classmethod
+    def deliver(cls, batch, connection=None):
+        """Send a claimed batch over a single connection; returns (sent, failed)."""
+        connection = connection or get_connection()
+        sent = 0
+        try:
+            connection.open()
+        except Exception as e:
+            for email in batch:
+                email.failed(e)
+        else:
+            try:
+                for email in batch:
+                    try:
+                        if not connection.send_messages([email.get_message()]):
+                            raise RuntimeError('Message was not accepted')
+                    except Exception as e:
+                        email.failed(e)
+                    else:
+                        email.attempts += 1
+                        email.send_on = timezone.now()
+                        sent += 1
+            finally:
+                connection.close()
+
+        for email in batch:
+            email.claimed_by = ''
+            email.claimed_until = None
+        cls.objects.bulk_update(batch, ['send_on', 'attempts', 'next_attempt_at', 'claimed_by', 'claimed_until', 'last_error'])
+        return sent, len(batch) - sent
+
+    def failed(self, error):
+        self.attempts += 1
+        self.last_error = repr(error)
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.next_attempt_at = None
+        else:
+            self.next_attempt_at = timezone.now() + min(self.RETRY_BASE * 2 ** (self.attempts - 1), self.RETRY_MAX)
+
+    def get_message(self):
+        return EmailMessage(self.SUBJECT, self.notification.content, to=[self.email])
+
+    def sendNotification(self):
+        return self.deliver([self])[0] == 1
@@ -0,0 +1,121 @@
+import datetime
+from collections import Counter
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Min, Subquery, Sum
+from lms.models.book import Book
+
+
+class CirculationRollup(models.Model):
+    # Daily circulation counts per (date, subject, language, format), added to
+    # by checkouts, returns, reservations and fines as they happen and rebuilt
+    # from history by `manage.py rebuild_rollups`. Reports read these rows
+    # instead of scanning BookLending, BookReservation and Fine.
+    date = models.DateField()
+    subject = models.CharField(max_length=100)
+    language = models.CharField(max_length=30)
+    format = models.CharField(max_length=2)
+    checkouts = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    reservations = models.PositiveIntegerField(default=0)
+    fines = models.PositiveIntegerField(default=0)
+    fine_amount = models.PositiveBigIntegerField(default=0)
+
+    METRICS = ('checkouts', 'returns', 'reservations', 'fines', 'fine_amount')
+    DIMENSIONS = ('subject', 'language', 'format')
+
+    class Meta:
+        unique_together = ('date', 'subject', 'language', 'format')
+
+    def __str__(self):
+        return f'{self.date} {self.subject} {self.language} {self.format}'
+
+    @classmethod
+    def record(cls, date, book_id, book_format, **counts):
+        """Add `counts` to the day's row for the book's subject and language: a single UPDATE once the row exists."""
+        book = Book.objects.filter(pk=book_id)
+        rows = cls.objects.filter(
+            date=date, format=book_format,
+            subject=Subquery(book.values('subject')[:1]), language=Subquery(book.values('language')[:1]),
+        )
+        if not rows.update(**{name: F(name) + count for name, count in counts.items()}):
+            subject, language = book.values_list('subject', 'language').get()
+            cls.add(date, subject, language, book_format, counts)
+
+    @classmethod
+    def record_many(cls, date, counts):
+        """record() for a {(book_id, format): {metric: count}} mapping, one UPDATE per row touched."""
+        books = dict((pk, (subject, language)) for pk, subject, language in
+                     Book.objects.filter(pk__in={book_id for book_id, _ in counts}).values_list('pk', 'subject', 'language'))
+        merged = {}
+        for (book_id, book_format), values in counts.items():
+            merged.setdefault(books[book_id] + (book_format,), Counter()).update(values)
+        for (subject, language, book_format), values in merged.items():
+            cls.add(date, subject, language, book_format, values)
+
+    @classmethod
+    def add(cls, date, subject, language, book_format, counts):
+        rows = cls.objects.filter(date=date, subject=subject, language=language, format=book_format)
+        changes = {name: F(name) + count for name, count in counts.items()}
+        if rows.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(date=date, subject=subject, language=language, format=book_format, **counts)
+        except IntegrityError:
+            # another request created the row in between
+            rows.update(**changes)
+
+    @classmethod
+    def rebuild(cls, start=None, end=None, window=31):
+        """
+        Recompute the rows from `start` to `end` (default: all history up to
+        today) with grouped queries, `window` days per transaction so memory
+        is bounded by the rows of one window. Returns the number of rows.
+        """
+        from lms.models import BookLending, BookReservation, Fine
+
+        if start is None:
+            start = min(filter(None, [
+                BookLending.objects.aggregate(first=Min('creation_date'))['first'],
+                BookReservation.objects.aggregate(first=Min('creation_date'))['first'],
+            ]), default=None)
+            if start is None:
+                return 0
+        end = end or datetime.date.today()
+
+        sources = [
+            # (queryset, date field, path to the copy's Book, format field, metrics)
+            (BookLending.objects, 'creation_date', 'book_item__book__', 'book_item__format', {'checkouts': Count('pk')}),
+            (BookLending.objects, 'return_date', 'book_item__book__', 'book_item__format', {'returns': Count('pk')}),
+            (BookReservation.objects, 'creation_date', 'book__', 'book_format', {'reservations': Count('pk')}),
+            (Fine.objects, 'lending__return_date', 'lending__book_item__book__', 'lending__book_item__format',
+             {'fines': Count('pk'), 'fine_amount': Sum('amount')}),
+        ]
+        rebuilt = 0
+        window_start = start
+        while window_start <= end:
+            window_end = min(window_start + datetime.timedelta(days=window - 1), end)
+            # one transaction, delete first: it takes the write lock, so a
+            # checkout or return recorded meanwhile waits and is counted on
+            # top of the rebuilt rows instead of being deleted with them
+            with transaction.atomic():
+                cls.objects.filter(date__range=(window_start, window_end)).delete()
+                rows = {}
+                for queryset, date_field, book, book_format, metrics in sources:
+                    grouped = queryset.filter(**{f'{date_field}__range': (window_start, window_end)}).values(
+                        rollup_date=F(date_field), rollup_subject=F(f'{book}subject'),
+                        rollup_language=F(f'{book}language'), rollup_format=F(book_format),
+                    ).annotate(**metrics).order_by()
+                    for values in grouped:
+                        key = (values['rollup_date'], values['rollup_subject'], values['rollup_language'], values['rollup_format'])
+                        row = rows.setdefault(key, dict.fromkeys(cls.METRICS, 0))
+                        for name in metrics:
+                            row[name] += values[name] or 0
+                cls.objects.bulk_create([
+                    cls(date=date, subject=subject, language=language, format=book_format, **counts)
+                    for (date, subject, language, book_format), counts in rows.items()
+                ], batch_size=1000)
+            rebuilt += len(rows)
+            window_start = window_end + datetime.timedelta(days=1)
+        return rebuilt
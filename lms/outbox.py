@@ -0,0 +1,56 @@
+import threading
+import time
+import uuid
+
+from django.core.mail import get_connection
+from django.db import close_old_connections, connections
+
+from lms.models import EmailNotification
+
+
+# Background delivery of EmailNotification rows.
+#
+# Each worker thread repeatedly claims a batch (a conditional UPDATE, so two
+# workers never get the same row), sends it over one mail connection and
+# writes the outcome back with a single bulk_update. Workers stop when there
+# is nothing left to claim.
+
+def drain(batch_size=100, backend=None):
+    stats = {'sent': 0, 'failed': 0, 'batches': 0}
+    token = uuid.uuid4().hex
+    while True:
+        batch = EmailNotification.claim(batch_size, token)
+        if not batch:
+            return stats
+        sent, failed = EmailNotification.deliver(batch, get_connection(backend))
+        stats['sent'] += sent
+        stats['failed'] += failed
+        stats['batches'] += 1
+
+
+def run(workers=1, batch_size=100, backend=None):
+    """Drain the outbox with `workers` threads; returns totals and elapsed time."""
+    started = time.perf_counter()
+    if workers <= 1:
+        totals = drain(batch_size, backend)
+    else:
+        results = []
+        lock = threading.Lock()
+
+        def worker():
+            close_old_connections()
+            try:
+                stats = drain(batch_size, backend)
+                with lock:
+                    results.append(stats)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        totals = {key: sum(stats[key] for stats in results) for key in ('sent', 'failed', 'batches')}
+    totals['elapsed'] = time.perf_counter() - started
+    return totals
@@ -0,0 +1,152 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+
+# What a user may do, resolved once.
+#
+# A Principal holds the user's groups, permissions and account status. It is
+# kept on the request's user object for the rest of the request and in the
+# shared cache for LMS_PRINCIPAL_CACHE_TIMEOUT seconds, so permission checks
+# cost no queries on most requests. Changes to a user, their account or their
+# group/permission membership drop that user's entry; changes to a group's
+# permissions (or deleting a group/permission) invalidate every entry by
+# moving the shared version stamp.
+
+VERSION_KEY = 'lms:principal:version'
+PRINCIPAL_KEY = 'lms:principal:{}:{}'
+DEFAULT_TIMEOUT = 60
+
+
+class Principal(object):
+
+    def __init__(self, user_id=None, is_active=False, is_superuser=False, groups=(), permissions=(), account_id=None, account_status=None):
+        self.user_id = user_id
+        self.is_active = is_active
+        self.is_superuser = is_superuser
+        self.groups = frozenset(groups)
+        self.permissions = frozenset(permissions)
+        self.account_id = account_id
+        self.account_status = account_status
+
+    def has_perm(self, perm):
+        # same answer as ModelBackend.has_perm
+        return self.is_active and (self.is_superuser or perm in self.permissions)
+
+    def in_group(self, name):
+        return name in self.groups
+
+    def as_dict(self):
+        return {
+            'user_id': self.user_id,
+            'is_active': self.is_active,
+            'is_superuser': self.is_superuser,
+            'groups': sorted(self.groups),
+            'permissions': sorted(self.permissions),
+            'account_id': self.account_id,
+            'account_status': self.account_status,
+        }
+
+
+ANONYMOUS = Principal()
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def load(user):
+    from lms.models import Account
+
+    account = Account.objects.filter(user=user).values_list('pk', 'status').first()
+    return Principal(
+        user_id=user.pk,
+        is_active=user.is_active,
+        is_superuser=user.is_superuser,
+        groups=user.groups.values_list('name', flat=True),
+        permissions=user.get_all_permissions() if user.is_active else (),
+        account_id=account[0] if account else None,
+        account_status=account[1] if account else None,
+    )
+
+
+def get_principal(user):
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+    principal = getattr(user, '_lms_principal', None)
+    if principal is not None:
+        return principal
+
+    key = PRINCIPAL_KEY.format(get_version(), user.pk)
+    data = cache.get(key)
+    if data is not None:
+        principal = Principal(**data)
+    else:
+        principal = load(user)
+        cache.set(key, principal.as_dict(), getattr(settings, 'LMS_PRINCIPAL_CACHE_TIMEOUT', DEFAULT_TIMEOUT))
+    user._lms_principal = principal
+    return principal
+
+
+def invalidate_users(user_ids):
+    keys = [PRINCIPAL_KEY.format(get_version(), user_id) for user_id in user_ids if user_id is not None]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # and again once the change is visible, like response_cache.purge()
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_all():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, None))
+
+
+def user_changed(sender, instance, **kwargs):
+    invalidate_users([instance.pk])
+
+
+def account_changed(sender, instance, **kwargs):
+    invalidate_users([instance.user_id])
+
+
+def membership_changed(sender, instance, action, reverse, pk_set, model, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, User):
+        # user.groups / user.user_permissions
+        invalidate_users([instance.pk])
+    elif model is User:
+        # group.user_set
+        if pk_set is None:
+            invalidate_all()
+        else:
+            invalidate_users(pk_set)
+    else:
+        # group.permissions or permission.group_set / permission.user_set
+        invalidate_all()
+
+
+def everything_changed(sender, **kwargs):
+    invalidate_all()
+
+
+def connect_signals():
+    from lms.models import Account
+
+    post_save.connect(user_changed, sender=User, dispatch_uid='lms.principal.user_saved')
+    post_delete.connect(user_changed, sender=User, dispatch_uid='lms.principal.user_deleted')
+    post_save.connect(account_changed, sender=Account, dispatch_uid='lms.principal.account_saved')
+    post_delete.connect(account_changed, sender=Account, dispatch_uid='lms.principal.account_deleted')
+    for through in (User.groups.through, User.user_permissions.through, Group.permissions.through):
+        m2m_changed.connect(membership_changed, sender=through, dispatch_uid=f'lms.principal.{through.__name__}')
+    for model in (Group, Permission):
+        post_delete.connect(everything_changed, sender=model, dispatch_uid=f'lms.principal.{model.__name__}_deleted')
@@ -0,0 +1,107 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+from mysite import metrics
+
+
+# Tagged response cache.
+#
+# Every cached response records the version of each tag it depends on
+# (`book:<isbn>`, `item:<barcode>`, `account:<id>`, or a collection such as
+# `lendings`). purge() moves the tag versions, so any entry stored under an old
+# version is treated as a miss; there is no need to find the entries themselves.
+#
+# Versions come from one shared, increasing sequence. A request reads it before
+# running its query and passes it to store(), which refuses to cache the page
+# if any of its tags was purged since: the rows may predate that change.
+
+ENTRY_KEY = 'lms:response:{}'
+# uuid versions written before the sequence live under the old 'lms:tag:' keys
+TAG_KEY = 'lms:tag-version:{}'
+SEQUENCE_KEY = 'lms:tag-sequence'
+
+
+def book_tag(isbn):
+    return f'book:{isbn}'
+
+
+def item_tag(barcode):
+    return f'item:{barcode}'
+
+
+def account_tag(account_id):
+    return f'account:{account_id}'
+
+
+def make_key(*parts):
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return ENTRY_KEY.format(digest)
+
+
+def lookup(key):
+    entry = cache.get(key)
+    if entry is None:
+        metrics.record_cache(hit=False)
+        return None
+    tags = entry['tags']
+    current = cache.get_many([TAG_KEY.format(tag) for tag in tags])
+    for tag, version in tags.items():
+        if current.get(TAG_KEY.format(tag)) != version:
+            metrics.record_cache(hit=False)
+            return None
+    metrics.record_cache(hit=True)
+    response = HttpResponse(entry['content'], status=entry['status'], content_type=entry['content_type'])
+    response['X-Response-Cache'] = 'hit'
+    return response
+
+
+def sequence():
+    return cache.get(SEQUENCE_KEY, 0)
+
+
+def next_sequence():
+    try:
+        return cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # start past anything an evicted sequence could have handed out
+        cache.add(SEQUENCE_KEY, time.time_ns(), None)
+        return cache.incr(SEQUENCE_KEY)
+
+
+def store(key, response, tags, timeout, since):
+    """Cache `response` unless one of `tags` was purged after `since` (sequence() read before the query)."""
+    tags = set(tags)
+    tag_keys = [TAG_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(tag_keys)
+    for tag_key in tag_keys:
+        if tag_key not in versions:
+            # never purged (or evicted): nothing newer than the rows to compare with
+            cache.add(tag_key, since, None)
+    versions = cache.get_many(tag_keys)
+    if len(versions) != len(tag_keys) or any(version > since for version in versions.values()):
+        return
+    cache.set(key, {
+        'tags': {tag: versions[TAG_KEY.format(tag)] for tag in tags},
+        'content': response.content,
+        'status': response.status_code,
+        'content_type': response['Content-Type'],
+    }, timeout)
+
+
+def purge(*tags):
+    tag_keys = [TAG_KEY.format(tag) for tag in set(tags) if tag]
+    if not tag_keys:
+        return
+
+    def bump():
+        version = next_sequence()
+        cache.set_many({tag_key: version for tag_key in tag_keys}, None)
+
+    bump()
+    # and again once the change is visible, in case a concurrent request
+    # cached the old rows in between
+    transaction.on_commit(bump)
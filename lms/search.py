@@ -0,0 +1,124 @@
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from lms.models import Book
+
+
+# Catalog full-text search.
+#
+# On SQLite the catalog is indexed by an FTS5 table using Book's table as
+# external content: triggers keep it in step with every insert, update and
+# delete of a Book (including bulk_create/update), `unicode61` folds case and
+# diacritics, and the prefix indexes make `term*` lookups cheap. Results are
+# ranked with bm25, weighting title over subject over publisher.
+#
+# Other backends (or SQLite builds without FTS5) fall back to an AND of
+# case-insensitive `icontains` lookups over the same fields (no diacritic
+# folding), with books matching every term in the title ranked first.
+
+SEARCH_FIELDS = ('title', 'subject', 'publisher')
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0)
+
+FTS_TABLE = 'lms_book_fts'
+
+_fts_tables = {}
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query or '')
+
+
+def install(using='default'):
+    """Create the FTS5 index and its triggers, then (re)build it from Book."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+
+    book_table = Book._meta.db_table
+    columns = ', '.join(SEARCH_FIELDS)
+    new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+    old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+    statements = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                {columns},
+                content='{book_table}',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {book_table} BEGIN
+                INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.rowid, {new_values});
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {book_table} BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {book_table} BEGIN
+                INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.rowid, {old_values});
+                INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.rowid, {new_values});
+            END""",
+    ]
+    try:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    except OperationalError:
+        # SQLite compiled without FTS5
+        _fts_tables[using] = False
+        return False
+
+    rebuild(using)
+    _fts_tables[using] = True
+    return True
+
+
+def rebuild(using='default'):
+    # Needed after install and after a VACUUM, which may renumber Book rowids.
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def install_on_migrate(sender, using='default', **kwargs):
+    install(using)
+
+
+def fts_available(using):
+    if using not in _fts_tables:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                available = cursor.fetchone() is not None
+        _fts_tables[using] = available
+    return _fts_tables[using]
+
+
+def search_books(queryset, query):
+    """Filter a Book queryset by `query`, best matches first."""
+    terms = tokenize(query)
+    if not terms:
+        return queryset
+
+    if fts_available(queryset.db):
+        match = ' '.join('"{}"*'.format(term) for term in terms)
+        weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+        book_table = Book._meta.db_table
+        return queryset.extra(
+            select={'search_rank': f'bm25({FTS_TABLE}, {weights})'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {book_table}.rowid', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            order_by=['search_rank', 'title'],
+        )
+
+    in_title = Q()
+    for term in terms:
+        matches = Q()
+        for field in SEARCH_FIELDS:
+            matches |= Q(**{f'{field}__icontains': term})
+        queryset = queryset.filter(matches)
+        in_title &= Q(title__icontains=term)
+    return queryset.annotate(
+        search_rank=Case(When(in_title, then=Value(0)), default=Value(1), output_field=IntegerField()),
+    ).order_by('search_rank', 'title')
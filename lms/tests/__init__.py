@@ -4,3 +4,28 @@ from .book import BookListTest
 from .reservation import ReservationTest
 from .lending import LendingTest
 from .general import AccountPermissionTest
+from .inventory import InventoryTest
+from .library import LibraryConfigCacheTest
+from .search import CatalogSearchTest
+from .batch import BatchCirculationTest
+from .pagination import KeysetPaginationTest
+from .queries import QueryBudgetTest
+from .response_cache import ResponseCacheTest
+from .overdue import OverdueEngineTest
+from .outbox import EmailOutboxTest
+from .notification import UnreadNotificationTest
+from .loadtest import CirculationLoadTest
+from .seed import SeedScaleTest
+from .metrics import MetricsTest
+from .principal import PrincipalTest
+from .authentication import CachedTokenAuthenticationTest
+from .hold import HoldQueueTest
+from .checkout import CheckoutEngineTest
+from .replica import ReplicaRoutingTest
+from .async_api import AsyncReadTest
+from .export import ExportTest
+from .catalog_import import CatalogImportTest
+from .pick_list import PickListTest
+from .report import CirculationRollupTest
+from .dashboard import DashboardTest
+from .fine_ledger import FineLedgerTest
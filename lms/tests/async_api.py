@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.shortcuts import resolve_url
+from django.test import AsyncClient, Client, TestCase
+from rest_framework.authtoken.models import Token
+
+from lms.models import BookItem, BookLending, Notification
+
+from .dummy_data import DummyDataMixin
+
+
+class AsyncReadTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        abrar = User.objects.get(username='abrar')
+        BookLending.check_out(abrar.account, BookItem.objects.get(barcode='barcode123'), datetime.now().date() + timedelta(days=3))
+        Notification.objects.create(account=abrar.account, content='Read already', is_read=True)
+
+    def setUp(self):
+        self.abrar = User.objects.get(username='abrar')
+        self.librarian = User.objects.get(username='librarian')
+        self.client = Client()
+        self.client.force_login(self.abrar)
+        self.async_client = AsyncClient()
+        self.async_client.force_login(self.abrar)
+        self.token = Token.objects.get_or_create(user=self.abrar)[0].key
+
+    def sync_results(self, url):
+        return self.client.get(url).json()
+
+    async def test_same_data_as_sync_views(self):
+        for sync_name, async_name in [
+            ('book_list', 'async_book_list'),
+            ('user_lendings_list', 'async_my_lendings'),
+            ('user_reservations_list', 'async_my_reservations'),
+            ('notification_list', 'async_notifications'),
+        ]:
+            kwargs = {'id': 30} if sync_name.startswith('user_') else {}
+            response = await self.async_client.get(resolve_url(async_name), {'page_size': 50})
+            assert response.status_code == 200, async_name
+            expected = await self.sync_json(resolve_url(sync_name, **kwargs) + '?page_size=50')
+            assert response.json()['results'] == expected['results'], async_name
+
+        response = await self.async_client.get(resolve_url('async_book_detail', isbn='453678754'))
+        assert response.json() == await self.sync_json(resolve_url('book_detail', isbn='453678754'))
+
+    async def sync_json(self, url):
+        from asgiref.sync import sync_to_async
+        return await sync_to_async(self.sync_results)(url)
+
+    async def test_pagination_and_filters(self):
+        response = await self.async_client.get(resolve_url('async_notifications'), {'page_size': 1})
+        data = response.json()
+        assert data['count'] >= 2 and len(data['results']) == 1 and data['previous'] is None
+        assert (await self.async_client.get(data['next'])).json()['previous'].endswith('page_size=1')
+
+        response = await self.async_client.get(resolve_url('async_notifications'), {'is_read': 'true'})
+        assert [row['content'] for row in response.json()['results']] == ['Read already']
+        assert (await self.async_client.get(resolve_url('async_notifications'), {'page': 99})).status_code == 404
+
+    async def test_authentication(self):
+        anonymous = AsyncClient()
+        # AsyncClient takes plain header names, not WSGI's HTTP_*
+        assert (await anonymous.get(resolve_url('async_book_list'))).status_code == 401
+        assert (await anonymous.get(resolve_url('async_my_lendings'))).status_code == 401
+        response = await anonymous.get(resolve_url('async_my_lendings'), authorization=f'Token {self.token}')
+        assert response.status_code == 200 and response.json()['count'] == 1
+        response = await anonymous.get(resolve_url('async_my_lendings'), authorization='Token nope')
+        assert response.status_code == 401
+
+        assert (await self.async_client.post(resolve_url('async_book_list'))).status_code == 405
+        assert (await self.async_client.get(resolve_url('async_book_detail', isbn='missing'))).status_code == 404
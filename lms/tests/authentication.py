@@ -0,0 +1,79 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from lms import authentication
+from lms.models import Account
+from lms.models.account import AccountStatus
+
+from .dummy_data import DummyDataMixin
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auth-test'}})
+class CachedTokenAuthenticationTest(DummyDataMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        authentication.tokens.clear()
+        self.abrar = User.objects.get(username='abrar')
+        self.token = Token.objects.create(user=self.abrar)
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_read_needs_no_queries(self):
+        url = resolve_url('book_list')
+        assert self.client.get(url).status_code == 200
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        assert response.status_code == 200
+        assert response['X-Response-Cache'] == 'hit'
+
+    def test_account_comes_with_user(self):
+        assert self.client.get(resolve_url('my_lendings_list')).status_code == 302
+        with self.assertNumQueries(0):
+            response = self.client.get(resolve_url('my_lendings_list'))
+        assert response.url.endswith(resolve_url('user_lendings_list', id=self.abrar.account.id))
+
+    def test_deleted_token_is_rejected(self):
+        assert self.client.get(resolve_url('book_list')).status_code == 200
+        self.token.delete()
+        assert self.client.get(resolve_url('book_list')).status_code == 401
+
+    def test_regenerated_token(self):
+        assert self.client.get(resolve_url('book_list')).status_code == 200
+        self.token.delete()
+        new = Token.objects.create(user=self.abrar)
+        assert self.client.get(resolve_url('book_list')).status_code == 401
+        assert self.client.get(resolve_url('book_list'), HTTP_AUTHORIZATION=f'Token {new.key}').status_code == 200
+
+    def test_deactivated_user_is_rejected(self):
+        assert self.client.get(resolve_url('book_list')).status_code == 200
+        self.abrar.is_active = False
+        self.abrar.save()
+        assert self.client.get(resolve_url('book_list')).status_code == 401
+
+    def test_account_status_change_is_seen(self):
+        assert self.client.get(resolve_url('book_list')).status_code == 200
+        account = Account.objects.get(pk=self.abrar.account.pk)
+        account.status = AccountStatus.Blacklisted
+        account.save()
+        assert self.client.get(resolve_url('book_list')).status_code == 403
+
+    def test_counters_are_read_fresh(self):
+        auth = authentication.CachedTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+        Account.objects.filter(pk=self.abrar.account.pk).update(issued_book_count=2, unread_notification_count=5, fine_balance=30)
+        with self.assertNumQueries(0):
+            user, _ = auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(1):
+            counters = (user.account.issued_book_count, user.account.unread_notification_count, user.account.fine_balance)
+        assert counters == (2, 5, 30)
+
+    def test_lru_is_bounded(self):
+        with override_settings(LMS_TOKEN_CACHE_SIZE=2):
+            for n in range(3):
+                authentication.tokens.set(f'key-{n}', 'v', ('row',))
+        assert authentication.tokens.get('key-0', 'v') is None
+        assert authentication.tokens.get('key-2', 'v') == ('row',)
+        assert authentication.tokens.get('key-2', 'other') is None
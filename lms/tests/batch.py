@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from lms.models import Account, BookInventory, BookLending, CirculationRollup, Fine, LibraryConfig, Notification
+from lms.models.book import Book, BookItem, BookStatus, Rack
+from lms.principal import get_principal
+
+from .dummy_data import DummyDataMixin
+
+
+class BatchCirculationTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        book = Book.objects.get(isbn='453678754')
+        for i in range(6):
+            BookItem.objects.create(book=book, barcode=f'batch-{i}', price=10, date_of_purchase=datetime.now().date(), placed_at=Rack.objects.create(number=i, location_identifier='BT'))
+
+    def setUp(self):
+        self.abrar = User.objects.get(username='abrar')
+        self.librarian = User.objects.get(username='librarian')
+        self.client = Client()
+        self.client.force_login(self.librarian)
+
+    def issue(self, barcodes, **data):
+        data.setdefault('account', self.abrar.account.id)
+        data['barcodes'] = barcodes
+        return self.client.post(resolve_url('book_issue_batch'), data=json.dumps(data), content_type='application/json')
+
+    def test_issue_partial_failure(self):
+        response = self.issue(['batch-0', 'barcode123-1', 'missing', 'batch-0', 'batch-1', 'batch-2', 'batch-3'])
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [result['status'] for result in response.data['results']] == ['issued', 'failed', 'failed', 'failed', 'issued', 'issued', 'failed']
+        assert response.data['results'][6]['error'] == 'The user has already checked-out maximum number of books'
+        assert response.data['results'][0]['lending']['book_item']['barcode'] == 'batch-0'
+
+        assert Account.objects.get(pk=self.abrar.account.pk).issued_book_count == 3
+        assert set(BookItem.objects.filter(status=BookStatus.Issued).values_list('pk', flat=True)) == {'batch-0', 'batch-1', 'batch-2'}
+        assert BookLending.objects.filter(return_date=None).count() == 3
+        assert BookInventory.objects.get(book_id='453678754').issued == 3
+
+    def test_issue_without_returned_pks(self):
+        # as on MySQL or SQLite < 3.35, where bulk_create() leaves pks unset
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            response = self.issue(['batch-0', 'batch-1'])
+        assert response.status_code == status.HTTP_201_CREATED
+        for result in response.data['results']:
+            lending = BookLending.objects.get(book_item=result['barcode'], return_date=None)
+            assert result['lending']['pk'] == lending.pk
+
+    def test_issue_queries_do_not_grow_with_batch(self):
+        LibraryConfig.object()
+        get_principal(self.librarian)
+        self.abrar.account
+        # the day's first checkout of a kind creates its rollup row
+        CirculationRollup.record(datetime.now().date(), '453678754', 'HC', checkouts=0)
+        with CaptureQueriesContext(connection) as one:
+            self.issue(['batch-0'], bypass_issue_quota=True)
+        with CaptureQueriesContext(connection) as many:
+            response = self.issue(['batch-1', 'batch-2', 'batch-3', 'batch-4', 'batch-5'], bypass_issue_quota=True)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(many) == len(one)
+
+    def test_issue_by_student_forbidden(self):
+        self.client.force_login(self.abrar)
+        assert self.issue(['batch-0']).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_return_batch(self):
+        due_date = datetime.now().date() - timedelta(days=2)
+        book_items = list(BookItem.objects.filter(barcode__in=['batch-0', 'batch-1', 'batch-2']))
+        BookLending.check_out_many(self.abrar.account, book_items, due_date)
+        LibraryConfig.object()
+        get_principal(self.librarian)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(resolve_url('lendings_return_batch'), data=json.dumps({'barcodes': ['batch-0', 'batch-1', 'batch-2', 'batch-4']}), content_type='application/json')
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert response.data['returned'] == 3
+        assert response.data['results'][0]['lending']['fine'] == 20
+        assert response.data['results'][3]['error'] == 'No open lending for this barcode'
+        assert len(ctx) < 20
+
+        assert Account.objects.get(pk=self.abrar.account.pk).issued_book_count == 0
+        assert BookLending.objects.filter(return_date=None).count() == 0
+        assert Fine.objects.count() == 3
+        assert BookInventory.objects.get(book_id='453678754').issued == 0
+        assert BookItem.objects.filter(status=BookStatus.Available).count() == 8
+        assert Notification.objects.filter(account=self.abrar.account).count() == 6
+
+    def test_return_batch_with_lost_copy(self):
+        BookLending.check_out_many(self.abrar.account, list(BookItem.objects.filter(barcode__in=['batch-0', 'batch-1'])), datetime.now().date())
+        lost = BookItem.objects.get(pk='batch-1')
+        lost.status = BookStatus.Lost
+        lost.save()
+
+        response = self.client.post(resolve_url('lendings_return_batch'), data=json.dumps({'barcodes': ['batch-0', 'batch-1']}), content_type='application/json')
+        assert response.status_code == status.HTTP_200_OK
+        assert Account.objects.get(pk=self.abrar.account.pk).issued_book_count == 0
+        assert set(BookItem.objects.filter(pk__in=['batch-0', 'batch-1']).values_list('status', flat=True)) == {BookStatus.Available}
+        inventory = BookInventory.objects.get(book_id='453678754')
+        assert (inventory.issued, inventory.lost) == (0, 0)
+
+    def test_issue_batch_race_reports_each_copy(self):
+        check_out_many = BookLending.check_out_many
+        atul = Account.objects.get(user__username='atul')
+
+        def other_desk_first(account, book_items, *args, **kwargs):
+            BookLending.check_out(atul, BookItem.objects.get(pk='batch-1'), datetime.now().date())
+            return check_out_many(account, book_items, *args, **kwargs)
+
+        with mock.patch.object(BookLending, 'check_out_many', side_effect=other_desk_first):
+            response = self.issue(['batch-0', 'batch-1', 'batch-2'])
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [result['status'] for result in response.data['results']] == ['issued', 'failed', 'issued']
+        assert response.data['results'][1]['error'] == 'Book item cannot be Issued'
+        assert BookLending.objects.get(book_item='batch-1', return_date=None).account == atul
+        assert Account.objects.get(pk=self.abrar.account.pk).issued_book_count == 2
+
+    def test_return_batch_race_reports_each_lending(self):
+        BookLending.check_out_many(self.abrar.account, list(BookItem.objects.filter(barcode__in=['batch-0', 'batch-1'])), datetime.now().date())
+        return_many = BookLending.return_many
+
+        def other_desk_first(lendings, return_date):
+            BookLending.objects.get(book_item='batch-0', return_date=None).return_book_item(return_date)
+            return return_many(lendings, return_date)
+
+        with mock.patch.object(BookLending, 'return_many', side_effect=other_desk_first):
+            response = self.client.post(resolve_url('lendings_return_batch'), data=json.dumps({'barcodes': ['batch-0', 'batch-1']}), content_type='application/json')
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [result['status'] for result in response.data['results']] == ['failed', 'returned']
+        assert response.data['results'][0]['error'] == 'Book item already returned'
+        assert BookLending.objects.filter(return_date=None).count() == 0
+        assert Account.objects.get(pk=self.abrar.account.pk).issued_book_count == 0
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+
+from lms import loadtest
+from lms.models import Account, BookInventory, BookLending, BookReservation, CirculationError
+from lms.models.book import Book, BookItem, BookStatus, Rack
+
+from .dummy_data import DummyDataMixin
+
+
+class CheckoutEngineTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        book = Book.objects.get(isbn='453678754')
+        for i in range(4):
+            BookItem.objects.create(book=book, barcode=f'race-{i}', price=10, date_of_purchase=datetime.now().date(), placed_at=Rack.objects.create(number=i, location_identifier='RC'))
+
+    def setUp(self):
+        self.due_date = datetime.now().date() + timedelta(days=5)
+        self.abrar = Account.objects.get(user__username='abrar')
+        self.atul = Account.objects.get(user__username='atul')
+
+    def test_copy_goes_to_one_desk(self):
+        # both desks loaded the copy while it was still on the shelf
+        first, second = BookItem.objects.get(pk='race-0'), BookItem.objects.get(pk='race-0')
+        BookLending.check_out(self.abrar, first, self.due_date)
+        with self.assertRaises(CirculationError):
+            BookLending.check_out(self.atul, second, self.due_date)
+
+        assert BookLending.objects.filter(book_item='race-0', return_date=None).count() == 1
+        assert Account.objects.get(pk=self.atul.pk).issued_book_count == 0
+        assert BookInventory.objects.get(book_id='453678754').issued == 1
+
+    def test_quota_holds_with_stale_account(self):
+        stale = Account.objects.get(pk=self.abrar.pk)
+        for i in range(3):
+            BookLending.check_out(Account.objects.get(pk=self.abrar.pk), BookItem.objects.get(pk=f'race-{i}'), self.due_date, issue_limit=3)
+        assert stale.issued_book_count == 0
+        with self.assertRaisesMessage(CirculationError, 'maximum number of books'):
+            BookLending.check_out(stale, BookItem.objects.get(pk='race-3'), self.due_date, issue_limit=3)
+        assert BookItem.objects.get(pk='race-3').status == BookStatus.Available
+
+        with self.assertRaises(CirculationError):
+            BookLending.check_out_many(stale, [BookItem.objects.get(pk='race-3')], self.due_date, issue_limit=3)
+        assert Account.objects.get(pk=self.abrar.pk).issued_book_count == 3
+
+    def test_double_return(self):
+        lending = BookLending.check_out(self.abrar, BookItem.objects.get(pk='race-0'), self.due_date)
+        again = BookLending.objects.select_related('account', 'book_item').get(pk=lending.pk)
+        lending.return_book_item(self.due_date)
+        with self.assertRaises(CirculationError):
+            again.return_book_item(self.due_date)
+        with self.assertRaises(CirculationError):
+            BookLending.return_many([again], self.due_date)
+        assert Account.objects.get(pk=self.abrar.pk).issued_book_count == 0
+
+    def test_double_reserve(self):
+        BookReservation.reserve_book_item(self.abrar, BookItem.objects.get(pk='race-0'))
+        with self.assertRaises(CirculationError):
+            BookReservation.reserve_book_item(self.atul, BookItem.objects.get(pk='race-0'))
+        assert BookReservation.objects.filter(book_item='race-0').count() == 1
+
+    def test_recount_issued(self):
+        BookLending.check_out(self.abrar, BookItem.objects.get(pk='race-0'), self.due_date)
+        Account.objects.filter(pk__in=[self.abrar.pk, self.atul.pk]).update(issued_book_count=7)
+        assert Account.recount_issued(Account.objects.filter(pk__in=[self.abrar.pk, self.atul.pk])) == 2
+        assert dict(Account.objects.filter(pk__in=[self.abrar.pk, self.atul.pk]).values_list('pk', 'issued_book_count')) == {self.abrar.pk: 1, self.atul.pk: 0}
+
+    def test_stress_keeps_invariants(self):
+        _, accounts = loadtest.setup_fixture(books=2, items=4, patrons=3)
+        barcodes = [f'{loadtest.PREFIX}-{n:06d}' for n in range(4)]
+        stats = loadtest.stress(accounts, barcodes, operations=200, threads=1, seed=3)
+        assert stats['checkouts'] and stats['returns'] and stats['conflicts']
+        assert stats['busy'] == 0
+        assert set(loadtest.audit().values()) == {0}
+
+        # and the audit does notice a lost update
+        Account.objects.filter(pk=accounts[0].pk).update(issued_book_count=9)
+        assert loadtest.audit()['wrong_issued_count'] == 1
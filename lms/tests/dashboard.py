@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase, override_settings
+
+from lms import dashboard
+from lms.models import Account, BookItem, BookLending, BookReservation, FineAccrual, LibraryConfig
+from lms.models.book import Book
+
+from .dummy_data import DummyDataMixin
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dashboard-test'}})
+class DashboardTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = datetime.now().date()
+        abrar = Account.objects.get(user__username='abrar')
+        BookLending.check_out(abrar, BookItem.objects.get(pk='barcode123'), today - timedelta(days=3))
+        FineAccrual.process_overdues(today)
+        cls.hold = BookReservation.place_hold(Account.objects.get(user__username='atul'), Book.objects.get(isbn='453678754'))
+
+    def setUp(self):
+        self.today = datetime.now().date()
+        cache.clear()
+
+    def test_build(self):
+        with self.assertNumQueries(9):
+            data = dashboard.build(self.today)
+        assert data['counts'] == {
+            'overdue': 1, 'waiting_holds': 1, 'ready_holds': 0, 'issued_today': 1, 'returned_today': 0, 'lost': 0,
+            'accruing_fines': 1, 'accruing_fine_amount': 3 * LibraryConfig.object().fine_per_late_day, 'accounts_owing': 0, 'fines_owed': 0,
+        }
+        assert [(row['barcode'], row['days_overdue']) for row in data['oldest_overdue']] == [('barcode123', 3)]
+        assert [row['reservation'] for row in data['oldest_holds']] == [self.hold.pk]
+        assert data['top_subjects'] == [{'subject': 'Data Science', 'checkouts': 1}]
+
+    def test_cached(self):
+        first = dashboard.get(self.today)
+        with self.assertNumQueries(0):
+            assert dashboard.get(self.today) == first
+
+        # stale, but another request holds the rebuild lock
+        cache.set(dashboard.CACHE_KEY, (0, first))
+        cache.add(dashboard.LOCK_KEY, 1)
+        with self.assertNumQueries(0):
+            assert dashboard.get(self.today) is not None
+        cache.delete(dashboard.LOCK_KEY)
+        with self.assertNumQueries(9):
+            dashboard.get(self.today)
+        assert cache.get(dashboard.LOCK_KEY) is None
+
+    def test_endpoint(self):
+        client = Client()
+        client.force_login(User.objects.get(username='librarian'))
+        response = client.get(resolve_url('dashboard'))
+        assert response.status_code == 200
+        assert response.json()['counts']['overdue'] == 1
+
+        client.force_login(User.objects.get(username='abrar'))
+        assert client.get(resolve_url('dashboard')).status_code == 403
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase
+
+from lms.models import Account, BookItem, BookLending
+from lms.views.utils import ExportMixin
+
+from .dummy_data import DummyDataMixin
+
+
+class ExportTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        abrar = Account.objects.get(user__username='abrar')
+        BookLending.check_out(abrar, BookItem.objects.get(pk='barcode123'), datetime.now().date() + timedelta(days=5))
+
+    def client_for(self, username):
+        client = Client()
+        client.force_login(User.objects.get(username=username))
+        return client
+
+    def export(self, client, name, fmt):
+        response = client.get(resolve_url(name), {'format': fmt})
+        assert response.status_code == 200, response.status_code
+        assert response.streaming
+        body = b''.join(response.streaming_content).decode('utf-8')
+        if fmt == 'csv':
+            return list(csv.DictReader(io.StringIO(body)))
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_lendings_csv(self):
+        rows = self.export(self.client_for('librarian'), 'lendings_export', 'csv')
+        assert len(rows) == 1
+        assert rows[0]['barcode'] == 'barcode123'
+        assert rows[0]['first_name'] == 'Abrar'
+        assert rows[0]['due_date'] == (datetime.now().date() + timedelta(days=5)).isoformat()
+        assert rows[0]['return_date'] == ''
+
+    def test_same_permissions_as_list(self):
+        assert len(self.export(self.client_for('abrar'), 'lendings_export', 'ndjson')) == 1
+        assert self.export(self.client_for('atul'), 'lendings_export', 'ndjson') == []
+        assert self.export(self.client_for('atul'), 'reservations_export', 'csv') == []
+        assert Client().get(resolve_url('lendings_export'), {'format': 'csv'}).status_code in (401, 403)
+
+    def test_catalog_and_items(self):
+        librarian = self.export(self.client_for('librarian'), 'book_export', 'ndjson')
+        patron = self.export(self.client_for('abrar'), 'book_export', 'ndjson')
+        assert [row['isbn'] for row in patron] == [row['isbn'] for row in librarian]
+        assert 'issued' in librarian[0] and 'issued' not in patron[0]
+
+        items = {row['barcode']: row for row in self.export(self.client_for('librarian'), 'book_item_export', 'csv')}
+        assert items['barcode123']['status'] == 'Issued'
+        assert items['barcode123-1']['is_reference_only'] == 'True'
+
+    def test_streams_in_chunks(self):
+        ExportMixin.export_chunk_size, chunk_size = 1, ExportMixin.export_chunk_size
+        try:
+            response = self.client_for('librarian').get(resolve_url('book_item_export'), {'format': 'csv'})
+            chunks = list(response.streaming_content)
+        finally:
+            ExportMixin.export_chunk_size = chunk_size
+        # the header, then a chunk per row
+        assert len(chunks) == 1 + BookItem.objects.count()
+        assert response['Content-Disposition'] == 'attachment; filename="book-items.csv"'
+
+    def test_unknown_format(self):
+        response = self.client_for('librarian').get(resolve_url('lendings_export'), {'format': 'xml'})
+        assert response.status_code == 404
@@ -0,0 +1,98 @@
+import io
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase, override_settings
+
+from lms.models import Account, BookItem, BookLending, Fine, FineError, FineTransaction, FineTransactionType, LibraryConfig
+from lms.models.book import Book, Rack
+
+from .dummy_data import DummyDataMixin
+
+
+class FineLedgerTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = datetime.now().date()
+        book = Book.objects.create(isbn='444555666', title='Overdue', subject='Fines', publisher='Push', language='English', numer_of_pages=10)
+        for i in range(3):
+            BookItem.objects.create(book=book, barcode=f'ledger-{i}', price=10, date_of_purchase=today,
+                                    placed_at=Rack.objects.create(number=i, location_identifier='RF'))
+
+    def setUp(self):
+        self.today = datetime.now().date()
+        self.per_day = LibraryConfig.object().fine_per_late_day
+        self.abrar = Account.objects.get(user__username='abrar')
+        # 2, 3 and 4 days late
+        self.lendings = [BookLending.check_out(self.abrar, BookItem.objects.get(pk=f'ledger-{i}'), self.today - timedelta(days=i + 2)) for i in range(3)]
+
+    def balance(self):
+        return Account.objects.get(pk=self.abrar.pk).fine_balance
+
+    def test_returns_accrue(self):
+        self.lendings[0].return_book_item(self.today)
+        BookLending.return_many(list(BookLending.objects.filter(pk__in=[lending.pk for lending in self.lendings[1:]]).select_related('account', 'book_item')),
+                                self.today)
+        assert self.balance() == 9 * self.per_day
+        assert sorted(FineTransaction.objects.filter(account=self.abrar).values_list('type', 'amount')) == \
+            [(FineTransactionType.Accrual, n * self.per_day) for n in (2, 3, 4)]
+        assert FineTransaction.reconcile() == []
+
+    def test_payment_and_waiver(self):
+        for lending in self.lendings:
+            lending.return_book_item(self.today)
+        fines = {fine.lending_id: fine for fine in Fine.objects.filter(lending__in=self.lendings)}
+
+        # settles the oldest return first, the same day here, so by pk
+        entry, settled = FineTransaction.pay(self.abrar, 3 * self.per_day, cash_tendered=100 * self.per_day)
+        assert [(fine.lending_id, fine.settled) for fine in settled] == [(self.lendings[0].pk, 2 * self.per_day), (self.lendings[1].pk, self.per_day)]
+        assert entry.cashtransaction.get_change() == 97 * self.per_day
+        assert self.balance() == 6 * self.per_day
+
+        FineTransaction.waive(fines[self.lendings[2].pk])
+        assert self.balance() == 2 * self.per_day
+        with self.assertRaises(FineError):
+            FineTransaction.pay(self.abrar, 3 * self.per_day)
+        with self.assertRaises(FineError):
+            FineTransaction.waive(fines[self.lendings[2].pk])
+        assert self.balance() == 2 * self.per_day
+        assert FineTransaction.reconcile() == []
+
+    def test_reconcile(self):
+        for lending in self.lendings:
+            lending.return_book_item(self.today)
+        # a fine recorded before the ledger, and a drifted balance
+        FineTransaction.objects.filter(fine__lending=self.lendings[0]).delete()
+        Account.objects.filter(pk=self.abrar.pk).update(fine_balance=1)
+        assert FineTransaction.reconcile() == [(self.abrar.pk, 1, 7 * self.per_day, 9 * self.per_day)]
+
+        out = io.StringIO()
+        call_command('reconcile_fines', '--fix', stdout=out)
+        assert 'All fine balances reconcile' in out.getvalue()
+        assert self.balance() == 9 * self.per_day
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fine-ledger-test'}})
+    def test_balance_changes_purge_lending_lists(self):
+        cache.clear()
+        for lending in self.lendings:
+            lending.return_book_item(self.today)
+        # the patron's list is tagged with the account, the librarian's with all lendings
+        clients = []
+        for username in ('abrar', 'librarian'):
+            client = Client()
+            client.force_login(User.objects.get(username=username))
+            clients.append(client)
+
+        def balances():
+            return [{row['account']['fine_balance'] for row in client.get(resolve_url('lendings_list')).json()['results']} for client in clients]
+
+        assert balances() == [{9 * self.per_day}] * 2
+        FineTransaction.pay(self.abrar, self.per_day)
+        assert balances() == [{8 * self.per_day}] * 2
+        FineTransaction.waive(Fine.objects.get(lending=self.lendings[2]))
+        assert balances() == [{4 * self.per_day}] * 2
@@ -0,0 +1,136 @@
+import json
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase
+from rest_framework import status
+
+from lms.models import Account, BookInventory, BookLending, CirculationError, Notification
+from lms.models.account import AccountStatus
+from lms.models.action import BookReservation, BookReservationFormat, ReservationStatus
+from lms.models.book import Book, BookFormat, BookItem, BookStatus, Rack
+
+from .dummy_data import DummyDataMixin
+
+
+class HoldQueueTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # lends every copy out so the others have to queue
+        Account.objects.filter(user__username='diwakar').update(status=AccountStatus.Active)
+        cls.book = Book.objects.create(isbn='111222333', title='Designing Data', subject='Data Science', publisher='Oreally', language='English', numer_of_pages=600)
+        for i, book_format in enumerate([BookFormat.Hardcover, BookFormat.Paperback]):
+            BookItem.objects.create(book=cls.book, barcode=f'hold-{i}', format=book_format, price=10, date_of_purchase=datetime.now().date(), placed_at=Rack.objects.create(number=i, location_identifier='HQ'))
+
+    def setUp(self):
+        self.abrar = User.objects.get(username='abrar')
+        self.atul = User.objects.get(username='atul')
+        self.diwakar = User.objects.get(username='diwakar')
+        self.librarian = User.objects.get(username='librarian')
+        self.client = Client()
+
+    def lend_all(self):
+        due_date = datetime.now().date() + timedelta(days=5)
+        return BookLending.check_out_many(self.diwakar.account, list(BookItem.objects.filter(book=self.book)), due_date)
+
+    def test_hold_is_allocated_from_shelf(self):
+        hold = BookReservation.place_hold(self.abrar.account, self.book, BookReservationFormat.Paperback)
+        assert hold.status == ReservationStatus.Pending
+        assert hold.book_item.barcode == 'hold-1'
+        assert BookItem.objects.get(pk='hold-1').status == BookStatus.Reserved
+        assert BookInventory.objects.get(book=self.book).reserved == 1
+
+    def test_fifo_allocation_on_return(self):
+        self.lend_all()
+        first = BookReservation.place_hold(self.abrar.account, self.book)
+        second = BookReservation.place_hold(self.atul.account, self.book)
+        assert first.status == second.status == ReservationStatus.Waiting
+
+        BookLending.objects.get(book_item='hold-0', return_date=None).return_book_item(datetime.now().date())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert first.status == ReservationStatus.Pending and first.book_item_id == 'hold-0'
+        assert second.status == ReservationStatus.Waiting and second.book_item_id is None
+        assert BookItem.objects.get(pk='hold-0').status == BookStatus.Reserved
+        assert Notification.objects.filter(account=self.abrar.account, content__contains='ready for pickup').exists()
+
+    def test_format_is_matched(self):
+        self.lend_all()
+        paperback = BookReservation.place_hold(self.abrar.account, self.book, BookReservationFormat.Paperback)
+        anything = BookReservation.place_hold(self.atul.account, self.book)
+
+        BookLending.objects.get(book_item='hold-0', return_date=None).return_book_item(datetime.now().date())
+        paperback.refresh_from_db()
+        anything.refresh_from_db()
+        assert paperback.status == ReservationStatus.Waiting
+        assert anything.book_item_id == 'hold-0'
+
+    def test_return_many_allocates(self):
+        lendings = self.lend_all()
+        hold = BookReservation.place_hold(self.abrar.account, self.book)
+        BookLending.return_many(list(BookLending.objects.filter(pk__in=[lending.pk for lending in lendings]).select_related('account', 'book_item')), datetime.now().date())
+
+        hold.refresh_from_db()
+        assert hold.status == ReservationStatus.Pending
+        statuses = dict(BookItem.objects.filter(book=self.book).values_list('barcode', 'status'))
+        assert sorted(statuses.values()) == sorted([BookStatus.Available, BookStatus.Reserved])
+        inventory = BookInventory.objects.get(book=self.book)
+        assert (inventory.available, inventory.reserved, inventory.issued) == (1, 1, 0)
+
+    def test_cancel_passes_copy_on(self):
+        self.lend_all()
+        first = BookReservation.place_hold(self.abrar.account, self.book)
+        second = BookReservation.place_hold(self.atul.account, self.book)
+        BookLending.objects.get(book_item='hold-0', return_date=None).return_book_item(datetime.now().date())
+
+        BookReservation.objects.get(pk=first.pk).cancel_reservation()
+        second.refresh_from_db()
+        assert second.book_item_id == 'hold-0'
+        assert BookItem.objects.get(pk='hold-0').status == BookStatus.Reserved
+
+        BookReservation.objects.get(pk=second.pk).cancel_reservation()
+        assert BookItem.objects.get(pk='hold-0').status == BookStatus.Available
+
+    def test_cancel_twice(self):
+        self.lend_all()
+        first = BookReservation.place_hold(self.abrar.account, self.book)
+        second = BookReservation.place_hold(self.atul.account, self.book)
+        BookLending.objects.get(book_item='hold-0', return_date=None).return_book_item(datetime.now().date())
+        first.refresh_from_db()
+        first.cancel_reservation()
+
+        # a second cancel must not release the copy now held for the next in line
+        with self.assertRaises(CirculationError):
+            first.cancel_reservation()
+        second.refresh_from_db()
+        assert second.status == ReservationStatus.Pending and second.book_item_id == 'hold-0'
+        assert BookItem.objects.get(pk='hold-0').status == BookStatus.Reserved
+
+        self.client.force_login(self.abrar)
+        response = self.client.put(resolve_url('reservations_detail', pk=first.pk), data=json.dumps({'status': 'canceled'}), content_type='application/json')
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert BookItem.objects.get(pk='hold-0').status == BookStatus.Reserved
+
+    def test_hold_endpoint_and_pickup(self):
+        self.client.force_login(self.abrar)
+        response = self.client.post(resolve_url('book_hold', isbn=self.book.isbn), data={'format': 'HC'})
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['book_item']['barcode'] == 'hold-0'
+        assert response.data['status'] == 'Pending'
+
+        response = self.client.post(resolve_url('book_hold', isbn=self.book.isbn), data={'format': 'HC'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = self.client.post(resolve_url('book_hold', isbn=self.book.isbn), data={'account': self.atul.account.id})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        # only the holder can take the copy home
+        self.client.force_login(self.librarian)
+        response = self.client.post(resolve_url('book_issue'), data={'account': self.atul.account.id, 'book_item': 'hold-0', 'bypass_issue_quota': 'false'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = self.client.post(resolve_url('book_issue'), data={'account': self.abrar.account.id, 'book_item': 'hold-0', 'bypass_issue_quota': 'false'})
+        assert response.status_code == status.HTTP_201_CREATED
+        assert BookReservation.objects.get(account=self.abrar.account).status == ReservationStatus.Completed
@@ -0,0 +1,78 @@
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client, TestCase
+
+from lms.models import BookInventory, BookLending, BookReservation
+from lms.models.book import Book, BookItem, BookStatus, Rack
+from lms.views import book
+
+from .dummy_data import DummyDataMixin
+
+
+class InventoryTest(DummyDataMixin, TestCase):
+
+    def setUp(self):
+        self.abrar = User.objects.get(username='abrar')
+        self.librarian = User.objects.get(username='librarian')
+        self.book = Book.objects.get(isbn='453678754')
+        self.client = Client()
+
+    def inventory(self):
+        return BookInventory.objects.get(book=self.book)
+
+    def test_counts_follow_circulation(self):
+        inventory = self.inventory()
+        assert (inventory.total, inventory.available) == (2, 2)
+
+        book_item = BookItem.objects.get(barcode='barcode123')
+        lending = BookLending.check_out(self.abrar.account, book_item, datetime.now().date())
+        assert (self.inventory().available, self.inventory().issued) == (1, 1)
+
+        lending.return_book_item(datetime.now().date())
+        assert (self.inventory().available, self.inventory().issued) == (2, 0)
+
+        reservation = BookReservation.reserve_book_item(self.abrar.account, BookItem.objects.get(barcode='barcode123'))
+        assert (self.inventory().available, self.inventory().reserved) == (1, 1)
+
+        reservation.cancel_reservation()
+        assert (self.inventory().available, self.inventory().reserved) == (2, 0)
+
+    def test_item_added_and_removed(self):
+        book_item = BookItem.objects.create(book=self.book, barcode='barcode-new', price=10, date_of_purchase=datetime.now().date(), placed_at=Rack.objects.create(number=1, location_identifier='ZZ'))
+        assert self.inventory().total == 3
+
+        book_item.status = BookStatus.Lost
+        book_item.save()
+        assert (self.inventory().available, self.inventory().lost) == (2, 1)
+
+        book_item.delete()
+        assert (self.inventory().total, self.inventory().lost) == (2, 0)
+
+    def test_reconcile(self):
+        BookInventory.objects.all().delete()
+        BookItem.objects.filter(barcode='barcode123').update(status=BookStatus.Lost)
+
+        call_command('reconcile_inventory', stdout=StringIO())
+        inventory = self.inventory()
+        assert (inventory.total, inventory.available, inventory.lost) == (2, 1, 1)
+
+    def test_missing_inventory_is_rebuilt_on_read(self):
+        BookInventory.objects.all().delete()
+        book = Book.objects.get(isbn='453678754')
+        assert book.count_available_bookitems() == 2
+
+    def test_catalog_counts_without_extra_queries(self):
+        for i in range(5):
+            Book.objects.create(isbn=f'99900000{i}', title=f'Book {i}', subject='S', publisher='P', language='L', numer_of_pages=10)
+
+        books = Book.objects.select_related('inventory').order_by('title')
+        with self.assertNumQueries(1):
+            data = book.LibrarianBookSerializer(books, many=True).data
+        assert len(data) == 6
+
+        with self.assertNumQueries(1):
+            data = book.UserBookSerializer(books.all(), many=True, context={'request': None}).data
+        assert [row['isbn'] for row in data if row['is_available']] == ['453678754']
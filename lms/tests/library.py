@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from lms.models import BookLending, LibraryConfig
+from lms.models.book import BookItem
+
+from .dummy_data import DummyDataMixin
+
+
+class LibraryConfigCacheTest(DummyDataMixin, TestCase):
+
+    def setUp(self):
+        self.abrar = User.objects.get(username='abrar')
+        self.librarian = User.objects.get(username='librarian')
+        self.client = Client()
+        LibraryConfig.bump_version()
+
+    def config_queries(self, queries):
+        return [q['sql'] for q in queries if 'lms_libraryconfig' in q['sql']]
+
+    def test_hot_checkout_uses_no_config_queries(self):
+        LibraryConfig.object()
+
+        with CaptureQueriesContext(connection) as ctx:
+            account = self.abrar.account
+            assert account.remaining_issue_count() == 3
+            lending = BookLending.check_out(account, BookItem.objects.get(barcode='barcode123'), datetime.now().date())
+            lending.return_book_item(datetime.now().date() + timedelta(days=2))
+        assert self.config_queries(ctx.captured_queries) == []
+        assert lending.get_fine() == 20
+
+    def test_issue_endpoint_uses_no_config_queries(self):
+        LibraryConfig.object()
+        self.client.force_login(self.librarian)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/book-item/issue/', data={
+                'account': self.abrar.account.id,
+                'book_item': 'barcode123',
+                'bypass_issue_quota': 'false',
+            })
+        assert response.status_code == 201
+        assert self.config_queries(ctx.captured_queries) == []
+
+    def test_save_invalidates_local_copy(self):
+        assert LibraryConfig.object().fine_per_late_day == 10
+
+        config = LibraryConfig.objects.get(pk=1)
+        config.fine_per_late_day = 25
+        with self.captureOnCommitCallbacks(execute=True):
+            config.save()
+        assert LibraryConfig.object().fine_per_late_day == 25
+
+    def test_version_bump_from_other_worker(self):
+        LibraryConfig.object()
+        # another worker saved the config: the row and the shared stamp change
+        LibraryConfig.objects.filter(pk=1).update(maximum_day_limit=30)
+        assert LibraryConfig.object().maximum_day_limit == 10
+
+        cache.set(LibraryConfig.VERSION_CACHE_KEY, 'other-worker', None)
+        assert LibraryConfig.object().maximum_day_limit == 30
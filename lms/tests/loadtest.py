@@ -0,0 +1,31 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from lms import loadtest
+from lms.models import BookItem, BookLending
+
+
+class CirculationLoadTest(TestCase):
+
+    def test_replay_mix_in_process(self):
+        librarian, accounts = loadtest.setup_fixture(books=5, items=20, patrons=4)
+        assert len(accounts) == 4
+        assert loadtest.setup_fixture(books=5, items=20, patrons=4)[1] == accounts
+
+        results = loadtest.run(loadtest.InProcessTransport, librarian, accounts, requests=120, seed=1)
+        assert results['errors'] == 0
+        assert sum(stats['count'] for stats in results['endpoints'].values()) == 120
+        assert {'browse', 'issue', 'return', 'notifications'} <= set(results['endpoints'])
+
+        loadtest.reset_fixture()
+        assert not BookLending.objects.filter(return_date=None).exists()
+        assert len(loadtest.compare(results, results)) == len(results['endpoints']) + 1
+
+    def test_fixture_without_returned_pks(self):
+        # as on MySQL or SQLite < 3.35, where bulk_create() leaves pks unset
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            loadtest.setup_fixture(books=2, items=4, patrons=1)
+        placed = BookItem.objects.filter(barcode__startswith='bench-').order_by('barcode')
+        assert [item.placed_at.number for item in placed] == [0, 1, 2, 3]
@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase, override_settings
+
+from mysite import metrics
+
+from .dummy_data import DummyDataMixin
+
+
+class MetricsTest(DummyDataMixin, TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            LMS_METRICS_DIR=self.directory.name,
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'metrics-test'}},
+        )
+        self.settings_override.enable()
+        cache.clear()
+        metrics.registry = metrics.Registry()
+        self.client = Client()
+        self.client.force_login(User.objects.get(username='abrar'))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.directory.cleanup()
+
+    def series(self, merged, kind, name, **labels):
+        return merged[kind][name].get(metrics.label_key(**labels))
+
+    def test_records_per_url_name(self):
+        self.client.get(resolve_url('book_list'))
+        self.client.get(resolve_url('book_list'))
+        self.client.get(resolve_url('book_detail', isbn='missing'))
+
+        merged = metrics.collect()
+        duration = self.series(merged, 'histograms', 'lms_request_duration_seconds', view='book_list')
+        assert duration[-1] == 2
+        queries = self.series(merged, 'histograms', 'lms_db_queries', view='book_list')
+        assert queries[-2] > 0
+        assert self.series(merged, 'histograms', 'lms_response_size_bytes', view='book_list')[-2] > 0
+        assert self.series(merged, 'counters', 'lms_requests_total', view='book_list', status='200') == 2
+        assert self.series(merged, 'counters', 'lms_requests_total', view='book_detail', status='404') == 1
+        assert self.series(merged, 'counters', 'lms_cache_requests_total', view='book_list', result='miss') == 1
+        assert self.series(merged, 'counters', 'lms_cache_requests_total', view='book_list', result='hit') == 1
+
+    def test_merges_worker_snapshots(self):
+        self.client.get(resolve_url('book_list'))
+        other = metrics.Registry()
+        other.record('book_list', 200, 0.02, 3, 0.001, 100, 0, 0)
+        with open(os.path.join(self.directory.name, '1.json'), 'w') as fp:
+            json.dump(other.snapshot(), fp)
+
+        merged = metrics.collect()
+        assert self.series(merged, 'counters', 'lms_requests_total', view='book_list', status='200') == 2
+
+    def test_endpoint_is_staff_only(self):
+        assert self.client.get('/metrics/').status_code == 403
+
+        staff = User.objects.get(username='librarian')
+        staff.is_staff = True
+        staff.save()
+        self.client.force_login(staff)
+        self.client.get(resolve_url('book_list'))
+        response = self.client.get('/metrics/')
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        body = response.content.decode()
+        assert '# TYPE lms_request_duration_seconds histogram' in body
+        assert 'lms_request_duration_seconds_bucket{le="+Inf",view="book_list"} 1' in body
+        assert 'lms_requests_total{status="200",view="book_list"} 1' in body
@@ -0,0 +1,69 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from lms.models import Account, Notification
+
+from .dummy_data import DummyDataMixin
+
+
+class UnreadNotificationTest(DummyDataMixin, TestCase):
+
+    def setUp(self):
+        self.abrar = User.objects.get(username='abrar')
+        self.atul = User.objects.get(username='atul')
+        Notification.recount_unread()
+        self.client = Client()
+        self.client.force_login(self.abrar)
+
+    def unread(self, user):
+        return Account.objects.get(pk=user.account.pk).unread_notification_count
+
+    def mark_read(self, **data):
+        return self.client.post(resolve_url('notification_mark_read'), data=json.dumps(data), content_type='application/json')
+
+    def test_creation_keeps_counter(self):
+        before = self.unread(self.abrar)
+        Notification.objects.create(account=self.abrar.account, content='one')
+        Notification.objects.bulk_create([
+            Notification(account=self.abrar.account, content='two'),
+            Notification(account=self.atul.account, content='three'),
+            Notification(account=self.atul.account, content='four'),
+            Notification(account=self.atul.account, content='read', is_read=True),
+        ])
+        assert self.unread(self.abrar) == before + 2
+        assert self.unread(self.atul) == Notification.objects.filter(account=self.atul.account, is_read=False).count()
+
+    def test_mark_ids_and_up_to(self):
+        notifications = Notification.objects.bulk_create([Notification(account=self.abrar.account, content=str(n)) for n in range(5)])
+        other = Notification.objects.create(account=self.atul.account, content='not yours')
+        unread = self.unread(self.abrar)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.mark_read(ids=[notifications[0].pk, notifications[1].pk, other.pk])
+        assert response.data == {'marked': 2, 'unread_count': unread - 2}
+        assert len([query for query in ctx.captured_queries if query['sql'].startswith('UPDATE "lms_notification"')]) == 1
+        assert not Notification.objects.get(pk=other.pk).is_read
+
+        response = self.mark_read(up_to=notifications[3].pk)
+        assert response.data['unread_count'] == self.unread(self.abrar)
+        assert not Notification.objects.get(pk=notifications[4].pk).is_read
+
+        response = self.mark_read(all=True)
+        assert response.data['unread_count'] == 0
+        assert not Notification.objects.filter(account=self.abrar.account, is_read=False).exists()
+        assert self.mark_read().status_code == 400
+
+    def test_single_mark_read_and_unread_count(self):
+        notification = Notification.objects.create(account=self.abrar.account, content='hello')
+        unread = self.unread(self.abrar)
+        self.client.post(resolve_url('notification_detail', pk=notification.pk))
+        self.client.post(resolve_url('notification_detail', pk=notification.pk))
+
+        response = self.client.get(resolve_url('notification_unread_count'))
+        assert response.data == {'unread_count': unread - 1}
+        assert unread - 1 == Notification.objects.filter(account=self.abrar.account, is_read=False).count()
@@ -0,0 +1,102 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from lms import outbox
+from lms.models import EmailNotification, Notification
+
+from .dummy_data import DummyDataMixin
+
+
+class FlakyBackend(EmailBackend):
+    failures = 0
+
+    def send_messages(self, messages):
+        if FlakyBackend.failures:
+            FlakyBackend.failures -= 1
+            raise ConnectionError('SMTP unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(LMS_EMAIL_NOTIFICATIONS=True, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxTest(DummyDataMixin, TestCase):
+
+    def setUp(self):
+        self.account = User.objects.get(username='abrar').account
+        self.account.user.email = 'abrar@example.com'
+        self.account.user.save()
+
+    def notify(self, count):
+        Notification.objects.bulk_create([Notification(account=self.account, content=f'hello {n}') for n in range(count)])
+
+    def test_notifications_are_queued_not_sent(self):
+        self.notify(3)
+        Notification.objects.create(account=User.objects.get(username='atul').account, content='no email address')
+        assert EmailNotification.objects.filter(send_on=None).count() == 3
+        assert len(mail.outbox) == 0
+
+    def test_queued_without_returned_pks(self):
+        with override_settings(LMS_EMAIL_NOTIFICATIONS=False):
+            old = Notification.objects.create(account=self.account, content='due soon')
+        # as on MySQL or SQLite < 3.35, where bulk_create() leaves pks unset
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            created = Notification.objects.bulk_create([Notification(account=self.account, content=content)
+                                                        for content in ('due soon', 'due soon', 'overdue')])
+        new = list(Notification.objects.filter(pk__gt=old.pk).order_by('pk').values_list('pk', flat=True))
+        assert [notification.pk for notification in created] == new
+        assert sorted(EmailNotification.objects.values_list('notification_id', flat=True)) == new
+
+    @override_settings(LMS_EMAIL_NOTIFICATIONS=False)
+    def test_disabled(self):
+        self.notify(2)
+        assert not EmailNotification.objects.exists()
+
+    def test_drain_sends_in_batches(self):
+        self.notify(7)
+        stats = outbox.run(workers=1, batch_size=3)
+        assert (stats['sent'], stats['failed'], stats['batches']) == (7, 0, 3)
+        assert len(mail.outbox) == 7
+        assert mail.outbox[0].to == ['abrar@example.com']
+        assert not EmailNotification.objects.filter(send_on=None).exists()
+        assert outbox.run()['batches'] == 0
+
+    def test_claimed_rows_are_skipped(self):
+        self.notify(4)
+        claimed = EmailNotification.claim(3, 'worker-a')
+        assert len(claimed) == 3
+        assert [email.pk for email in EmailNotification.claim(10, 'worker-b')] == [EmailNotification.objects.get(claimed_by='worker-b').pk]
+        assert EmailNotification.claim(10, 'worker-c') == []
+
+    def test_retry_with_backoff(self):
+        self.notify(2)
+        FlakyBackend.failures = 2
+        backend = 'lms.tests.outbox.FlakyBackend'
+        stats = outbox.run(batch_size=10, backend=backend)
+        assert (stats['sent'], stats['failed']) == (0, 2)
+        email = EmailNotification.objects.first()
+        assert email.attempts == 1 and 'SMTP unavailable' in email.last_error
+        assert email.next_attempt_at > timezone.now()
+        assert outbox.run(backend=backend)['batches'] == 0
+
+        EmailNotification.objects.update(next_attempt_at=timezone.now())
+        assert outbox.run(backend=backend)['sent'] == 2
+
+    def test_gives_up_after_max_attempts(self):
+        self.notify(1)
+        email = EmailNotification.objects.get()
+        for _ in range(EmailNotification.MAX_ATTEMPTS):
+            email.failed(ConnectionError())
+        assert email.next_attempt_at is None
+
+    def test_command(self):
+        self.notify(5)
+        out = StringIO()
+        call_command('send_email_notifications', batch_size=2, stdout=out)
+        assert 'Sent 5, failed 0 in 3 batches' in out.getvalue()
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from lms.models import BookLending, Fine, FineAccrual, Notification
+from lms.models.book import Book, BookItem, Rack
+
+from .dummy_data import DummyDataMixin
+
+
+class OverdueEngineTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        book = Book.objects.get(isbn='453678754')
+        for i in range(5):
+            BookItem.objects.create(book=book, barcode=f'overdue-{i}', price=10, date_of_purchase=datetime.now().date(), placed_at=Rack.objects.create(number=i, location_identifier='OD'))
+
+    def setUp(self):
+        self.today = datetime.now().date()
+        self.account = User.objects.get(username='abrar').account
+        items = list(BookItem.objects.filter(barcode__startswith='overdue-').order_by('barcode'))
+        BookLending.check_out_many(self.account, items[:3], self.today - timedelta(days=3))
+        BookLending.check_out_many(self.account, items[3:], self.today + timedelta(days=3))
+
+    def test_accrues_in_chunks_and_notifies_once(self):
+        notifications = Notification.objects.count()
+        stats = FineAccrual.process_overdues(self.today, chunk_size=2)
+        assert stats['processed'] == 3
+        assert stats['created'] == 3
+        assert FineAccrual.objects.count() == 3
+        assert set(FineAccrual.objects.values_list('amount', flat=True)) == {30}
+        assert Notification.objects.count() == notifications + 3
+
+        stats = FineAccrual.process_overdues(self.today + timedelta(days=1), chunk_size=2)
+        assert stats['updated'] == 3 and stats['created'] == 0
+        assert set(FineAccrual.objects.values_list('days_overdue', flat=True)) == {4}
+        assert Notification.objects.count() == notifications + 3
+
+    def test_return_clears_accrual(self):
+        FineAccrual.process_overdues(self.today)
+        lending = BookLending.objects.get(book_item_id='overdue-0', return_date=None)
+        lending.return_book_item(self.today)
+        BookLending.return_many(list(BookLending.objects.filter(book_item_id='overdue-1', return_date=None)), self.today)
+        assert list(FineAccrual.objects.values_list('lending__book_item_id', flat=True)) == ['overdue-2']
+        assert Fine.objects.get(lending=lending).amount == 30
+
+    def test_command(self):
+        out = StringIO()
+        call_command('process_overdues', date=str(self.today), stdout=out)
+        assert 'Processed 3 overdue lendings' in out.getvalue()
+        assert 'lendings/s' in out.getvalue()
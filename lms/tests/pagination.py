@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from lms.models import BookLending, Notification
+from lms.models.book import Book, BookItem, Rack
+from mysite.utils import KeysetPagination
+
+from .dummy_data import DummyDataMixin
+
+
+class KeysetPaginationTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        abrar = User.objects.get(username='abrar')
+        book = Book.objects.get(isbn='453678754')
+        today = datetime.now().date()
+        for i in range(12):
+            book_item = BookItem.objects.create(book=book, barcode=f'page-{i}', price=10, date_of_purchase=today, placed_at=Rack.objects.create(number=i, location_identifier='PG'))
+            lending = BookLending.check_out(abrar.account, book_item, today + timedelta(days=i % 4))
+            if i % 3 == 0:
+                lending.return_book_item(today)
+            Notification.objects.create(account=abrar.account, content=f'notification {i}')
+
+    def setUp(self):
+        self.abrar = User.objects.get(username='abrar')
+        self.client = Client()
+        self.client.force_login(self.abrar)
+
+    def walk(self, url):
+        pks = []
+        pages = []
+        while url:
+            response = self.client.get(url)
+            assert response.status_code == 200
+            assert 'count' not in response.data
+            pks.extend(row['pk'] for row in response.data['results'])
+            pages.append(response.data)
+            url = response.data['next']
+        return pks, pages
+
+    def test_walk_default_ordering(self):
+        url = resolve_url('user_lendings_list', id=self.abrar.account.id) + '?cursor=&page_size=5'
+        pks, pages = self.walk(url)
+        assert pks == list(BookLending.objects.order_by('-creation_date', '-pk').values_list('pk', flat=True))
+        assert len(pages) == 3
+        assert pages[0]['previous'] is None
+
+        response = self.client.get(pages[2]['previous'])
+        assert [row['pk'] for row in response.data['results']] == pks[5:10]
+        response = self.client.get(response.data['previous'])
+        assert [row['pk'] for row in response.data['results']] == pks[:5]
+        assert response.data['previous'] is None
+
+    def test_walk_nullable_ordering(self):
+        base = resolve_url('user_lendings_list', id=self.abrar.account.id) + '?cursor=&page_size=4'
+        for ordering in ['return_date', '-return_date', 'due_date', '-due_date']:
+            pks, _ = self.walk(base + '&ordering=' + ordering)
+            field = ordering.lstrip('-')
+            rows = BookLending.objects.values_list(field, 'pk')
+            expected = sorted(rows, key=lambda row: (row[0] is not None, row[0] or 0, row[1]))
+            if ordering.startswith('-'):
+                expected.reverse()
+            assert pks == [pk for _, pk in expected], ordering
+
+    def test_page_number_is_default(self):
+        response = self.client.get(resolve_url('notification_list'))
+        assert response.data['count'] == Notification.objects.filter(account=self.abrar.account).count()
+
+    def test_deep_page_costs_the_same(self):
+        url = resolve_url('notification_list') + '?cursor=&page_size=2'
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(url)
+        for _ in range(4):
+            response = self.client.get(response.data['next'])
+        with CaptureQueriesContext(connection) as deep:
+            response = self.client.get(response.data['next'])
+        assert len(response.data['results']) == 2
+        assert len(deep) == len(first)
+        assert not any('COUNT(' in query['sql'] or 'OFFSET' in query['sql'] for query in deep.captured_queries)
+
+    def test_deep_page_seeks_the_index(self):
+        paginator = KeysetPagination()
+        paginator.field = 'creation_date'
+        lending = BookLending.objects.order_by('creation_date', 'pk')[6]
+        for descending, op in [(True, '<'), (False, '>')]:
+            after = paginator.after(lending.creation_date, lending.pk, descending, nullable=False)
+            plan = BookLending.objects.filter(after).order_by(*paginator.order_by(descending))[:5].explain()
+            assert f'(creation_date{op}?)' in plan, plan
+            assert 'SCAN' not in plan and 'TEMP B-TREE' not in plan, plan
+
+    def test_invalid_cursor(self):
+        response = self.client.get(resolve_url('notification_list') + '?cursor=garbage')
+        assert response.status_code == 404
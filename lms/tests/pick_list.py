@@ -0,0 +1,101 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase
+
+from lms.models import Account, BookLending
+from lms.models.account import AccountStatus
+from lms.models.action import BookReservation, BookReservationFormat, ReservationStatus
+from lms.models.book import Book, BookFormat, BookItem, Rack
+
+from .dummy_data import DummyDataMixin
+
+
+class PickListTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Account.objects.filter(user__username='diwakar').update(status=AccountStatus.Active)
+        abrar = Account.objects.get(user__username='abrar')
+        atul = Account.objects.get(user__username='atul')
+        diwakar = Account.objects.get(user__username='diwakar')
+        today = datetime.now().date()
+
+        book = Book.objects.create(isbn='222333444', title='Walking Routes', subject='Travel', publisher='Push', language='English', numer_of_pages=100)
+        # (barcode, location, rack)
+        for barcode, location, number in [('pk-a2', 'A', 2), ('pk-a1', 'A', 1), ('pk-b1', 'B', 1), ('pk-b5', 'B', 5),
+                                          ('pk-c3', 'C', 3), ('pk-c9', 'C', 9), ('pk-shelf', 'A', 7)]:
+            BookItem.objects.create(book=book, barcode=barcode, price=10, date_of_purchase=today,
+                                    placed_at=Rack.objects.create(number=number, location_identifier=location))
+        for barcode in ('pk-a2', 'pk-a1', 'pk-b1', 'pk-b5', 'pk-c9'):
+            BookReservation.reserve_book_item(abrar, BookItem.objects.get(pk=barcode))
+        # a hold that found a copy on the shelf
+        cls.hold = BookReservation.place_hold(atul, book)
+
+        # every copy of this one is out; a new copy arrives while a hold waits
+        queued = Book.objects.create(isbn='555666777', title='Queued', subject='Travel', publisher='Push', language='English', numer_of_pages=100)
+        lent = BookItem.objects.create(book=queued, barcode='pk-lent', price=10, date_of_purchase=today,
+                                       placed_at=Rack.objects.create(number=4, location_identifier='B'))
+        BookLending.check_out(diwakar, lent, today + timedelta(days=5))
+        BookReservation.place_hold(atul, queued, BookReservationFormat.ANY)
+        BookItem.objects.create(book=queued, barcode='pk-new', format=BookFormat.Paperback, price=10, date_of_purchase=today,
+                                placed_at=Rack.objects.create(number=3, location_identifier='B'))
+
+    def test_walk_order(self):
+        with self.assertNumQueries(1):
+            stops = list(BookReservation.pick_list())
+        # A up, B down, C up; pk-shelf is on the shelf and nobody waits for it
+        assert [row['barcode'] for row in stops] == ['pk-a1', 'pk-a2', 'pk-b5', 'pk-new', 'pk-b1', 'pk-c3', 'pk-c9']
+        by_barcode = {row['barcode']: row for row in stops}
+        assert by_barcode['pk-new']['reason'] == 'queue' and by_barcode['pk-new']['reservation'] is None
+        assert by_barcode['pk-c3']['reservation'] == self.hold.pk
+        assert by_barcode['pk-c3']['account'] == self.hold.account_id
+        assert by_barcode['pk-a1']['reason'] == 'hold'
+
+        # canceled reservations drop out, their copy goes back to the shelf
+        BookReservation.active().get(book_item='pk-c9').cancel_reservation()
+        assert 'pk-c9' not in [row['barcode'] for row in BookReservation.pick_list()]
+
+        # only the locations visited count for the direction
+        assert [row['barcode'] for row in BookReservation.pick_list(['C', 'B'])] == ['pk-b1', 'pk-new', 'pk-b5', 'pk-c3']
+
+    def test_queue_copies_capped_at_waiting_holds(self):
+        today = datetime.now().date()
+        book = Book.objects.create(isbn='888999000', title='Crowded', subject='Travel', publisher='Push', language='English', numer_of_pages=100)
+        BookReservation.place_hold(Account.objects.get(user__username='atul'), book, BookReservationFormat.ANY)
+        BookReservation.place_hold(Account.objects.get(user__username='diwakar'), book, BookReservationFormat.Paperback)
+        for i in range(6):
+            BookItem.objects.create(book=book, barcode=f'cr-{i}', format=[BookFormat.Hardcover, BookFormat.Paperback][i % 2],
+                                    price=10, date_of_purchase=today, placed_at=Rack.objects.create(number=i, location_identifier='D'))
+        with self.assertNumQueries(1):
+            stops = list(BookReservation.pick_list(['D']))
+        # two waiting holds pull two of the six copies; the "any format" hold is counted once
+        assert [(row['barcode'], row['reason']) for row in stops] == [('cr-0', 'queue'), ('cr-1', 'queue')]
+
+        BookReservation.objects.filter(account__user__username='diwakar', book=book).update(status=ReservationStatus.Canceled)
+        assert [row['barcode'] for row in BookReservation.pick_list(['D'])] == ['cr-0']
+
+    def test_endpoint(self):
+        client = Client()
+        client.force_login(User.objects.get(username='librarian'))
+        response = client.get(resolve_url('reservations_pick_list'), {'location': 'A,C'})
+        assert response.status_code == 200
+        assert [(row['stop'], row['barcode']) for row in response.json()['results']] == [(1, 'pk-a1'), (2, 'pk-a2'), (3, 'pk-c9'), (4, 'pk-c3')]
+
+        client.force_login(User.objects.get(username='abrar'))
+        assert client.get(resolve_url('reservations_pick_list')).status_code == 403
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'picks.csv')
+            call_command('pick_list', '--location', 'B', '--output', path, stdout=io.StringIO())
+            with open(path, newline='') as f:
+                rows = list(csv.DictReader(f))
+        assert [(row['stop'], row['rack'], row['barcode']) for row in rows] == [('1', '1', 'pk-b1'), ('2', '3', 'pk-new'), ('3', '5', 'pk-b5')]
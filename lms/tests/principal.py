@@ -0,0 +1,61 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from lms.models import Account
+from lms.models.account import AccountStatus
+from lms.principal import get_principal
+
+from .dummy_data import DummyDataMixin
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'principal-test'}})
+class PrincipalTest(DummyDataMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh(self, username):
+        # a new user object, as every request gets
+        return User.objects.get(username=username)
+
+    def test_resolved_once_then_shared(self):
+        librarian = self.fresh('librarian')
+        with self.assertNumQueries(4):
+            assert Account.is_librarian(librarian)
+            assert Account.can_checkout(librarian)
+            assert Account.can_return(librarian)
+            assert Account.can_see_all_lendings(librarian)
+            assert Account.can_see_books(librarian)
+
+        librarian = self.fresh('librarian')
+        with self.assertNumQueries(0):
+            assert Account.is_librarian(librarian)
+            assert Account.can_reserve_book_for_others(librarian)
+
+    def test_group_membership_change(self):
+        abrar = self.fresh('abrar')
+        assert not Account.can_checkout(abrar)
+        Group.objects.get(name='Librarian').user_set.add(abrar)
+        assert Account.can_checkout(self.fresh('abrar'))
+        abrar.groups.clear()
+        assert not Account.is_librarian(self.fresh('abrar'))
+
+    def test_group_permission_change(self):
+        assert Account.can_return(self.fresh('librarian'))
+        Group.objects.get(name='Librarian').permissions.remove(Permission.objects.get(codename='can_return_book_item'))
+        assert not Account.can_return(self.fresh('librarian'))
+
+    def test_account_status_change(self):
+        assert Account.can_see_books(self.fresh('abrar'))
+        account = Account.objects.get(user__username='abrar')
+        account.status = AccountStatus.Blacklisted
+        account.save()
+        assert not Account.can_see_books(self.fresh('abrar'))
+        assert get_principal(self.fresh('abrar')).account_id == account.pk
+
+    def test_inactive_user_has_no_permissions(self):
+        librarian = self.fresh('librarian')
+        librarian.is_active = False
+        librarian.save()
+        assert not Account.can_checkout(self.fresh('librarian'))
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.shortcuts import resolve_url
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from lms.models import BookLending, BookReservation, Notification
+from lms.models.book import Book, BookItem, Rack
+
+from .dummy_data import DummyDataMixin
+
+
+class QueryBudgetMixin(object):
+    """
+    assertQueryBudget() fetches a URL at several page sizes and fails when the
+    number of queries grows with the page (an N+1) or exceeds `budget`.
+    """
+    page_sizes = (1, 5, 50)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        return len(ctx), response
+
+    def assertQueryBudget(self, url, budget, page_sizes=None):
+        counts = {}
+        # per-user state (principal, library config) is cached after the first request
+        self.count_queries(url)
+        for page_size in page_sizes or self.page_sizes:
+            # unique parameter so no response cache can answer for the view
+            separator = '&' if '?' in url else '?'
+            page_url = f'{url}{separator}page_size={page_size}&nocache={uuid.uuid4().hex}'
+            counts[page_size], _ = self.count_queries(page_url)
+        assert len(set(counts.values())) == 1, f'{url}: query count grows with page size {counts}'
+        assert max(counts.values()) <= budget, f'{url}: {max(counts.values())} queries, budget {budget}'
+
+    def assertDetailBudget(self, url, budget):
+        queries, _ = self.count_queries(url)
+        assert queries <= budget, f'{url}: {queries} queries, budget {budget}'
+
+
+# the warm-up request must not be culled from a shared, nearly full file cache
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'query-budget-test'}})
+class QueryBudgetTest(QueryBudgetMixin, DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        abrar = User.objects.get(username='abrar')
+        today = datetime.now().date()
+        for b in range(6):
+            book = Book.objects.create(isbn=f'20000000{b}', title=f'Budget book {b}', subject='S', publisher='P', language='L', numer_of_pages=10)
+            for i in range(10):
+                book_item = BookItem.objects.create(book=book, barcode=f'qb-{b}-{i}', price=10, date_of_purchase=today, placed_at=Rack.objects.create(number=b * 10 + i, location_identifier='QB'))
+                if i < 6:
+                    lending = BookLending.check_out(abrar.account, book_item, today - timedelta(days=i))
+                    if i % 2:
+                        lending.return_book_item(today)
+                elif i < 9:
+                    BookReservation.reserve_book_item(abrar.account, book_item)
+
+    def setUp(self):
+        cache.clear()
+        self.abrar = User.objects.get(username='abrar')
+        self.librarian = User.objects.get(username='librarian')
+        self.client = Client()
+
+    def test_catalog(self):
+        self.client.force_login(self.librarian)
+        self.assertQueryBudget(resolve_url('book_list'), 8)
+        self.assertQueryBudget(resolve_url('book_item_list'), 8)
+        self.assertDetailBudget(resolve_url('book_detail', isbn='200000001'), 8)
+
+    def test_lendings(self):
+        self.client.force_login(self.librarian)
+        self.assertQueryBudget(resolve_url('lendings_list'), 8)
+        self.assertQueryBudget(resolve_url('lendings_list') + '?cursor=', 8)
+        self.assertDetailBudget(resolve_url('lendings_detail', pk=BookLending.objects.first().pk), 8)
+
+        self.client.force_login(self.abrar)
+        self.assertQueryBudget(resolve_url('user_lendings_list', id=self.abrar.account.id), 8)
+
+    def test_reservations(self):
+        self.client.force_login(self.librarian)
+        self.assertQueryBudget(resolve_url('reservations_list'), 8)
+        self.assertQueryBudget(resolve_url('reservations_list') + '?cursor=', 8)
+
+        self.client.force_login(self.abrar)
+        self.assertQueryBudget(resolve_url('user_reservations_list', id=self.abrar.account.id), 8)
+        self.assertDetailBudget(resolve_url('reservations_detail', pk=BookReservation.objects.first().pk), 8)
+
+    def test_notifications(self):
+        self.client.force_login(self.abrar)
+        assert Notification.objects.count() > 50
+        self.assertQueryBudget(resolve_url('notification_list'), 6)
@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase, override_settings
+
+from lms import response_cache
+from lms.models import Book
+from lms.views.book import BookListView
+from mysite import routers
+
+from .dummy_data import DummyDataMixin
+
+
+# 'default' stands in for the replica: the routing decisions are what is tested
+@override_settings(
+    LMS_REPLICA_DATABASE='default',
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'replica-test'}},
+)
+class ReplicaRoutingTest(DummyDataMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        routers.down_until[0] = 0.0
+        self.abrar = User.objects.get(username='abrar')
+        self.client = Client()
+        self.client.force_login(self.abrar)
+
+    def read_database(self, url):
+        response = self.client.get(url)
+        assert response.status_code == 200, response.status_code
+        return response.get('X-Read-Database')
+
+    def test_list_endpoints_read_replica(self):
+        for name in ('book_list', 'book_item_list', 'lendings_list', 'reservations_list', 'notification_list'):
+            assert self.read_database(resolve_url(name)) == 'default', name
+        assert self.read_database(resolve_url('book_detail', isbn='453678754')) is None
+
+    def test_read_your_writes(self):
+        response = self.client.post(resolve_url('notification_mark_read'), {'all': 'true'})
+        assert response.status_code == 200
+        assert self.read_database(resolve_url('notification_list')) is None
+
+        # other clients are not pinned
+        other = Client()
+        other.force_login(User.objects.get(username='atul'))
+        assert other.get(resolve_url('notification_list')).get('X-Read-Database') == 'default'
+
+        cache.clear()
+        assert self.read_database(resolve_url('notification_list')) == 'default'
+
+    def test_replica_reads_are_cached_briefly(self):
+        url = resolve_url('lendings_list')
+        with mock.patch.object(response_cache, 'store', wraps=response_cache.store) as store:
+            response = self.client.get(url)
+        assert response.get('X-Read-Database') == 'default'
+        assert store.call_args[0][3] == settings.LMS_REPLICA_CACHE_SECONDS
+        assert self.client.get(url).get('X-Response-Cache') == 'hit'
+
+    def test_fallback_to_primary(self):
+        original = BookListView.list
+
+        def replica_down(view, request, *args, **kwargs):
+            if routers.current.get() is not None:
+                raise OperationalError('unable to open database file')
+            return original(view, request, *args, **kwargs)
+
+        with mock.patch.object(BookListView, 'list', replica_down):
+            assert self.read_database(resolve_url('book_list')) is None
+        # left alone for a while after failing
+        assert routers.get_replica() is None
+        assert self.read_database(resolve_url('book_list')) is None
+
+    def test_router(self):
+        router = routers.ReplicaRouter()
+        assert router.db_for_read(Book) is None
+        with routers.read_from('replica'):
+            assert router.db_for_read(Book) == 'replica'
+            assert router.db_for_read(User) is None
+            assert router.db_for_write(Book) == 'default'
+        assert router.allow_migrate('replica', 'lms') is False
@@ -0,0 +1,92 @@
+import io
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from lms.models import Account, BookItem, BookLending, BookReservation, CirculationRollup, LibraryConfig
+from lms.models.book import Book, BookFormat, Rack
+
+from .dummy_data import DummyDataMixin
+
+
+class CirculationRollupTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = datetime.now().date()
+        book = Book.objects.create(isbn='333444555', title='Cooking', subject='Cooking', publisher='Push', language='French', numer_of_pages=10)
+        for i, book_format in enumerate([BookFormat.Paperback, BookFormat.Paperback, BookFormat.EBook]):
+            BookItem.objects.create(book=book, barcode=f'roll-{i}', format=book_format, price=10, date_of_purchase=today,
+                                    placed_at=Rack.objects.create(number=i, location_identifier='RO'))
+
+    def setUp(self):
+        self.today = datetime.now().date()
+        self.abrar = Account.objects.get(user__username='abrar')
+        self.atul = Account.objects.get(user__username='atul')
+
+    def snapshot(self):
+        return sorted(CirculationRollup.objects.values_list('date', 'subject', 'language', 'format', *CirculationRollup.METRICS))
+
+    def circulate(self):
+        late = self.today - timedelta(days=2)
+        lending = BookLending.check_out(self.abrar, BookItem.objects.get(pk='roll-0'), late)
+        BookLending.check_out_many(self.atul, list(BookItem.objects.filter(pk__in=['roll-1', 'roll-2'])), self.today + timedelta(days=5))
+        lending.return_book_item(self.today)
+        BookLending.return_many(list(BookLending.objects.filter(book_item='roll-1', return_date=None).select_related('account', 'book_item')), self.today)
+        BookReservation.reserve_book_item(self.abrar, BookItem.objects.get(pk='roll-0'))
+        BookReservation.place_hold(self.atul, Book.objects.get(isbn='453678754'))
+
+    def test_incremental_matches_rebuild(self):
+        self.circulate()
+        paperback = CirculationRollup.objects.get(date=self.today, subject='Cooking', format=BookFormat.Paperback)
+        assert (paperback.checkouts, paperback.returns, paperback.reservations) == (2, 2, 1)
+        assert (paperback.fines, paperback.fine_amount) == (1, 2 * LibraryConfig.object().fine_per_late_day)
+        assert CirculationRollup.objects.get(date=self.today, subject='Cooking', format=BookFormat.EBook).checkouts == 1
+        assert CirculationRollup.objects.get(date=self.today, subject='Data Science').reservations == 1
+
+        incremental = self.snapshot()
+        assert CirculationRollup.rebuild(window=1) == len(incremental)
+        assert self.snapshot() == incremental
+
+    def test_rebuild_reads_inside_its_transaction(self):
+        self.circulate()
+        with CaptureQueriesContext(connection) as queries:
+            CirculationRollup.rebuild(self.today, self.today)
+        sql = [query['sql'] for query in queries.captured_queries]
+        begin = next(i for i, query in enumerate(sql) if query.startswith('SAVEPOINT'))
+        delete = next(i for i, query in enumerate(sql) if query.startswith('DELETE'))
+        grouped = [i for i, query in enumerate(sql) if 'GROUP BY' in query]
+        commit = next(i for i, query in enumerate(sql) if query.startswith('RELEASE SAVEPOINT'))
+        # the delete takes the write lock before the rows are counted
+        assert begin < delete < min(grouped) and max(grouped) < commit, sql
+
+    def test_rebuild_command(self):
+        self.circulate()
+        incremental = self.snapshot()
+        CirculationRollup.objects.update(checkouts=0)
+        call_command('rebuild_rollups', '--since', str(self.today), stdout=io.StringIO())
+        assert self.snapshot() == incremental
+
+    def test_report(self):
+        self.circulate()
+        client = Client()
+        client.force_login(User.objects.get(username='librarian'))
+        response = client.get(resolve_url('report_circulation'), {'group_by': 'subject,format', 'language': 'French'})
+        assert response.status_code == 200
+        data = response.json()
+        assert data['totals']['checkouts'] == 3 and data['totals']['reservations'] == 1
+        assert [(row['subject'], row['format'], row['checkouts']) for row in data['results']] == [('Cooking', 'EB', 1), ('Cooking', 'PB', 2)]
+
+        response = client.get(resolve_url('report_circulation'), {'group_by': 'month', 'book_format': 'EB'})
+        assert response.json()['results'] == [dict(month=self.today.replace(day=1).isoformat(), checkouts=1, returns=0, reservations=0, fines=0, fine_amount=0)]
+
+        assert client.get(resolve_url('report_circulation'), {'group_by': 'title'}).status_code == 400
+        assert client.get(resolve_url('report_circulation'), {'start': 'yesterday'}).status_code == 400
+        client.force_login(User.objects.get(username='abrar'))
+        assert client.get(resolve_url('report_circulation')).status_code == 403
@@ -0,0 +1,123 @@
+from datetime import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase, override_settings
+from rest_framework import mixins
+
+from lms import response_cache
+from lms.models import BookLending, BookReservation
+from lms.models.book import Book, BookItem, Rack
+
+from .dummy_data import DummyDataMixin
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'response-cache-test'}})
+class ResponseCacheTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        book = Book.objects.create(isbn='300000001', title='Single copy', subject='S', publisher='P', language='L', numer_of_pages=10)
+        BookItem.objects.create(book=book, barcode='single-1', price=10, date_of_purchase=datetime.now().date(), placed_at=Rack.objects.create(number=1, location_identifier='RC'))
+
+    def setUp(self):
+        self.abrar = User.objects.get(username='abrar')
+        self.atul = User.objects.get(username='atul')
+        self.librarian = User.objects.get(username='librarian')
+        self.client = Client()
+
+    def get(self, url):
+        response = self.client.get(url)
+        assert response.status_code == 200
+        return response, response.get('X-Response-Cache') == 'hit'
+
+    def test_catalog_purged_on_checkout_and_return(self):
+        self.client.force_login(self.abrar)
+        url = resolve_url('book_list') + '?isbn=300000001'
+        response, hit = self.get(url)
+        assert not hit and response.json()['results'][0]['is_available']
+        _, hit = self.get(url)
+        assert hit
+
+        lending = BookLending.check_out(self.atul.account, BookItem.objects.get(barcode='single-1'), datetime.now().date())
+        response, hit = self.get(url)
+        assert not hit and not response.json()['results'][0]['is_available']
+
+        lending.return_book_item(datetime.now().date())
+        response, hit = self.get(url)
+        assert not hit and response.json()['results'][0]['is_available']
+
+    def test_catalog_shared_between_readers(self):
+        url = resolve_url('book_list')
+        self.client.force_login(self.abrar)
+        self.get(url)
+        self.client.force_login(self.atul)
+        _, hit = self.get(url)
+        assert hit
+
+    def test_lendings_keyed_by_principal(self):
+        url = resolve_url('lendings_list')
+        BookLending.check_out(self.abrar.account, BookItem.objects.get(barcode='barcode123'), datetime.now().date())
+
+        self.client.force_login(self.abrar)
+        response, _ = self.get(url)
+        assert response.json()['count'] == 1
+
+        self.client.force_login(self.atul)
+        response, hit = self.get(url)
+        assert not hit and response.json()['count'] == 0
+
+        # a checkout for atul only invalidates atul's own list
+        self.client.force_login(self.abrar)
+        BookLending.check_out(self.atul.account, BookItem.objects.get(barcode='single-1'), datetime.now().date())
+        _, hit = self.get(url)
+        assert hit
+        self.client.force_login(self.atul)
+        response, hit = self.get(url)
+        assert not hit and response.json()['count'] == 1
+
+        self.client.force_login(self.librarian)
+        response, _ = self.get(url)
+        assert response.json()['count'] == 2
+
+    def test_reservations_purged_on_cancel(self):
+        reservation = BookReservation.reserve_book_item(self.abrar.account, BookItem.objects.get(barcode='single-1'))
+        self.client.force_login(self.librarian)
+        url = resolve_url('reservations_list') + '?status=W'
+        response, _ = self.get(url)
+        assert response.json()['count'] == 1
+        _, hit = self.get(url)
+        assert hit
+
+        reservation.cancel_reservation()
+        response, hit = self.get(url)
+        assert not hit and response.json()['count'] == 0
+
+    def test_book_items_purged_on_status_change(self):
+        self.client.force_login(self.abrar)
+        url = resolve_url('book_item_list') + '?status=AV'
+        response, _ = self.get(url)
+        available = response.json()['count']
+
+        BookReservation.reserve_book_item(self.atul.account, BookItem.objects.get(barcode='single-1'))
+        response, hit = self.get(url)
+        assert not hit and response.json()['count'] == available - 1
+
+    def test_purge_during_query_is_not_cached(self):
+        self.client.force_login(self.abrar)
+        url = resolve_url('book_list') + '?isbn=300000001'
+        list_rows = mixins.ListModelMixin.list
+
+        def purged_while_running(view, *args, **kwargs):
+            response = list_rows(view, *args, **kwargs)
+            response_cache.purge(response_cache.book_tag('300000001'))
+            return response
+
+        with mock.patch.object(mixins.ListModelMixin, 'list', purged_while_running):
+            self.get(url)
+        _, hit = self.get(url)
+        assert not hit
+        _, hit = self.get(url)
+        assert hit
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.shortcuts import resolve_url
+from django.test import Client, TestCase
+
+from lms import search
+from lms.models.book import Book
+
+from .dummy_data import DummyDataMixin
+
+
+class CatalogSearchTest(DummyDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Book.objects.create(isbn='100000001', title='Café society', subject='History', publisher='Gallimard', language='French', numer_of_pages=200)
+        Book.objects.create(isbn='100000002', title='Cooking at home', subject='Café culture', publisher='Push', language='English', numer_of_pages=120)
+        Book.objects.create(isbn='100000003', title='Deep learning', subject='Data Science', publisher='Oreally', language='English', numer_of_pages=500)
+
+    def setUp(self):
+        self.abrar = User.objects.get(username='abrar')
+        self.client = Client()
+
+    def isbns(self, query):
+        return [book.isbn for book in search.search_books(Book.objects.all(), query)]
+
+    def test_index_installed(self):
+        assert search.fts_available(DEFAULT_DB_ALIAS)
+
+    def test_prefix_and_diacritics(self):
+        assert set(self.isbns('lear')) == {'100000003', '453678754'}
+        assert self.isbns('cafe') == ['100000001', '100000002']
+        assert self.isbns('CAFÉ SOC') == ['100000001']
+
+    def test_title_ranked_above_subject(self):
+        assert self.isbns('café')[0] == '100000001'
+
+    def test_index_follows_save_and_delete(self):
+        book = Book.objects.get(isbn='100000003')
+        book.title = 'Reinforcement basics'
+        book.save()
+        assert self.isbns('reinforcement') == ['100000003']
+        assert '100000003' not in self.isbns('deep')
+
+        book.delete()
+        assert self.isbns('reinforcement') == []
+
+    def test_fallback(self):
+        search._fts_tables[DEFAULT_DB_ALIAS] = False
+        try:
+            assert self.isbns('cooking home') == ['100000002']
+            assert self.isbns('café') == ['100000001', '100000002']
+        finally:
+            del search._fts_tables[DEFAULT_DB_ALIAS]
+
+    def test_book_list_search_param(self):
+        self.client.force_login(self.abrar)
+        response = self.client.get(resolve_url('book_list') + '?search=cafe')
+        assert response.status_code == 200
+        assert [row['isbn'] for row in response.data['results']] == ['100000001', '100000002']
@@ -0,0 +1,40 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from lms.models import Account, BookInventory, BookItem, BookLending, Fine, Notification
+from lms.models.book import BookStatus
+
+
+class SeedScaleTest(TestCase):
+
+    def seed(self, **options):
+        options.setdefault('stdout', StringIO())
+        call_command('seed_scale', chunk_size=7, **options)
+
+    def test_consistent_history(self):
+        self.seed(books=20, items=40, accounts=10, lendings=60, open_ratio=0.2)
+
+        assert BookItem.objects.count() == 40
+        assert Account.objects.count() == 10
+        assert BookLending.objects.count() == 60
+        open_lendings = BookLending.objects.filter(return_date=None)
+        assert open_lendings.count() == 12
+        assert BookItem.objects.filter(status=BookStatus.Issued).count() == 12
+        assert sum(Account.objects.values_list('issued_book_count', flat=True)) == 12
+        assert sum(BookInventory.objects.values_list('issued', flat=True)) == 12
+        # dates are spread over the history, not stamped with today
+        assert BookLending.objects.values('creation_date').distinct().count() > 10
+        assert set(Fine.objects.values_list('lending_id', flat=True)) == set(BookLending.objects.filter(return_date__gt=F('due_date')).values_list('pk', flat=True))
+        assert sorted(Account.objects.values_list('user__username', flat=True)) == sorted(f'seed{n}' for n in range(10))
+        assert Notification.objects.count() == 60
+        assert sum(Account.objects.values_list('unread_notification_count', flat=True)) == Notification.objects.filter(is_read=False).count()
+
+    def test_runs_stack(self):
+        self.seed(books=5, items=5, accounts=2, lendings=0)
+        self.seed(books=5, items=5, accounts=2, lendings=10, open_ratio=0)
+        assert BookItem.objects.count() == 10
+        assert Account.objects.count() == 4
+        assert BookLending.objects.filter(return_date=None).count() == 0
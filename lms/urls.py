@@ -2,30 +2,38 @@ from django.conf import settings
 from django.http import JsonResponse
 from django.urls import include, path
 
-from lms.views import book, lending, reservation, notification
+from lms.views import async_api, book, dashboard, lending, reservation, notification, report
 
 urlpatterns = [
     path('books/', book.BookListView.as_view(), name='book_list'),
+    path('books/export/', book.BookExport.as_view(), name='book_export'),
     path('book/<str:isbn>/', include([
         path('', book.BookDetail.as_view(), name='book_detail'),
+        path('hold/', book.BookHold.as_view(), name='book_hold'),
     ])),
 
     path('book-item/', include([
         path('', book.BookItems.as_view(), name='book_item_list'),
+        path('export/', book.BookItemExport.as_view(), name='book_item_export'),
         path('issue/', book.BookIssue.as_view(), name='book_issue'),
+        path('issue/batch/', book.BookIssueBatch.as_view(), name='book_issue_batch'),
         path('reserve/', book.BookItemReservation.as_view(), name='book_reservation')
     ])),
     
     path('lendings/', include([
         path('', lending.AllLendings.as_view(), name='lendings_list'),
+        path('export/', lending.LendingExport.as_view(), name='lendings_export'),
         path('<int:pk>/', lending.LendingDetail.as_view(), name='lendings_detail'),
         path('barcode/<str:barcode>/', lending.LendingDetail.as_view(), name='lendings_return'),
+        path('return/batch/', lending.LendingReturnBatch.as_view(), name='lendings_return_batch'),
         path('user/', lending.AllUserLendings.as_view(), name='my_lendings_list'),
         path('user/<int:id>/', lending.AllUserLendings.as_view(), name='user_lendings_list'),
     ])),
 
     path('reservations/', include([
         path('', reservation.AllReservations.as_view(), name='reservations_list'),
+        path('export/', reservation.ReservationExport.as_view(), name='reservations_export'),
+        path('pick-list/', reservation.PickList.as_view(), name='reservations_pick_list'),
         path('<int:pk>/', reservation.ReservationDetail.as_view(), name='reservations_detail'),
         path('barcode/<str:barcode>/', reservation.ReservationDetail.as_view(), name='reservations_detail_barcode'),
         path('user/', reservation.AllUserReservations.as_view(), name='my_reservations_list'),
@@ -34,6 +42,20 @@ urlpatterns = [
 
     path('notifications/', notification.AllNotification.as_view(), name='notification_list'),
     path('notifications/<int:pk>/', notification.NotificationDetail.as_view(), name='notification_detail'),
+    path('notifications/read/', notification.NotificationMarkRead.as_view(), name='notification_mark_read'),
+    path('notifications/unread-count/', notification.NotificationUnreadCount.as_view(), name='notification_unread_count'),
+
+    path('dashboard/', dashboard.Dashboard.as_view(), name='dashboard'),
+    path('reports/circulation/', report.CirculationReport.as_view(), name='report_circulation'),
+
+    # async versions of the hot read paths, for ASGI servers
+    path('async/', include([
+        path('books/', async_api.book_list, name='async_book_list'),
+        path('book/<str:isbn>/', async_api.book_detail, name='async_book_detail'),
+        path('lendings/user/', async_api.my_lendings, name='async_my_lendings'),
+        path('reservations/user/', async_api.my_reservations, name='async_my_reservations'),
+        path('notifications/', async_api.notifications, name='async_notifications'),
+    ])),
     
 ]
 
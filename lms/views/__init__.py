@@ -1 +1 @@
-from . import book, lending, reservation, notification
\ No newline at end of file
+from . import async_api, book, dashboard, lending, reservation, notification, report
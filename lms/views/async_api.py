@@ -0,0 +1,142 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from lms import aio, search
+from lms.models import Account, Book, BookLending, BookReservation, Notification
+from lms.principal import get_principal
+from lms.views.book import LibrarianBookSerializer, UserBookSerializer
+from lms.views.lending import BookLendingSerializer
+from lms.views.notification import NotificationSerializer
+from lms.views.reservation import BookReservationSerializer
+
+
+# Async versions of the hot read endpoints, for ASGI servers (mysite/asgi.py).
+# Same data as the DRF views, paginated like StandardResultsSetPagination.
+# Authentication, the queries and, rarely, serialization run in the thread
+# that owns the database connection (lms.aio); everything else stays on the
+# event loop, so a waiting client does not hold a thread.
+
+PAGE_SIZE = 5
+MAX_PAGE_SIZE = 50
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def authenticate(request):
+    # the DRF authentication classes, and everything later permission checks
+    # need, loaded in one go so the event loop never touches the database
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    user = drf_request.user
+    get_principal(user)
+    account = getattr(user, 'account', None) if user.is_authenticated else None
+    return user, account
+
+
+def async_get(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        try:
+            user, account = await sync_to_async(authenticate, thread_sensitive=True)(request)
+        except exceptions.APIException as e:
+            return json_response({'detail': str(e.detail)}, status=e.status_code)
+        return await view(request, user, account, *args, **kwargs)
+    return wrapper
+
+
+def forbidden(user):
+    if not user.is_authenticated:
+        return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+    return json_response({'detail': 'You do not have permission to perform this action.'}, status=403)
+
+
+async def paginate(request, queryset, serializer_class, max_page_size=MAX_PAGE_SIZE):
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = max(1, min(int(request.GET.get('page_size', PAGE_SIZE)), max_page_size))
+    except ValueError:
+        return json_response({'detail': 'Invalid page.'}, status=404)
+
+    count = await aio.acount(queryset)
+    offset = (page - 1) * page_size
+    if page < 1 or page > 1 and offset >= count:
+        return json_response({'detail': 'Invalid page.'}, status=404)
+    rows = await aio.alist(queryset[offset:offset + page_size])
+
+    url = request.build_absolute_uri()
+    if page == 1:
+        previous = None
+    elif page == 2:
+        previous = remove_query_param(url, 'page')
+    else:
+        previous = replace_query_param(url, 'page', page - 1)
+    return json_response({
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if offset + page_size < count else None,
+        'previous': previous,
+        'results': await aio.aserialize(serializer_class, rows, many=True),
+    })
+
+
+@async_get
+async def book_list(request, user, account):
+    if not Account.can_see_books(user):
+        return forbidden(user)
+    queryset = Book.objects.select_related('inventory').order_by('title')
+    for field in ('isbn', 'language', 'publisher', 'subject'):
+        if request.GET.get(field):
+            queryset = queryset.filter(**{field: request.GET[field]})
+    if request.GET.get('search'):
+        # may look up whether the full-text index exists
+        queryset = await aio.run(search.search_books, queryset, request.GET['search'])
+    return await paginate(request, queryset, UserBookSerializer)
+
+
+@async_get
+async def book_detail(request, user, account, isbn):
+    try:
+        book = await aio.aget(Book.objects.select_related('inventory'), isbn=isbn)
+    except Book.DoesNotExist:
+        return json_response({'detail': 'Not found.'}, status=404)
+    if not book.is_accessible_by(user):
+        return json_response({'detail': 'Not found.'}, status=404)
+    serializer_class = LibrarianBookSerializer if Account.is_librarian(user) else UserBookSerializer
+    return json_response(await aio.aserialize(serializer_class, book))
+
+
+@async_get
+async def my_lendings(request, user, account):
+    if account is None:
+        return forbidden(user) if not user.is_authenticated else json_response({'detail': 'No account.'}, status=400)
+    queryset = BookLending.objects.filter(account=account).select_related('account__user', 'book_item__book', 'fine') \
+                                  .order_by('-creation_date', '-pk')
+    return await paginate(request, queryset, BookLendingSerializer)
+
+
+@async_get
+async def my_reservations(request, user, account):
+    if account is None:
+        return forbidden(user) if not user.is_authenticated else json_response({'detail': 'No account.'}, status=400)
+    queryset = BookReservation.objects.filter(account=account).select_related('account__user', 'book', 'book_item__book') \
+                                      .order_by('-creation_date', '-pk')
+    return await paginate(request, queryset, BookReservationSerializer)
+
+
+@async_get
+async def notifications(request, user, account):
+    if account is None:
+        return forbidden(user) if not user.is_authenticated else json_response({'detail': 'No account.'}, status=400)
+    queryset = Notification.objects.filter(account=account).order_by('-created_on', '-pk')
+    if request.GET.get('is_read') in ('true', 'false'):
+        queryset = queryset.filter(is_read=request.GET['is_read'] == 'true')
+    return await paginate(request, queryset, NotificationSerializer)
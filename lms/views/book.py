@@ -4,20 +4,20 @@ from django.core.exceptions import PermissionDenied
 from django.http import Http404, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.utils.functional import cached_property
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 
 from lms.models import (Account, Book, BookItem, BookLending, BookStatus,
-                        LibraryConfig)
-from lms.models.action import BookReservation
+                        CirculationError, LibraryConfig)
+from lms.models.action import BookReservation, BookReservationFormat
 
-from rest_framework import generics, mixins, serializers, status
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import filters, generics, mixins, serializers, status
 from rest_framework.response import Response
 
-from .utils import AccountMixin
+from lms import response_cache, search
+from .utils import AccountMixin, EagerLoadingMixin, ExportMixin, ResponseCacheMixin, batch_status, get_list_param
 
 
-class BookMixin(AccountMixin, object):
+class BookMixin(AccountMixin, EagerLoadingMixin, object):
     model = Book
     lookup_field = 'isbn'
     
@@ -80,18 +80,30 @@ class LibrarianBookSerializer(serializers.HyperlinkedModelSerializer):
         return book.count_lost_bookitems()
 
 
-class BookListView(generics.ListAPIView):
+class BookSearchFilter(filters.SearchFilter):
+    # `?search=` goes through the catalog full-text index instead of a regex scan
+
+    def filter_queryset(self, request, queryset, view):
+        return search.search_books(queryset, request.query_params.get(self.search_param, ''))
+
+
+class BookListView(ResponseCacheMixin, EagerLoadingMixin, generics.ListAPIView):
+    read_replica = True
     serializer_class = UserBookSerializer
     permission_classes = []
+    select_related = ('inventory',)
+    filter_backends = [
+        DjangoFilterBackend,
+        BookSearchFilter,
+        filters.OrderingFilter,
+    ]
     filter_fields = (
         'isbn',
         'language',
         'publisher',
         'subject',
     )
-    search_fields = [
-        '$title',
-    ]
+    search_fields = search.SEARCH_FIELDS
     ordering_fields = [
         'numer_of_pages',
     ]
@@ -101,18 +113,51 @@ class BookListView(generics.ListAPIView):
             return Book.objects.all().order_by('title')
         else:
             raise PermissionDenied()
+
+    def get_cache_principal(self, request):
+        # every reader sees the same catalog page
+        if Account.can_see_books(request.user):
+            return 'role:reader'
+        return None
+
+    def get_cache_tags(self, rows):
+        return ['catalog'] + [response_cache.book_tag(row['isbn']) for row in rows]
     
-    @method_decorator(cache_page(60 * 15), name='dispatch')
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
 
+class BookExport(ExportMixin, BookListView):
+    export_name = 'catalog'
+    export_fields = (
+        ('isbn', 'isbn'),
+        ('title', 'title'),
+        ('subject', 'subject'),
+        ('publisher', 'publisher'),
+        ('language', 'language'),
+        ('numer_of_pages', 'numer_of_pages'),
+    )
+    # what LibrarianBookSerializer adds
+    librarian_export_fields = (
+        ('available', 'inventory__available'),
+        ('reserved', 'inventory__reserved'),
+        ('lost', 'inventory__lost'),
+        ('issued', 'inventory__issued'),
+    )
+
+    def get_export_fields(self):
+        if Account.is_librarian(self.request.user):
+            return self.export_fields + self.librarian_export_fields
+        return self.export_fields
+
+
 class BookDetail(
     BookMixin,
     mixins.RetrieveModelMixin,
     generics.GenericAPIView):
                 
     queryset = Book.objects.all()
+    select_related = ('inventory',)
 
     def get(self, request, *args, **kwargs):
         return self.retrieve(request, *args, **kwargs)
@@ -154,13 +199,21 @@ class BookIssue(generics.GenericAPIView):
         if bypass_issue_quota == False and account.remaining_issue_count() <= 0:
             return JsonResponse({'error':'The user has already checked-out maximum number of books'}, status=400)
 
-        if book_item.is_reserved():
+        # a copy on the hold shelf can only go to whoever it is held for
+        held = book_item.is_reserved() and BookReservation.is_held_for(book_item, account)
+        if book_item.is_reserved() and not held:
             return JsonResponse({'error':'Book item is reserved'}, status=400)
         
-        if not book_item.can_be_issued():
+        if not held and not book_item.can_be_issued():
             return JsonResponse({'error':'Book item cannot be Issued'}, status=400)
 
-        book_lend = BookLending.check_out(account, book_item, due_date)
+        # the checks above give the usual answers cheaply; check_out() enforces
+        # them again atomically against concurrent desks
+        issue_limit = None if bypass_issue_quota else LibraryConfig.object().maximum_book_issue_limit
+        try:
+            book_lend = BookLending.check_out(account, book_item, due_date, issue_limit=issue_limit)
+        except CirculationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         from lms.views.lending import BookLendingSerializer
 
         serializer = BookLendingSerializer(book_lend, many=False)
@@ -173,6 +226,98 @@ class BookIssue(generics.GenericAPIView):
         return self.form_valid(self.form)
 
 
+class BookIssueBatch(generics.GenericAPIView):
+    # Issue several barcodes to one account in a single request. Every barcode
+    # gets its own result; the ones that pass validation are issued together,
+    # or one by one if another desk got to a copy (or the last slot) first.
+
+    permission_classes = []
+
+    def get_due_date(self, data):
+        if data.get('due_date'):
+            return datetime.datetime.strptime(data['due_date'], "%d%m%Y").date()
+        max_day = LibraryConfig.object().maximum_day_limit
+        return datetime.datetime.now().date() + datetime.timedelta(days=max_day)
+
+    def issue_each(self, account, barcodes, due_date, issue_limit):
+        # the batch lost a race and was rolled back; reload what it had touched
+        # and find out copy by copy which ones can still be issued
+        account.refresh_from_db()
+        book_items = BookItem.objects.select_related('book').in_bulk(barcodes)
+        lendings, conflicts = [], {}
+        for barcode in barcodes:
+            try:
+                lendings.append(BookLending.check_out(account, book_items[barcode], due_date, issue_limit=issue_limit))
+            except CirculationError as e:
+                conflicts[barcode] = str(e)
+        return lendings, conflicts
+
+    def post(self, request, *args, **kwargs):
+        if not Account.can_checkout(request.user):
+            return HttpResponseForbidden('Do you want me to ban you.')
+
+        data = request.data
+        barcodes = get_list_param(data, 'barcodes')
+        if not barcodes:
+            return JsonResponse({'error': 'No barcodes given'}, status=400)
+        account = get_object_or_404(Account.objects.select_related('user'), id=data.get('account'))
+        bypass_issue_quota = str(data.get('bypass_issue_quota')) in ['true', 'True']
+        due_date = self.get_due_date(data)
+
+        if not account.is_active():
+            return JsonResponse({'error':'Account not Active'}, status=400)
+
+        book_items = BookItem.objects.select_related('book').in_bulk(barcodes)
+        held = set(BookReservation.active().filter(book_item__in=barcodes, account=account).values_list('book_item_id', flat=True)) \
+            if any(book_item.is_reserved() for book_item in book_items.values()) else set()
+        remaining = account.remaining_issue_count()
+        results = []
+        to_issue = []
+        seen = set()
+        for barcode in barcodes:
+            book_item = book_items.get(barcode)
+            if barcode in seen:
+                error = 'Duplicate barcode'
+            elif book_item is None:
+                error = 'Book item not found'
+            elif book_item.is_reserved() and barcode not in held:
+                error = 'Book item is reserved'
+            elif barcode not in held and not book_item.can_be_issued():
+                error = 'Book item cannot be Issued'
+            elif not bypass_issue_quota and len(to_issue) >= remaining:
+                error = 'The user has already checked-out maximum number of books'
+            else:
+                error = None
+            seen.add(barcode)
+
+            if error:
+                results.append({'barcode': barcode, 'status': 'failed', 'error': error})
+            else:
+                results.append({'barcode': barcode, 'status': 'issued'})
+                to_issue.append(book_item)
+
+        issue_limit = None if bypass_issue_quota else LibraryConfig.object().maximum_book_issue_limit
+        conflicts = {}
+        try:
+            lendings = BookLending.check_out_many(account, to_issue, due_date, issue_limit=issue_limit)
+        except CirculationError:
+            lendings, conflicts = self.issue_each(account, [book_item.pk for book_item in to_issue], due_date, issue_limit)
+        from lms.views.lending import BookLendingSerializer
+
+        lendings = {lending.book_item_id: lending for lending in lendings}
+        for result in results:
+            if result['barcode'] in conflicts:
+                result.update(status='failed', error=conflicts[result['barcode']])
+            elif result['status'] == 'issued':
+                result['lending'] = BookLendingSerializer(lendings[result['barcode']]).data
+
+        return Response({
+            'issued': len(lendings),
+            'failed': len(results) - len(lendings),
+            'results': results,
+        }, status=batch_status(len(lendings), len(results)))
+
+
 class BookItemReservation(AccountMixin, generics.GenericAPIView):
 
     permission_classes = []
@@ -203,7 +348,10 @@ class BookItemReservation(AccountMixin, generics.GenericAPIView):
         if book_item.is_reserved():
             return JsonResponse({'error':'Book item is reserved'}, status=400)
 
-        book_reserve = BookReservation.reserve_book_item(account, book_item)
+        try:
+            book_reserve = BookReservation.reserve_book_item(account, book_item)
+        except CirculationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         from lms.views.reservation import BookReservationSerializer
 
         serializer = BookReservationSerializer(book_reserve, many=False)
@@ -215,6 +363,41 @@ class BookItemReservation(AccountMixin, generics.GenericAPIView):
         return HttpResponseForbidden('Do you want me to ban you.')
 
 
+class BookHold(AccountMixin, generics.GenericAPIView):
+    # Join the queue for the next copy of a title, in a given format or any.
+
+    permission_classes = []
+
+    def post(self, request, *args, **kwargs):
+        book = get_object_or_404(Book, isbn=self.kwargs['isbn'])
+        data = request.data
+        if data.get('account'):
+            account = get_object_or_404(Account, id=data['account'])
+        else:
+            account = self.account
+        if account is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        if account == self.account and not self.account.can_reserve_for_own():
+            return HttpResponseForbidden("Can't reserve for own")
+        if account != self.account and not Account.can_reserve_book_for_others(request.user):
+            return HttpResponseForbidden("Can't reserve book")
+
+        book_format = data.get('format') or BookReservationFormat.ANY
+        if book_format not in BookReservationFormat.values:
+            return JsonResponse({'error': 'Unknown format'}, status=400)
+        if BookReservation.active().filter(account=account, book=book).exists():
+            return JsonResponse({'error': 'Already on hold'}, status=400)
+        if not book.bookitem_set.filter(is_reference_only=False).exists():
+            return JsonResponse({'error': 'No copy can be lent'}, status=400)
+
+        hold = BookReservation.place_hold(account, book, book_format)
+        from lms.views.reservation import BookReservationSerializer
+
+        serializer = BookReservationSerializer(hold, many=False)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
 class BookItemSerializer(serializers.ModelSerializer):
     title = serializers.SerializerMethodField('get_title')
     format = serializers.CharField(source='get_format_display')
@@ -228,8 +411,10 @@ class BookItemSerializer(serializers.ModelSerializer):
         return book_item.get_title()
 
 
-class BookItems(generics.ListAPIView):
+class BookItems(ResponseCacheMixin, EagerLoadingMixin, generics.ListAPIView):
+    read_replica = True
     name = 'book-item-list'
+    select_related = ('book',)
     filter_fields = (
         'barcode',
         'format',
@@ -242,12 +427,35 @@ class BookItems(generics.ListAPIView):
     ]
 
     def get_queryset(self):
-        return BookItem.objects.all()
+        return BookItem.objects.order_by('barcode')
     
     def get_serializer_class(self):
         return BookItemSerializer
 
-    @method_decorator(cache_page(60 * 15), name='dispatch')
+    def get_cache_principal(self, request):
+        return 'role:authenticated'
+
+    def get_cache_tags(self, rows):
+        return ['book-items'] + [response_cache.item_tag(row['barcode']) for row in rows]
+
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
+
+class BookItemExport(ExportMixin, BookItems):
+    export_name = 'book-items'
+    # `?format=` picks the export format here, not the copy's format
+    filter_fields = tuple(field for field in BookItems.filter_fields if field != 'format')
+    export_fields = (
+        ('barcode', 'barcode'),
+        ('isbn', 'book_id'),
+        ('title', 'book__title'),
+        ('format', 'format'),
+        ('status', 'status'),
+        ('is_reference_only', 'is_reference_only'),
+        ('borrowed', 'borrowed'),
+        ('due_date', 'due_date'),
+        ('price', 'price'),
+        ('date_of_purchase', 'date_of_purchase'),
+        ('publication_date', 'publication_date'),
+    )
@@ -0,0 +1,17 @@
+from django.core.exceptions import PermissionDenied
+
+from lms import dashboard
+from lms.models import Account
+
+from rest_framework import generics
+from rest_framework.response import Response
+
+
+class Dashboard(generics.GenericAPIView):
+    # Everything the librarian landing page shows, in one response (lms.dashboard).
+    read_replica = True
+
+    def get(self, request, *args, **kwargs):
+        if not Account.can_see_all_lendings(request.user):
+            raise PermissionDenied()
+        return Response(dashboard.get())
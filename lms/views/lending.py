@@ -3,13 +3,13 @@ import datetime
 from django.core.exceptions import PermissionDenied
 from django.http import HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, resolve_url
-from django.utils.decorators import method_decorator
 from django.utils.functional import cached_property
-from django.views.decorators.cache import cache_page
 from django.views.decorators.cache import cache_control
 
-from lms.models import Account, BookItem, BookLending
-from lms.views.utils import AccountMixin
+from lms.models import Account, BookItem, BookLending, CirculationError
+from lms import response_cache
+from lms.views.utils import AccountMixin, EagerLoadingMixin, ExportMixin, ResponseCacheMixin, batch_status, get_list_param
+from mysite.utils import KeysetPagination
 
 from rest_framework import generics, mixins, serializers, status
 from rest_framework.response import Response
@@ -25,7 +25,7 @@ class AccountSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Account
-        fields = ['id', 'name', 'status', 'issued_book_count']
+        fields = ['id', 'name', 'status', 'issued_book_count', 'fine_balance']
     
     def get_name(self, account):
         return account.get_name()
@@ -61,7 +61,10 @@ class BookLendingSerializer(serializers.ModelSerializer):
             return 0
 
 
-class LendingListBase(AccountMixin, generics.ListAPIView):
+class LendingListBase(AccountMixin, EagerLoadingMixin, generics.ListAPIView):
+    pagination_class = KeysetPagination
+    select_related = ('account__user', 'book_item__book', 'fine')
+    keyset_ordering = '-creation_date'
 
     def get_queryset(self):
         # all lending that logged in user can see
@@ -73,8 +76,9 @@ class LendingListBase(AccountMixin, generics.ListAPIView):
         return queryset
 
 
-class AllLendings(LendingListBase):
-    
+class AllLendings(ResponseCacheMixin, LendingListBase):
+    read_replica = True
+
     filter_fields = (
         'account__id',
         'book_item__barcode',
@@ -87,13 +91,44 @@ class AllLendings(LendingListBase):
 
     def get_serializer_class(self):
         return BookLendingSerializer
+
+    def get_cache_principal(self, request):
+        if Account.can_see_all_lendings(request.user):
+            return 'role:all-lendings'
+        return super().get_cache_principal(request)
+
+    def get_cache_tags(self, rows):
+        if Account.can_see_all_lendings(self.request.user) or self.account is None:
+            tags = ['lendings']
+        else:
+            tags = [response_cache.account_tag(self.account.pk)]
+        return tags + [response_cache.item_tag(row['book_item']['barcode']) for row in rows]
     
-    # Should be removed if student & librarian has different serializer
-    @method_decorator(cache_page(60 * 15), name='dispatch')
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
 
+class LendingExport(ExportMixin, LendingListBase):
+    read_replica = True
+    export_name = 'lendings'
+    export_fields = (
+        ('id', 'id'),
+        ('account_id', 'account_id'),
+        ('first_name', 'account__user__first_name'),
+        ('last_name', 'account__user__last_name'),
+        ('barcode', 'book_item_id'),
+        ('isbn', 'book_item__book_id'),
+        ('title', 'book_item__book__title'),
+        ('creation_date', 'creation_date'),
+        ('due_date', 'due_date'),
+        ('return_date', 'return_date'),
+        ('fine', 'fine__amount'),
+    )
+
+    filter_fields = AllLendings.filter_fields
+    ordering_fields = AllLendings.ordering_fields
+
+
 class AllUserLendings(LendingListBase):
     lookup_field = 'id'
 
@@ -151,7 +186,10 @@ class LendingReturnMixin():
         if not is_correct:
             return JsonResponse({'error': message}, status=400)
 
-        self.lending.return_book_item(return_date)
+        try:
+            self.lending.return_book_item(return_date)
+        except CirculationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
         serializer = self.serializer_class(self.lending, many=False)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -163,10 +201,88 @@ class LendingReturnMixin():
         return self.form_valid(self.form())
 
 
-class LendingDetail(AccountMixin, LendingReturnMixin, mixins.RetrieveModelMixin, generics.GenericAPIView):
+class LendingReturnBatch(generics.GenericAPIView):
+    # Return several barcodes (e.g. a returns bin) in a single request. Every
+    # barcode gets its own result; all open lendings found are closed together,
+    # or one by one if another desk changed one of them first.
+
+    serializer_class = BookLendingSerializer
+
+    def return_each(self, pks, return_date):
+        # the batch lost a race and was rolled back; reload the lendings and
+        # return the ones still open one by one
+        lendings = BookLending.objects.filter(pk__in=pks).select_related('account__user', 'book_item__book')
+        returned, conflicts = {}, {}
+        for lending in lendings:
+            try:
+                if lending.return_date is not None:
+                    raise CirculationError('Book item already returned')
+                lending.return_book_item(return_date)
+                returned[lending.book_item_id] = lending
+            except CirculationError as e:
+                conflicts[lending.book_item_id] = str(e)
+        return returned, conflicts
+
+    def post(self, request, *args, **kwargs):
+        if not Account.can_return(request.user):
+            return HttpResponseForbidden('Do you want me to ban you.')
+
+        barcodes = get_list_param(request.data, 'barcodes')
+        if not barcodes:
+            return JsonResponse({'error': 'No barcodes given'}, status=400)
+
+        lendings = {
+            lending.book_item_id: lending
+            for lending in BookLending.objects.filter(return_date=None, book_item__barcode__in=barcodes)
+                                              .select_related('account__user', 'book_item__book')
+        }
+        results = []
+        to_return = []
+        seen = set()
+        for barcode in barcodes:
+            lending = lendings.get(barcode)
+            if barcode in seen:
+                error = 'Duplicate barcode'
+            elif lending is None:
+                error = 'No open lending for this barcode'
+            else:
+                is_correct, error = lending.validate_return_data({})
+                if is_correct:
+                    error = None
+            seen.add(barcode)
+
+            if error:
+                results.append({'barcode': barcode, 'status': 'failed', 'error': error})
+            else:
+                results.append({'barcode': barcode, 'status': 'returned'})
+                to_return.append(lending)
+
+        conflicts = {}
+        try:
+            BookLending.return_many(to_return, datetime.datetime.now().date())
+        except CirculationError:
+            returned, conflicts = self.return_each([lending.pk for lending in to_return], datetime.datetime.now().date())
+            lendings.update(returned)
+
+        for result in results:
+            if result['barcode'] in conflicts:
+                result.update(status='failed', error=conflicts[result['barcode']])
+            elif result['status'] == 'returned':
+                result['lending'] = self.serializer_class(lendings[result['barcode']]).data
+
+        returned_count = len(to_return) - len(conflicts)
+        return Response({
+            'returned': returned_count,
+            'failed': len(results) - returned_count,
+            'results': results,
+        }, status=batch_status(returned_count, len(results), ok=status.HTTP_200_OK))
+
+
+class LendingDetail(AccountMixin, EagerLoadingMixin, LendingReturnMixin, mixins.RetrieveModelMixin, generics.GenericAPIView):
 
     lookup_fields = ['pk', 'barcode']
     serializer_class = BookLendingSerializer
+    select_related = ('account__user', 'book_item__book', 'fine')
 
     @cached_property
     def lending(self):
@@ -174,9 +290,9 @@ class LendingDetail(AccountMixin, LendingReturnMixin, mixins.RetrieveModelMixin,
 
     def get_object(self):
         if 'pk' in self.kwargs:
-            lending = get_object_or_404(BookLending, pk=self.kwargs['pk'])
+            lending = get_object_or_404(self.with_related(BookLending.objects.all()), pk=self.kwargs['pk'])
         elif 'barcode' in self.kwargs:
-            lending = get_object_or_404(BookLending, return_date=None, book_item__barcode = self.kwargs['barcode'])
+            lending = get_object_or_404(self.with_related(BookLending.objects.all()), return_date=None, book_item__barcode = self.kwargs['barcode'])
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -9,13 +9,14 @@ from django.utils.functional import cached_property
 from django.views.decorators.cache import cache_control, cache_page
 
 
-from lms.models import Notification
-from lms.views.utils import AccountMixin
+from lms.models import Account, Notification
+from lms.views.utils import AccountMixin, EagerLoadingMixin, get_list_param
 
 from rest_framework import generics, serializers, status
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from mysite.utils import KeysetPagination
+
 
 class NotificationSerializer(serializers.ModelSerializer):
 
@@ -24,14 +25,13 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = ['pk', 'created_on', 'content', 'is_read']
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 5
-    page_size_query_param = 'page_size'
+class StandardResultsSetPagination(KeysetPagination):
     max_page_size = 50
 
 
-class AllNotification(AccountMixin, generics.ListAPIView):
-    
+class AllNotification(AccountMixin, EagerLoadingMixin, generics.ListAPIView):
+    read_replica = True
+
     filter_fields = (
         'is_read',
     )
@@ -39,6 +39,7 @@ class AllNotification(AccountMixin, generics.ListAPIView):
         'created_on',
     ]
     pagination_class = StandardResultsSetPagination
+    keyset_ordering = '-created_on'
 
     serializer_class = NotificationSerializer
     
@@ -50,17 +51,50 @@ class AllNotification(AccountMixin, generics.ListAPIView):
         return self.list(request, *args, **kwargs)
 
 
-class NotificationDetail(AccountMixin, generics.ListAPIView):
+class NotificationDetail(AccountMixin, EagerLoadingMixin, generics.ListAPIView):
     lookup_field = 'pk'
     serializer_class = NotificationSerializer
 
     def get_object(self):
-        notification = get_object_or_404(Notification, account=self.account, pk=self.kwargs.pk)
+        notification = get_object_or_404(self.with_related(Notification.objects.all()), account=self.account, pk=self.kwargs['pk'])
         return notification
 
     def post(self, request, *args, **kwargs):
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        Notification.mark_read(self.account, ids=[notification.pk])
         return Response(status=status.HTTP_200_OK)
 
+
+class NotificationMarkRead(AccountMixin, generics.GenericAPIView):
+    # Marks several notifications read with one UPDATE: `ids`, everything up to
+    # and including `up_to`, or `all`.
+
+    def post(self, request, *args, **kwargs):
+        if self.account is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        ids = get_list_param(request.data, 'ids')
+        up_to = request.data.get('up_to')
+        mark_all = str(request.data.get('all', '')).lower() in ('1', 'true')
+        if not ids and up_to in (None, '') and not mark_all:
+            return JsonResponse({'error': 'Give ids, up_to or all'}, status=400)
+        try:
+            ids = [int(pk) for pk in ids] if ids else None
+            up_to = int(up_to) if up_to not in (None, '') else None
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Notification ids must be integers'}, status=400)
+
+        marked = Notification.mark_read(self.account, ids=ids, up_to=up_to)
+        self.account.refresh_from_db(fields=['unread_notification_count'])
+        return Response({'marked': marked, 'unread_count': self.account.unread_notification_count})
+
+
+class NotificationUnreadCount(AccountMixin, generics.GenericAPIView):
+
+    def get(self, request, *args, **kwargs):
+        if self.account is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        # read fresh: the account authentication hands out may be cached
+        unread = Account.objects.filter(pk=self.account.pk).values_list('unread_notification_count', flat=True).first()
+        return Response({'unread_count': unread})
+
@@ -0,0 +1,70 @@
+import datetime
+
+from django.core.exceptions import PermissionDenied
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.http import JsonResponse
+
+from lms.models import Account, CirculationRollup
+from lms.views.utils import get_list_param
+
+from rest_framework import generics
+from rest_framework.response import Response
+
+
+class CirculationReport(generics.GenericAPIView):
+    # Checkouts, returns, reservations and fines between `start` and `end`
+    # (default: the last 30 days), grouped by any of `group_by`, read from the
+    # daily rollups (CirculationRollup) rather than the circulation tables.
+    read_replica = True
+    default_days = 30
+    # `?format=` is DRF's output format
+    filters = {'subject': 'subject', 'language': 'language', 'book_format': 'format'}
+    periods = {
+        'day': F('date'),
+        'month': TruncMonth('date'),
+    }
+
+    def parse_date(self, name, default):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+    def get(self, request, *args, **kwargs):
+        if not Account.can_see_all_lendings(request.user):
+            raise PermissionDenied()
+
+        try:
+            end = self.parse_date('end', datetime.date.today())
+            start = self.parse_date('start', end - datetime.timedelta(days=self.default_days - 1))
+        except ValueError:
+            return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+        group_by = get_list_param(request.query_params, 'group_by') if 'group_by' in request.query_params else ['day']
+        unknown = [group for group in group_by if group not in self.periods and group not in CirculationRollup.DIMENSIONS]
+        if unknown:
+            return JsonResponse({'error': f'Cannot group by {", ".join(unknown)}'}, status=400)
+
+        rows = CirculationRollup.objects.filter(date__range=(start, end))
+        for param, dimension in self.filters.items():
+            if request.query_params.get(param):
+                rows = rows.filter(**{dimension: request.query_params[param]})
+        # annotations may not reuse the rollup's field names
+        metrics = {f'total_{name}': Sum(name) for name in CirculationRollup.METRICS}
+
+        aggregate = rows.aggregate(**metrics)
+        totals = {name: aggregate[f'total_{name}'] or 0 for name in CirculationRollup.METRICS}
+        results = []
+        if group_by:
+            dimensions = [group for group in group_by if group in CirculationRollup.DIMENSIONS]
+            periods = {group: self.periods[group] for group in group_by if group in self.periods}
+            for row in rows.values(*dimensions, **periods).annotate(**metrics).order_by(*group_by):
+                results.append({**{group: row[group] for group in group_by},
+                                **{name: row[f'total_{name}'] for name in CirculationRollup.METRICS}})
+        return Response({
+            'start': start,
+            'end': end,
+            'group_by': group_by,
+            'totals': totals,
+            'results': results,
+        })
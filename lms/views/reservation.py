@@ -1,14 +1,16 @@
 from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.utils.decorators import method_decorator
 from django.utils.functional import cached_property
-from django.views.decorators.cache import cache_page
 from django.views.decorators.cache import cache_control
 
-from lms.models import Account, BookReservation
+from lms.models import Account, BookReservation, CirculationError
 from lms.models.action import ReservationStatus
 from lms.models.book import BookItem
-from lms.views.utils import AccountMixin
+from lms import response_cache
+from lms.views.utils import AccountMixin, EagerLoadingMixin, ExportMixin, ResponseCacheMixin, get_list_param
+from mysite.utils import KeysetPagination
 
 from rest_framework import generics, mixins, serializers, status
 from rest_framework.response import Response
@@ -40,15 +42,21 @@ class BookItemSerializer(serializers.ModelSerializer):
 
 class BookReservationSerializer(serializers.ModelSerializer):
     account = AccountSerializer(many=False)
+    isbn = serializers.CharField(source='book_id')
+    title = serializers.CharField(source='book.title')
+    book_format = serializers.CharField(source='get_book_format_display')
     book_item = BookItemSerializer(many=False)
     status = serializers.CharField(source='get_status_display')
 
     class Meta:
         model = BookReservation
-        fields = ['pk', 'account', 'book_item', 'creation_date', 'status']
+        fields = ['pk', 'account', 'isbn', 'title', 'book_format', 'book_item', 'creation_date', 'status']
 
 
-class ReservationListBase(AccountMixin, generics.ListAPIView):
+class ReservationListBase(AccountMixin, EagerLoadingMixin, generics.ListAPIView):
+    pagination_class = KeysetPagination
+    select_related = ('account__user', 'book', 'book_item__book')
+    keyset_ordering = '-creation_date'
 
     def get_queryset(self):
         # all lending that logged in user can see
@@ -60,8 +68,9 @@ class ReservationListBase(AccountMixin, generics.ListAPIView):
         return queryset
 
 
-class AllReservations(ReservationListBase):
-    
+class AllReservations(ResponseCacheMixin, ReservationListBase):
+    read_replica = True
+
     filter_fields = (
         'book_item__barcode',
         'account__id',
@@ -73,13 +82,43 @@ class AllReservations(ReservationListBase):
 
     def get_serializer_class(self):
         return BookReservationSerializer
+
+    def get_cache_principal(self, request):
+        if Account.can_see_all_reservations(request.user):
+            return 'role:all-reservations'
+        return super().get_cache_principal(request)
+
+    def get_cache_tags(self, rows):
+        if Account.can_see_all_reservations(self.request.user) or self.account is None:
+            tags = ['reservations']
+        else:
+            tags = [response_cache.account_tag(self.account.pk)]
+        return tags + [response_cache.item_tag(row['book_item']['barcode']) for row in rows if row['book_item']]
     
-    # Should be removed if student & librarian has different serializer
-    @method_decorator(cache_page(60 * 15), name='dispatch')
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
 
+class ReservationExport(ExportMixin, ReservationListBase):
+    read_replica = True
+    export_name = 'reservations'
+    export_fields = (
+        ('id', 'id'),
+        ('account_id', 'account_id'),
+        ('first_name', 'account__user__first_name'),
+        ('last_name', 'account__user__last_name'),
+        ('isbn', 'book_id'),
+        ('title', 'book__title'),
+        ('book_format', 'book_format'),
+        ('barcode', 'book_item_id'),
+        ('creation_date', 'creation_date'),
+        ('status', 'status'),
+    )
+
+    filter_fields = AllReservations.filter_fields
+    ordering_fields = AllReservations.ordering_fields
+
+
 class AllUserReservations(ReservationListBase):
     lookup_field = 'id'
 
@@ -105,16 +144,31 @@ class AllUserReservations(ReservationListBase):
         return super(AllUserReservations, self).get(request, *args, **kwargs)
 
 
-class ReservationDetail(AccountMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin, generics.GenericAPIView):
+class PickList(generics.GenericAPIView):
+    # Copies to pull for reservations, in walking order (BookReservation.pick_list).
+    # `?location=` limits it to some rack locations.
+
+    def get(self, request, *args, **kwargs):
+        if not Account.can_see_all_reservations(request.user):
+            raise PermissionDenied()
+        stops = [
+            dict(row, stop=n)
+            for n, row in enumerate(BookReservation.pick_list(get_list_param(request.query_params, 'location') or None), 1)
+        ]
+        return Response({'count': len(stops), 'results': stops})
+
+
+class ReservationDetail(AccountMixin, EagerLoadingMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin, generics.GenericAPIView):
 
     lookup_fields = ['pk', 'barcode']
     serializer_class = BookReservationSerializer
+    select_related = ('account__user', 'book', 'book_item__book')
 
     def get_object(self):
         if 'pk' in self.kwargs:
-            reservation = get_object_or_404(BookReservation, pk=self.kwargs['pk'])
+            reservation = get_object_or_404(self.with_related(BookReservation.objects.all()), pk=self.kwargs['pk'])
         elif 'barcode' in self.kwargs:
-            reservation = get_object_or_404(BookReservation, book_item__barcode=self.kwargs['barcode'], status=ReservationStatus.Waiting)
+            reservation = get_object_or_404(self.with_related(BookReservation.objects.all()), book_item__barcode=self.kwargs['barcode'], status__in=[ReservationStatus.Waiting, ReservationStatus.Pending])
         if reservation.account == self.account:
             return reservation
         elif self.account.can_see_reservation(reservation):
@@ -130,7 +184,11 @@ class ReservationDetail(AccountMixin, mixins.RetrieveModelMixin, mixins.UpdateMo
         reservation = self.get_object()
         if reservation.is_editable_by(request.user):
             if 'status' in request.data and request.data['status'].lower() == 'canceled':
-                obj = reservation.cancel_reservation()
+                try:
+                    obj = reservation.cancel_reservation()
+                except CirculationError as e:
+                    # already canceled or completed, possibly by another desk
+                    return JsonResponse({'error': str(e)}, status=status.HTTP_409_CONFLICT)
 
                 # serializer = self.serializer_class(obj, many=False)
                 return Response(status=status.HTTP_200_OK)
@@ -1,4 +1,16 @@
+import csv
+import itertools
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.utils.functional import cached_property
+from django.utils.http import urlencode
+from rest_framework import renderers, status
+
+from lms import response_cache
+from mysite import routers
 
 class AccountMixin():
 
@@ -11,3 +23,182 @@ class AccountMixin():
         else:
             return None
 
+
+
+class EagerLoadingMixin():
+    # Relations the view's serializer reads, loaded along with the rows so a
+    # page costs the same number of queries whatever its size.
+    select_related = ()
+    prefetch_related = ()
+
+    def with_related(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        return self.with_related(super().filter_queryset(queryset))
+
+
+class ResponseCacheMixin():
+    # Caches rendered list responses per principal and query string; entries
+    # are tagged with what they show and dropped when that changes
+    # (see lms.response_cache).
+    cache_timeout = 60 * 15
+
+    def get_cache_principal(self, request):
+        # None skips the cache for this request
+        if not request.user.is_authenticated:
+            return None
+        return f'user:{request.user.pk}'
+
+    def get_cache_tags(self, rows):
+        return []
+
+    def get_cache_key(self, request, principal):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        return response_cache.make_key(
+            self.__class__.__name__, principal, request.accepted_renderer.format, request.path, query,
+        )
+
+    def list(self, request, *args, **kwargs):
+        principal = self.get_cache_principal(request)
+        if principal is None:
+            return super().list(request, *args, **kwargs)
+
+        key = self.get_cache_key(request, principal)
+        response = response_cache.lookup(key)
+        if response is not None:
+            return response
+
+        # before the query, so a purge that lands while it runs is noticed
+        since = response_cache.sequence()
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            data = response.data
+            rows = data.get('results', []) if isinstance(data, dict) else data
+            tags = self.get_cache_tags(rows)
+            timeout = self.cache_timeout
+            if routers.current.get() is not None:
+                # a lagging replica could refill an entry a write just purged;
+                # keep its pages only about as long as it may lag
+                timeout = min(timeout, getattr(settings, 'LMS_REPLICA_CACHE_SECONDS', routers.DEFAULT_CACHE_SECONDS))
+            response.add_post_render_callback(lambda rendered: response_cache.store(key, rendered, tags, timeout, since))
+        return response
+
+
+def get_list_param(data, name):
+    # JSON bodies send a list, form posts repeat the field (or comma separate it)
+    if hasattr(data, 'getlist'):
+        values = data.getlist(name)
+        if len(values) == 1 and ',' in values[0]:
+            values = values[0].split(',')
+    else:
+        values = data.get(name) or []
+        if isinstance(values, str):
+            values = values.split(',')
+    return [str(value).strip() for value in values if str(value).strip()]
+
+
+def batch_status(succeeded, total, ok=status.HTTP_201_CREATED):
+    if succeeded == total:
+        return ok
+    if succeeded:
+        return status.HTTP_207_MULTI_STATUS
+    return status.HTTP_400_BAD_REQUEST
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    # only selects the format; ExportMixin streams the body itself
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode(self.charset) if data is not None else b''
+
+
+class NDJSONRenderer(CSVRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class Echo():
+    # file-like object for csv.writer that hands back the line it was given
+    def write(self, value):
+        return value
+
+
+class ExportMixin():
+    """
+    Streams the whole filtered list view as `?format=csv` or `?format=ndjson`.
+
+    Rows are read as tuples (`values_list` over `export_fields`) in chunks of
+    `export_chunk_size`, so memory stays flat however many rows there are and
+    the header goes out before the first query has finished. Permissions and
+    filters are the list view's own, through get_queryset()/filter_queryset().
+
+    Serve exports through WSGI: Django 4.0's ASGI handler iterates streaming
+    bodies on the event loop, where queries are not allowed.
+    """
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    pagination_class = None
+    # (column name, field lookup) pairs
+    export_fields = ()
+    export_chunk_size = 2000
+    export_name = 'export'
+
+    def get_export_fields(self):
+        return self.export_fields
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        fields = self.get_export_fields()
+        lookups = [lookup for _, lookup in fields]
+        rows = queryset.values_list(*lookups).iterator(chunk_size=self.export_chunk_size)
+        convert = [self.get_converter(queryset.model, lookup) for lookup in lookups]
+        names = [name for name, _ in fields]
+        # the generator runs after the view returns; keep reading where it did
+        alias = routers.current.get()
+
+        fmt = request.accepted_renderer.format
+        response = StreamingHttpResponse(self.stream(fmt, names, convert, rows, alias),
+                                         content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="{self.export_name}.{fmt}"'
+        return response
+
+    def get_converter(self, model, lookup):
+        field = None
+        for part in lookup.split('__'):
+            field = model._meta.get_field(part)
+            model = field.related_model
+        if field.choices:
+            labels = dict(field.flatchoices)
+            return lambda value: labels.get(value, value)
+        return None
+
+    def stream(self, fmt, names, convert, rows, alias):
+        if fmt == 'csv':
+            writer = csv.writer(Echo())
+            yield writer.writerow(names)
+            encode = lambda values: writer.writerow(values)
+        else:
+            encoder = DjangoJSONEncoder()
+            encode = lambda values: encoder.encode(dict(zip(names, values))) + '\n'
+
+        with routers.read_from(alias):
+            while True:
+                chunk = list(itertools.islice(rows, self.export_chunk_size))
+                if not chunk:
+                    return
+                lines = []
+                for row in chunk:
+                    values = [value if func is None or value is None else func(value) for func, value in zip(convert, row)]
+                    if fmt == 'csv':
+                        values = ['' if value is None else value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+                    lines.append(encode(values))
+                yield ''.join(lines)
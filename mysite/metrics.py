@@ -0,0 +1,205 @@
+import bisect
+import contextvars
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+# In-process request metrics, shared between workers through files.
+#
+# Every worker process keeps counters and fixed-bucket histograms in memory
+# and, at most every FLUSH_INTERVAL seconds, writes a snapshot to
+# `<LMS_METRICS_DIR>/<pid>.json`. The metrics endpoint merges all snapshots
+# (plus the live state of the worker serving it) and renders them in the
+# Prometheus text format. Snapshots are cumulative, so files of workers that
+# have exited are kept to stop counters going backwards; clear the directory
+# on deploy.
+
+FLUSH_INTERVAL = 5
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'lms_request_duration_seconds': ('Wall time per request.', DURATION_BUCKETS),
+    'lms_db_queries': ('SQL queries per request.', QUERY_BUCKETS),
+    'lms_db_duration_seconds': ('Time spent in SQL per request.', DURATION_BUCKETS),
+    'lms_response_size_bytes': ('Response body size.', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'lms_requests_total': 'Requests by URL name and status code.',
+    'lms_cache_requests_total': 'Cache lookups by URL name and result.',
+}
+
+# stats of the request being handled, for code that reports into it
+current = contextvars.ContextVar('lms_request_metrics', default=None)
+
+
+def get_directory():
+    return getattr(settings, 'LMS_METRICS_DIR', None) or os.path.join(tempfile.gettempdir(), 'lms-metrics')
+
+
+def label_key(**labels):
+    return json.dumps(sorted(labels.items()))
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.counters = {name: {} for name in COUNTERS}
+        self.flushed_at = 0
+
+    def observe(self, name, key, value):
+        buckets = HISTOGRAMS[name][1]
+        series = self.histograms[name].get(key)
+        if series is None:
+            # one count per bucket (non-cumulative), then sum and count
+            series = self.histograms[name][key] = [0] * (len(buckets) + 1) + [0, 0]
+        series[bisect.bisect_left(buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def increment(self, name, key, amount=1):
+        counters = self.counters[name]
+        counters[key] = counters.get(key, 0) + amount
+
+    def record(self, view, status, duration, queries, db_duration, size, cache_hits, cache_misses):
+        key = label_key(view=view)
+        with self.lock:
+            self.observe('lms_request_duration_seconds', key, duration)
+            self.observe('lms_db_queries', key, queries)
+            self.observe('lms_db_duration_seconds', key, db_duration)
+            if size is not None:
+                self.observe('lms_response_size_bytes', key, size)
+            self.increment('lms_requests_total', label_key(view=view, status=str(status)))
+            if cache_hits:
+                self.increment('lms_cache_requests_total', label_key(view=view, result='hit'), cache_hits)
+            if cache_misses:
+                self.increment('lms_cache_requests_total', label_key(view=view, result='miss'), cache_misses)
+        if time.monotonic() - self.flushed_at > FLUSH_INTERVAL:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': {name: {key: list(series) for key, series in values.items()} for name, values in self.histograms.items()},
+                'counters': {name: dict(values) for name, values in self.counters.items()},
+            }
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        directory = get_directory()
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as fp:
+                json.dump(self.snapshot(), fp)
+            os.replace(fp.name, path)
+        except OSError:
+            # metrics must never break a request
+            pass
+
+
+registry = Registry()
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['queries'] += 1
+        stats['db_duration'] += time.perf_counter() - started
+
+
+def install(connection=None):
+    """
+    Count queries of `connection` (default: every connection of this thread)
+    into the request being handled. Stays installed, so queries run in other
+    threads for the request (sync views under ASGI, lms.aio) are counted too.
+    """
+    for connection in [connection] if connection is not None else connections.all():
+        if record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_query)
+
+
+def connection_created_handler(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(connection_created_handler, dispatch_uid='mysite.metrics.install')
+
+
+def record_cache(hit):
+    stats = current.get()
+    if stats is not None:
+        stats['cache_hits' if hit else 'cache_misses'] += 1
+
+
+def collect():
+    """Merge the snapshots of every worker, with this one's live state."""
+    own = os.path.join(get_directory(), f'{os.getpid()}.json')
+    snapshots = [registry.snapshot()]
+    for path in glob.glob(os.path.join(get_directory(), '*.json')):
+        if path == own:
+            continue
+        try:
+            with open(path) as fp:
+                snapshots.append(json.load(fp))
+        except (OSError, ValueError):
+            continue
+
+    merged = {'histograms': {name: {} for name in HISTOGRAMS}, 'counters': {name: {} for name in COUNTERS}}
+    for snapshot in snapshots:
+        for name, values in snapshot.get('histograms', {}).items():
+            target = merged['histograms'].setdefault(name, {})
+            for key, series in values.items():
+                if key in target:
+                    target[key] = [a + b for a, b in zip(target[key], series)]
+                else:
+                    target[key] = list(series)
+        for name, values in snapshot.get('counters', {}).items():
+            target = merged['counters'].setdefault(name, {})
+            for key, value in values.items():
+                target[key] = target.get(key, 0) + value
+    return merged
+
+
+def format_labels(key, **extra):
+    labels = dict(json.loads(key), **extra)
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in sorted(labels.items())) + '}'
+
+
+def render(merged=None):
+    """Prometheus text exposition format (version 0.0.4)."""
+    merged = merged or collect()
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, series in sorted(merged['histograms'].get(name, {}).items()):
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], series[:-2]):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(key, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(key)} {series[-2]}')
+            lines.append(f'{name}_count{format_labels(key)} {series[-1]}')
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for key, value in sorted(merged['counters'].get(name, {}).items()):
+            lines.append(f'{name}{format_labels(key)} {value}')
+    return '\n'.join(lines) + '\n'
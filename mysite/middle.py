@@ -1,9 +1,145 @@
-class DisableCSRFMiddleware(object):
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError
+
+from mysite import metrics, routers
+
+
+class AsyncCapableMiddleware(object):
+    # Base for middleware that works in both handler modes without a thread
+    # hop: under ASGI, __call__ hands over to the coroutine __acall__.
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # the marker django.utils.deprecation.MiddlewareMixin uses
+            self._is_coroutine = asyncio.coroutines._is_coroutine
 
     def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class DisableCSRFMiddleware(AsyncCapableMiddleware):
+
+    def handle(self, request):
         setattr(request, '_dont_enforce_csrf_checks', True)
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+    async def __acall__(self, request):
+        setattr(request, '_dont_enforce_csrf_checks', True)
+        return await self.get_response(request)
+
+
+class PerformanceMetricsMiddleware(AsyncCapableMiddleware):
+    # Records wall time, SQL queries and their time, cache lookups and response
+    # size per resolved URL name into mysite.metrics. Keep it first in
+    # MIDDLEWARE so the timings cover the whole stack.
+
+    def handle(self, request):
+        metrics.install()
+        stats = self.new_stats()
+        token = metrics.current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = self.new_stats()
+        token = metrics.current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def new_stats(self):
+        return {'queries': 0, 'db_duration': 0.0, 'cache_hits': 0, 'cache_misses': 0}
+
+    def record(self, request, response, stats, duration):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.route) if match else 'unresolved'
+        if response.streaming:
+            size = int(response['Content-Length']) if response.has_header('Content-Length') else None
+        else:
+            size = len(response.content)
+        metrics.registry.record(view, response.status_code, duration, stats['queries'], stats['db_duration'],
+                                size, stats['cache_hits'], stats['cache_misses'])
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    # Runs safe requests to views marked `read_replica = True` against the
+    # read replica (mysite.routers), unless the client wrote something in the
+    # last few seconds. A database error on the replica retries the view on
+    # the primary. Successful writes pin the client to the primary.
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if self.is_async:
+            # read by the handler after __init__, so no sync adapter is needed
+            self.process_view = self.aprocess_view
+
+    def handle(self, request):
+        response = self.get_response(request)
+        self.after_response(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in self.SAFE_METHODS:
+            await sync_to_async(self.after_response, thread_sensitive=True)(request, response)
+        return response
+
+    def after_response(self, request, response):
+        if request.method not in self.SAFE_METHODS and response.status_code < 400:
+            routers.stick(request)
+
+    def get_alias(self, request, view_func):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        if request.method not in self.SAFE_METHODS or not getattr(view_class, 'read_replica', False):
+            return None
+        alias = routers.get_replica()
+        if alias is None or routers.is_sticky(request):
+            return None
+        return alias
+
+    def run_on_replica(self, alias, request, view_func, view_args, view_kwargs):
+        try:
+            with routers.read_from(alias):
+                response = view_func(request, *view_args, **view_kwargs)
+        except DatabaseError:
+            routers.mark_down()
+            return None
+        response['X-Read-Database'] = alias
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        alias = self.get_alias(request, view_func)
+        if alias is None:
+            return None
+        return self.run_on_replica(alias, request, view_func, view_args, view_kwargs)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        if request.method not in self.SAFE_METHODS or not getattr(view_class, 'read_replica', False):
+            return None
+        # the sticky check reads the cache, which may be a blocking backend
+        alias = await sync_to_async(self.get_alias, thread_sensitive=True)(request, view_func)
+        if alias is None:
+            return None
+        return await sync_to_async(self.run_on_replica, thread_sensitive=True)(alias, request, view_func, view_args, view_kwargs)
@@ -0,0 +1,93 @@
+import contextlib
+import contextvars
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Read replica routing.
+#
+# Reads go to the primary unless a request has been explicitly routed to the
+# replica (see mysite.middle.ReplicaRoutingMiddleware); writes always go to the
+# primary. Clients that just wrote stay on the primary for
+# LMS_REPLICA_STICKY_SECONDS so they read their own writes, and a replica that
+# fails a query is left alone for LMS_REPLICA_RETRY_SECONDS. Responses read
+# from the replica stay in the response cache for LMS_REPLICA_CACHE_SECONDS at
+# most, as they may predate a write whose purge has already happened.
+
+DEFAULT_STICKY_SECONDS = 10
+DEFAULT_RETRY_SECONDS = 30
+DEFAULT_CACHE_SECONDS = 10
+STICKY_KEY = 'lms:sticky:{}'
+
+# Authentication and sessions always read the primary: a token or session
+# created a moment ago must work on the very next request.
+PRIMARY_ONLY_APPS = {'auth', 'authtoken', 'sessions', 'contenttypes', 'admin'}
+
+# alias reads of the current request go to, None meaning the primary
+current = contextvars.ContextVar('lms_read_database', default=None)
+
+down_until = [0.0]
+
+
+def get_replica():
+    """Alias of the replica if one is configured and not known to be down."""
+    alias = getattr(settings, 'LMS_REPLICA_DATABASE', None)
+    if not alias or alias not in settings.DATABASES:
+        return None
+    if time.monotonic() < down_until[0]:
+        return None
+    return alias
+
+
+def mark_down():
+    down_until[0] = time.monotonic() + getattr(settings, 'LMS_REPLICA_RETRY_SECONDS', DEFAULT_RETRY_SECONDS)
+
+
+@contextlib.contextmanager
+def read_from(alias):
+    token = current.set(alias)
+    try:
+        yield
+    finally:
+        current.reset(token)
+
+
+def client_key(request):
+    # the credential identifies the client before DRF has authenticated it
+    credential = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return STICKY_KEY.format(hashlib.sha1(credential.encode('utf-8')).hexdigest())
+
+
+def stick(request):
+    key = client_key(request)
+    if key is not None:
+        cache.set(key, 1, getattr(settings, 'LMS_REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS))
+
+
+def is_sticky(request):
+    key = client_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+class ReplicaRouter(object):
+
+    def db_for_read(self, model, **hints):
+        alias = current.get()
+        if alias is None or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mysite.middle.PerformanceMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,11 +53,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'mysite.middle.ReplicaRoutingMiddleware',
 ]
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'lms.authentication.CachedTokenAuthentication',
         # 'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
@@ -102,10 +104,28 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # LMS_DATABASE_NAME points benchmarks and scale tests at a scratch file
+        'NAME': os.environ.get('LMS_DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# Read replica for list endpoints (mysite.routers). Locally, a second SQLite
+# file refreshed with `manage.py sync_replica` stands in for it.
+if os.environ.get('LMS_REPLICA_DATABASE_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['LMS_REPLICA_DATABASE_NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['mysite.routers.ReplicaRouter']
+LMS_REPLICA_DATABASE = 'replica'
+# Seconds a client reads from the primary after a write, so it sees its own changes.
+LMS_REPLICA_STICKY_SECONDS = 10
+# Seconds the replica is skipped after it failed a query.
+LMS_REPLICA_RETRY_SECONDS = 30
+# Seconds a response read from the replica stays in the response cache.
+LMS_REPLICA_CACHE_SECONDS = 10
+
 # Cache
 # https://docs.djangoproject.com/en/4.0/topics/cache/#setting-up-the-cache
 
@@ -167,6 +187,31 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Email
+# Queue an e-mail copy of every notification; sent in the background by
+# `manage.py send_email_notifications`, never inside a request.
+LMS_EMAIL_NOTIFICATIONS = os.environ.get('LMS_EMAIL_NOTIFICATIONS') == '1'
+EMAIL_BACKEND = os.environ.get('LMS_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+
+# Permissions
+# Seconds a user's resolved groups/permissions stay in the shared cache
+# (lms.principal); membership changes invalidate them immediately.
+LMS_PRINCIPAL_CACHE_TIMEOUT = 60
+
+# Authentication
+# Per-worker LRU of token -> user/account rows (lms.authentication).
+LMS_TOKEN_CACHE_SIZE = 10000
+LMS_TOKEN_CACHE_TIMEOUT = 60
+
+# Dashboard
+# Seconds the librarian dashboard (lms.dashboard) is served from the cache.
+LMS_DASHBOARD_TIMEOUT = 30
+
+# Metrics
+# Per-worker snapshots of mysite.metrics, merged by the /metrics/ endpoint
+# (default: <tmp>/lms-metrics). Workers of one deployment must share it.
+LMS_METRICS_DIR = os.environ.get('LMS_METRICS_DIR')
+
 # CORS
 if DEBUG:
     CORS_ALLOW_ALL_ORIGINS = True
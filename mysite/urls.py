@@ -20,7 +20,7 @@ from django.views.generic import TemplateView
 from django.views.generic.base import RedirectView
 
 from rest_framework.authtoken import views
-from .views import current_user
+from .views import current_user, metrics
 
 
 admin.site.site_header = 'LMS Administrator'
@@ -30,6 +30,7 @@ urlpatterns = [
 
     path('api/', include('lms.urls')),
     path('admin/', admin.site.urls),
+    path('metrics/', metrics, name='metrics'),
 
     path('auth/', include([
         path('account/', current_user),
@@ -1,7 +1,131 @@
+import base64
+import json
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
-    # max_page_size = 50
\ No newline at end of file
+    # max_page_size = 50
+
+
+class KeysetPagination(StandardResultsSetPagination):
+    """
+    Page numbers by default; passing `?cursor=` (empty for the first page)
+    switches to keyset pagination on (ordering field, pk), which needs neither
+    COUNT(*) nor OFFSET so every page costs the same however deep it is.
+
+    The view sets `keyset_ordering` (e.g. '-creation_date'); an `?ordering=`
+    accepted by the view's `ordering_fields` overrides it. Only the first
+    ordering field is used, nulls sort first ascending / last descending.
+    """
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        self.field, self.descending = self.get_ordering(request, view)
+        if not self.keyset:
+            if not queryset.ordered:
+                queryset = queryset.order_by(*self.order_by(self.descending))
+            return super().paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        value, pk, reverse = self.decode_cursor(request, queryset.model)
+
+        # going backwards walks the opposite order from the cursor and flips the page
+        descending = self.descending != reverse
+        queryset = queryset.order_by(*self.order_by(descending))
+        if pk is not None:
+            nullable = queryset.model._meta.get_field(self.field).null
+            queryset = queryset.filter(self.after(value, pk, descending, nullable))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_row = results[-1] if results and (has_more or reverse) else None
+        self.previous_row = results[0] if results and (pk is not None and not reverse or reverse and has_more) else None
+        return results
+
+    def get_ordering(self, request, view):
+        ordering = getattr(view, 'keyset_ordering', '-pk')
+        requested = request.query_params.get(self.ordering_param, '').split(',')[0].strip()
+        if requested and requested.lstrip('-') in getattr(view, 'ordering_fields', []):
+            ordering = requested
+        return ordering.lstrip('-'), ordering.startswith('-')
+
+    def order_by(self, descending):
+        if descending:
+            return [F(self.field).desc(nulls_last=True), '-pk']
+        return [F(self.field).asc(nulls_first=True), 'pk']
+
+    def after(self, value, pk, descending, nullable=True):
+        # rows strictly after (value, pk) in the order produced by order_by();
+        # `field <= value AND (field < value OR pk < p)` rather than the
+        # equivalent OR of ranges, so the database can seek on the
+        # (field, id) index instead of scanning it from the top
+        field = self.field
+        op = 'lt' if descending else 'gt'
+        if value is None:
+            # nulls sort last descending / first ascending
+            after = Q(**{f'{field}__isnull': True, f'pk__{op}': pk})
+            if not descending:
+                after |= Q(**{f'{field}__isnull': False})
+            return after
+        after = Q(**{f'{field}__{op}e': value}) & (Q(**{f'{field}__{op}': value}) | Q(**{f'pk__{op}': pk}))
+        if descending and nullable:
+            after |= Q(**{f'{field}__isnull': True})
+        return after
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            value = cursor['v']
+            if value is not None:
+                value = model._meta.get_field(self.field).to_python(value)
+            return value, model._meta.pk.to_python(cursor['p']), bool(cursor.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        cursor = {
+            'v': value.isoformat() if hasattr(value, 'isoformat') else value,
+            'p': row.pk,
+            'r': int(reverse),
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        return self.encode_cursor(self.next_row, False) if self.next_row is not None else None
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        return self.encode_cursor(self.previous_row, True) if self.previous_row is not None else None
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
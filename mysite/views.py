@@ -1,5 +1,8 @@
+from django.http import HttpResponse
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
+
+from mysite import metrics as request_metrics
 from rest_framework.response import Response
 
 
@@ -19,4 +22,9 @@ def current_user(request):
         'fullname': user.get_full_name(),
         'email': user.email,
         'is_anonymous': False
-    })
\ No newline at end of file
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')